@@ -0,0 +1,272 @@
+"""Running per-quiz and per-question aggregates in Redis hashes
+
+Every scored attempt adds to analytics:quiz:{id} (count, sum and sum of
+squares of scores, passes) and to analytics:questions:{id} (per-question
+correct/incorrect counters; unanswered counts as incorrect), so serving
+pass rates, averages and difficulty never scans quiz_attempts.
+
+Recompute them from the database after a Redis flush with:
+    python -m backend.analytics backfill
+"""
+from typing import Any, Dict, List, Optional, Set, Tuple
+import asyncio
+import math
+import uuid
+import redis.asyncio as redis
+from fastapi import HTTPException, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .config import settings
+from .database import SessionLocal, redis_client
+from .models import QuizAttempt
+from .scoring import AnswerKey, load_answer_key
+
+QUIZ_STATS_KEY = "analytics:quiz:{quiz_id}"
+QUESTION_STATS_KEY = "analytics:questions:{quiz_id}"
+# The most recent attempt ids counted per quiz (ANALYTICS_APPLIED_IDS of
+# them), so a redelivered attempt is not counted twice; older ids count as
+# applied. Attempts at or below the "watermark" field a backfill leaves in
+# the quiz hash were counted by that backfill.
+APPLIED_KEY = "analytics:applied:{quiz_id}"
+# Running backfills: token -> watermark, followed by the quiz id for a
+# backfill of one quiz. Each builds its aggregates under
+# its own prefix, next to the live key names it holds ("keys") and the
+# attempts live updates added to it ("attempts").
+BACKFILL_RUNS_KEY = "analytics_backfill:runs"
+BACKFILL_PREFIX = "analytics_tmp:{token}:"
+
+# KEYS: quiz stats, question stats, applied ids, backfill runs. ARGV:
+# attempt id, quiz id, number of ids to keep, score, score squared, passed
+# (0/1), then the "{question_id}:{c|w}" counters of the graded answers.
+# Counts the attempt unless it already was, in the live keys and in those
+# of every running backfill of its quiz whose watermark is below it.
+# Returns 1 if counted.
+ADD_ATTEMPT_LUA = """
+local id = tonumber(ARGV[1])
+if id <= tonumber(redis.call('HGET', KEYS[1], 'watermark') or '0') then return 0 end
+local keep = tonumber(ARGV[3])
+if redis.call('ZCARD', KEYS[3]) >= keep then
+    local oldest = redis.call('ZRANGE', KEYS[3], 0, 0, 'WITHSCORES')
+    if id < tonumber(oldest[2]) then return 0 end
+end
+if redis.call('ZADD', KEYS[3], 'NX', id, id) == 0 then return 0 end
+redis.call('ZREMRANGEBYRANK', KEYS[3], 0, -keep - 1)
+local function add(prefix)
+    redis.call('HINCRBY', prefix .. KEYS[1], 'count', 1)
+    redis.call('HINCRBYFLOAT', prefix .. KEYS[1], 'sum', ARGV[4])
+    redis.call('HINCRBYFLOAT', prefix .. KEYS[1], 'sum_sq', ARGV[5])
+    if ARGV[6] == '1' then redis.call('HINCRBY', prefix .. KEYS[1], 'passed', 1) end
+    for i = 7, #ARGV do
+        redis.call('HINCRBY', prefix .. KEYS[2], ARGV[i], 1)
+    end
+end
+add('')
+local runs = redis.call('HGETALL', KEYS[4])
+for i = 1, #runs, 2 do
+    local watermark, scope = string.match(runs[i + 1], '^(%d+) ?(%d*)$')
+    if id > tonumber(watermark) and (scope == '' or scope == ARGV[2]) then
+        local prefix = 'analytics_tmp:' .. runs[i] .. ':'
+        add(prefix)
+        redis.call('SADD', prefix .. 'keys', KEYS[1])
+        if #ARGV > 6 then redis.call('SADD', prefix .. 'keys', KEYS[2]) end
+        redis.call('SADD', prefix .. 'attempts', id)
+    end
+end
+return 1
+"""
+_add_attempt_once = redis_client.register_script(ADD_ATTEMPT_LUA)
+
+def _add_attempt(pipe: Any, answer_key: AnswerKey, answers: Dict[int, str], score: float, prefix: str = "") -> List[str]:
+    """Queue the counter increments of one attempt on a pipeline; the live keys written"""
+    quiz_key = QUIZ_STATS_KEY.format(quiz_id=answer_key.quiz_id)
+    question_key = QUESTION_STATS_KEY.format(quiz_id=answer_key.quiz_id)
+    pipe.hincrby(prefix + quiz_key, "count", 1)
+    pipe.hincrbyfloat(prefix + quiz_key, "sum", score)
+    pipe.hincrbyfloat(prefix + quiz_key, "sum_sq", score * score)
+    if answer_key.passed(score):
+        pipe.hincrby(prefix + quiz_key, "passed", 1)
+    for question_id, correct in answer_key.grade(answers):
+        pipe.hincrby(prefix + question_key, f"{question_id}:{'c' if correct else 'w'}", 1)
+    return [quiz_key, question_key] if answer_key.question_ids else [quiz_key]
+
+async def record_attempt_stats(attempt_id: int, answer_key: AnswerKey, answers: Dict[int, str], score: float) -> None:
+    """Add a scored attempt to the running aggregates"""
+    try:
+        await record_attempt_stats_once([(attempt_id, answer_key, answers, score)])
+    except redis.RedisError:
+        # Derived data; a backfill restores missed updates
+        pass
+
+async def record_attempt_stats_once(attempts: List[Tuple[int, AnswerKey, Dict[int, str], float]]) -> None:
+    """Add (attempt id, key, answers, score) entries, skipping ones already counted
+
+    One script call per attempt checks and counts it atomically, so a
+    redelivered attempt is never counted twice, whichever consumer sees it.
+    """
+    if not attempts:
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for attempt_id, answer_key, answers, score in attempts:
+            quiz_id = answer_key.quiz_id
+            await _add_attempt_once(
+                keys=[
+                    QUIZ_STATS_KEY.format(quiz_id=quiz_id), QUESTION_STATS_KEY.format(quiz_id=quiz_id),
+                    APPLIED_KEY.format(quiz_id=quiz_id), BACKFILL_RUNS_KEY
+                ],
+                args=[
+                    attempt_id, quiz_id, settings.ANALYTICS_APPLIED_IDS, repr(score), repr(score * score),
+                    int(answer_key.passed(score)),
+                    *(f"{question_id}:{'c' if correct else 'w'}" for question_id, correct in answer_key.grade(answers))
+                ],
+                client=pipe
+            )
+        await pipe.execute()
+
+async def get_quiz_stats(quiz_id: int) -> Dict[str, Any]:
+    """Pass rate, score mean/deviation and per-question difficulty of a quiz"""
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(QUIZ_STATS_KEY.format(quiz_id=quiz_id))
+            pipe.hgetall(QUESTION_STATS_KEY.format(quiz_id=quiz_id))
+            quiz_stats, question_counters = await pipe.execute()
+    except redis.RedisError:
+        # The aggregates only live in Redis
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Analytics are temporarily unavailable"
+        )
+    
+    count = int(quiz_stats.get("count", 0))
+    total = float(quiz_stats.get("sum", 0))
+    mean = total / count if count else None
+    stddev = None
+    if count:
+        variance = float(quiz_stats.get("sum_sq", 0)) / count - mean * mean
+        stddev = math.sqrt(max(variance, 0.0))
+    
+    questions: Dict[int, Dict[str, int]] = {}
+    for field, value in question_counters.items():
+        question_id, outcome = field.split(":")
+        counters = questions.setdefault(int(question_id), {"correct": 0, "incorrect": 0})
+        counters["correct" if outcome == "c" else "incorrect"] = int(value)
+    
+    return {
+        "quiz_id": quiz_id,
+        "attempts": count,
+        "average_score": mean,
+        "score_stddev": stddev,
+        "pass_rate": int(quiz_stats.get("passed", 0)) / count if count else None,
+        "questions": [
+            {
+                "question_id": question_id,
+                **counters,
+                "difficulty": counters["incorrect"] / (counters["correct"] + counters["incorrect"]),
+            }
+            for question_id, counters in sorted(questions.items())
+        ],
+    }
+
+async def _drop_run(token: str, written: Set[str]) -> None:
+    """Unregister a backfill that failed and delete its keys"""
+    prefix = BACKFILL_PREFIX.format(token=token)
+    await redis_client.hdel(BACKFILL_RUNS_KEY, token)
+    merged = await redis_client.smembers(prefix + "keys")
+    await redis_client.delete(prefix + "keys", prefix + "attempts", *(prefix + key for key in written | merged))
+
+async def backfill_analytics(db: AsyncSession, quiz_id: Optional[int] = None) -> Dict[str, int]:
+    """Recompute every aggregate (or those of one quiz) from quiz_attempts
+
+    Attempts are graded against the current answer keys. Aggregates are
+    built under the run's own prefix and renamed over the live keys at the
+    end; no other key is touched. Live updates are merged rather than lost:
+    while the run is registered, those of attempts above its watermark also
+    go to its keys, and attempts above the watermark counted before it
+    started are added at the end.
+    """
+    token = uuid.uuid4().hex
+    prefix = BACKFILL_PREFIX.format(token=token)
+    answer_keys: Dict[int, Optional[AnswerKey]] = {}
+    written: Set[str] = set()
+    quizzes: Set[int] = set()
+    attempts = 0
+    
+    async def add(rows) -> None:
+        nonlocal attempts
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for attempt_quiz_id, answers, score in rows:
+                if attempt_quiz_id not in answer_keys:
+                    answer_keys[attempt_quiz_id] = await load_answer_key(db, attempt_quiz_id)
+                answer_key = answer_keys[attempt_quiz_id]
+                if answer_key is None:
+                    continue
+                # JSON object keys come back as strings
+                written.update(_add_attempt(pipe, answer_key, {int(k): v for k, v in answers.items()}, score, prefix))
+                quizzes.add(attempt_quiz_id)
+                attempts += 1
+            await pipe.execute()
+    
+    scope = [QuizAttempt.quiz_id == quiz_id] if quiz_id is not None else []
+    # Attempts committed after this point are left to the live updates
+    watermark = (await db.execute(select(func.max(QuizAttempt.id)).where(*scope))).scalar() or 0
+    await redis_client.hset(BACKFILL_RUNS_KEY, token, f"{watermark} {quiz_id}" if quiz_id is not None else watermark)
+    try:
+        result = await db.stream(
+            select(QuizAttempt.quiz_id, QuizAttempt.answers, QuizAttempt.score)
+            .where(QuizAttempt.id <= watermark, *scope)
+            .order_by(QuizAttempt.quiz_id)
+            .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+        )
+        async for rows in result.partitions():
+            await add(rows)
+        
+        # Attempts above the watermark counted before the run was
+        # registered are only in the live keys; later ones are in its own
+        result = await db.stream(
+            select(QuizAttempt.id, QuizAttempt.quiz_id, QuizAttempt.answers, QuizAttempt.score)
+            .where(QuizAttempt.id > watermark, *scope)
+            .order_by(QuizAttempt.id)
+            .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+        )
+        async for rows in result.partitions():
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for row in rows:
+                    pipe.zscore(APPLIED_KEY.format(quiz_id=row.quiz_id), row.id)
+                    pipe.sismember(prefix + "attempts", row.id)
+                checks = await pipe.execute()
+            await add([
+                row[1:] for row, applied, merged in zip(rows, checks[::2], checks[1::2])
+                if applied is not None and not merged
+            ])
+        
+        async with redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(prefix + "keys")
+                    keys = written | await pipe.smembers(prefix + "keys")
+                    pipe.multi()
+                    for key in keys:
+                        if key.startswith(QUIZ_STATS_KEY.format(quiz_id="")):
+                            # Attempts up to here are counted; skip their live updates
+                            pipe.hset(prefix + key, "watermark", watermark)
+                        pipe.rename(prefix + key, key)
+                    pipe.hdel(BACKFILL_RUNS_KEY, token)
+                    pipe.delete(prefix + "keys", prefix + "attempts")
+                    await pipe.execute()
+                    break
+                except redis.WatchError:
+                    # A live update added a key the swap did not know about yet
+                    continue
+    except Exception:
+        await _drop_run(token, written)
+        raise
+    return {"quizzes": len(quizzes), "attempts": attempts}
+
+async def _main(command: Optional[str]) -> None:
+    if command != "backfill":
+        raise SystemExit("usage: python -m backend.analytics backfill")
+    async with SessionLocal() as db:
+        print(await backfill_analytics(db))
+
+if __name__ == "__main__":
+    import sys
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else None))
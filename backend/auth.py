@@ -1,13 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Dict, Optional, Set
+import asyncio
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+import redis.asyncio as redis
+from .cache import TTLCache
 from .config import settings
-from .database import get_db
+from .database import get_primary_db, redis_client
+from .metrics import PASSWORD_HASH_LATENCY
 from .models import User
+from .schemas import Principal
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -23,6 +31,55 @@ def get_password_hash(password: str) -> str:
     """Generate password hash"""
     return pwd_context.hash(password)
 
+# bcrypt releases the GIL, so a bounded thread pool keeps hashing off the
+# event loop while still running several hashes in parallel
+hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
+hash_pool_stats: Dict[str, int] = {"pending": 0, "completed": 0, "rejected": 0}
+
+def hash_pool_status() -> Dict[str, int]:
+    """Current password hashing pool counters, including queue depth"""
+    return {
+        **hash_pool_stats,
+        "workers": settings.PASSWORD_HASH_WORKERS,
+        "queue_depth": max(0, hash_pool_stats["pending"] - settings.PASSWORD_HASH_WORKERS),
+    }
+
+async def _run_hash_job(func: Callable[..., Any], *args: Any) -> Any:
+    """Run a bcrypt call on the hashing pool, rejecting it when saturated"""
+    if hash_pool_stats["pending"] >= settings.PASSWORD_HASH_MAX_PENDING:
+        hash_pool_stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+    
+    hash_pool_stats["pending"] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(hash_executor, _timed_hash, func, *args)
+    finally:
+        hash_pool_stats["pending"] -= 1
+        hash_pool_stats["completed"] += 1
+
+def _timed_hash(func: Callable[..., Any], *args: Any) -> Any:
+    """Run a bcrypt call on a pool thread, recording its duration"""
+    started = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        PASSWORD_HASH_LATENCY.labels(func.__name__).observe(time.perf_counter() - started)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the hashing pool"""
+    return await _run_hash_job(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Generate a password hash on the hashing pool"""
+    return await _run_hash_job(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
     to_encode = data.copy()
@@ -35,21 +92,96 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[str]:
-    """Verify JWT token and return user email"""
+def create_user_token(user: User) -> str:
+    """Create an access token for a user
+
+    Admin rights are deliberately not a claim: they are read from the
+    (cached) user row, so revoking them does not wait for tokens to expire.
+    """
+    return create_access_token(data={"sub": user.email, "uid": user.id})
+
+def decode_token(token: str) -> Optional[dict]:
+    """Verify JWT token and return its claims"""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        return email
     except JWTError:
         return None
+    if payload.get("sub") is None:
+        return None
+    return payload
+
+def verify_token(token: str) -> Optional[str]:
+    """Verify JWT token and return user email"""
+    payload = decode_token(token)
+    return payload["sub"] if payload else None
+
+# Authenticated principals keyed by token subject (email). The in-process
+# LRU answers most requests; Redis shares entries between pods.
+principal_cache = TTLCache(settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL_SECONDS)
+PRINCIPAL_KEY = "principal:{email}"
+
+async def _get_cached_principal(email: str) -> Optional[Principal]:
+    """Look a principal up in the local cache, then in Redis"""
+    principal = principal_cache.get(email)
+    if principal is not None or not settings.PRINCIPAL_CACHE_REDIS:
+        return principal
+    try:
+        cached = await redis_client.get(PRINCIPAL_KEY.format(email=email))
+    except redis.RedisError:
+        return None
+    if cached is None:
+        return None
+    principal = Principal.model_validate_json(cached)
+    principal_cache.set(email, principal)
+    return principal
+
+async def _cache_principal(principal: Principal) -> None:
+    """Store a principal in the local cache and in Redis"""
+    principal_cache.set(principal.email, principal)
+    if not settings.PRINCIPAL_CACHE_REDIS:
+        return
+    try:
+        await redis_client.setex(
+            PRINCIPAL_KEY.format(email=principal.email),
+            settings.PRINCIPAL_CACHE_TTL_SECONDS,
+            principal.model_dump_json()
+        )
+    except redis.RedisError:
+        pass
+
+async def invalidate_principal(email: str) -> None:
+    """Forget a cached principal after the user changes"""
+    principal_cache.pop(email)
+    if not settings.PRINCIPAL_CACHE_REDIS:
+        return
+    try:
+        await redis_client.delete(PRINCIPAL_KEY.format(email=email))
+    except redis.RedisError:
+        pass
 
-def get_current_user(
+# Redis invalidations scheduled from flush events, kept until they finish
+_pending_invalidations: Set["asyncio.Task[None]"] = set()
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target: User) -> None:
+    """Drop the principal of a user row that was updated or deleted"""
+    emails = [target.email, *(inspect(target).attrs.email.history.deleted or ())]
+    for email in emails:
+        # Flush events are synchronous: clear the local entry now and
+        # leave the shared Redis entry to a task on the running loop
+        principal_cache.pop(email)
+        try:
+            task = asyncio.get_running_loop().create_task(invalidate_principal(email))
+        except RuntimeError:
+            continue
+        _pending_invalidations.add(task)
+        task.add_done_callback(_pending_invalidations.discard)
+
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_primary_db)
+) -> Principal:
     """Get current authenticated user"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -57,22 +189,23 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        token = credentials.credentials
-        email = verify_token(token)
-        if email is None:
-            raise credentials_exception
-    except JWTError:
+    payload = decode_token(credentials.credentials)
+    if payload is None:
         raise credentials_exception
+    email = payload["sub"]
+    
+    principal = await _get_cached_principal(email)
+    if principal is None:
+        result = await db.execute(select(User).where(User.email == email))
+        user = result.scalars().first()
+        if user is None:
+            raise credentials_exception
+        principal = Principal.model_validate(user)
+        await _cache_principal(principal)
     
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    # Tokens are bound to the account they were issued for, so a token
+    # outlives neither the deletion nor the re-creation of its user
+    if payload.get("uid", principal.id) != principal.id:
         raise credentials_exception
     
-    return user
-
-def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
-    """Get current active user"""
-    if not current_user.is_active:
-        raise HTTPException(status_code=400, detail="Inactive user")
-    return current_user 
\ No newline at end of file
+    return principal
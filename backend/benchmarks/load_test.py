@@ -0,0 +1,228 @@
+"""Concurrent load test of the main API flows
+
+Run from the repository root:
+    python -m backend.benchmarks.load_test --concurrency 20 --requests 2000
+
+Seeds users, quizzes, questions and attempt history into a throwaway SQLite
+database (or --database-url, e.g. a local Postgres), then drives login,
+get_quizzes, submit_quiz_attempt, get_user_attempts and get_user_progress
+through the ASGI app in-process. Redis is fakeredis unless --redis-url is
+given. Each scenario reports throughput, p50/p95/p99 latency and SQL
+statements per request (from the app's own /metrics histograms) as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+SCENARIOS = ["login", "get_quizzes", "submit_quiz_attempt", "get_user_attempts", "get_user_progress"]
+PASSWORD = "benchmark-password"
+
+def configure(database_url, redis_url):
+    """Point the app at the benchmark database and Redis before it is imported"""
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("DEBUG", "false")
+    # All virtual users share one client address; measure the API, not the limiter
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    from .. import database
+    if redis_url is None:
+        import fakeredis
+        import redis.asyncio as redis
+        pool = redis.ConnectionPool(
+            connection_class=fakeredis.aioredis.FakeConnection,
+            server=fakeredis.FakeServer(),
+            decode_responses=True
+        )
+    else:
+        import redis.asyncio as redis
+        pool = redis.ConnectionPool.from_url(redis_url, decode_responses=True)
+    # Modules bind redis_client at import, so swap it before importing the app
+    database.redis_pool = pool
+    database.redis_client = database.InstrumentedRedis(connection_pool=pool)
+
+async def seed(args, rng):
+    """Bulk insert users, quizzes, questions, attempts and progress"""
+    from sqlalchemy import insert, select
+    from ..auth import get_password_hash
+    from ..database import SessionLocal
+    from ..models import Question, Quiz, QuizAttempt, User, UserProgress
+    
+    hashed = get_password_hash(PASSWORD)
+    async with SessionLocal() as db:
+        await db.execute(insert(User), [
+            {"email": f"bench{n}@example.com", "username": f"bench{n}", "hashed_password": hashed}
+            for n in range(args.users)
+        ])
+        await db.execute(insert(Quiz), [
+            {"title": f"Quiz {q}", "description": "x" * 200, "category": rng.choice(["fundamentals", "networking", "storage"]),
+             "difficulty": rng.choice(["beginner", "intermediate", "advanced"]), "time_limit": 30}
+            for q in range(args.quizzes)
+        ])
+        quiz_ids = (await db.scalars(select(Quiz.id))).all()
+        await db.execute(insert(Question), [
+            {"quiz_id": quiz_id, "question_text": f"Question {quiz_id}.{n} " + "y" * 100,
+             "question_type": "multiple_choice", "options": {"a": "A", "b": "B", "c": "C", "d": "D"},
+             "correct_answer": rng.choice("abcd"), "explanation": "z" * 200}
+            for quiz_id in quiz_ids for n in range(args.questions_per_quiz)
+        ])
+        users = (await db.scalars(select(User))).all()
+        questions = {}
+        for quiz_id, question_id in (await db.execute(select(Question.quiz_id, Question.id))).all():
+            questions.setdefault(quiz_id, []).append(question_id)
+        
+        attempts, progress = [], {}
+        for user in users:
+            for _ in range(args.attempts_per_user):
+                quiz_id = rng.choice(quiz_ids)
+                score = rng.random() * 100
+                attempts.append({
+                    "user_id": user.id, "quiz_id": quiz_id, "score": score, "time_taken": rng.randint(60, 900),
+                    "answers": {str(q): rng.choice("abcd") for q in questions[quiz_id]}
+                })
+                best = progress.get((user.id, quiz_id), (0.0, 0))
+                progress[(user.id, quiz_id)] = (max(best[0], score), best[1] + 1)
+        for start in range(0, len(attempts), 1000):
+            await db.execute(insert(QuizAttempt), attempts[start:start + 1000])
+        if progress:
+            await db.execute(insert(UserProgress), [
+                {"user_id": user_id, "quiz_id": quiz_id, "best_score": best, "attempts_count": count,
+                 "completed": best >= 70.0}
+                for (user_id, quiz_id), (best, count) in progress.items()
+            ])
+        await db.commit()
+    return users, questions
+
+def request_for(scenario, user, token, questions, rng):
+    """(method, url, kwargs) of one request of a scenario"""
+    headers = {"Authorization": f"Bearer {token}"}
+    if scenario == "login":
+        return "POST", "/auth/login", {"params": {"email": user.email, "password": PASSWORD}}
+    if scenario == "get_quizzes":
+        return "GET", "/quizzes", {"headers": headers}
+    if scenario == "submit_quiz_attempt":
+        quiz_id = rng.choice(list(questions))
+        answers = {str(q): rng.choice("abcd") for q in questions[quiz_id]}
+        return "POST", "/quiz-attempts", {"headers": headers, "json": {"quiz_id": quiz_id, "answers": answers}}
+    if scenario == "get_user_attempts":
+        return "GET", "/quiz-attempts", {"headers": headers, "params": {"limit": 20}}
+    return "GET", "/progress", {"headers": headers}
+
+def query_totals(method, route):
+    """(statements, requests) so far for a route, from the app's histograms"""
+    from prometheus_client import REGISTRY
+    labels = {"method": method, "route": route}
+    return (
+        REGISTRY.get_sample_value("http_request_db_queries_sum", labels) or 0.0,
+        REGISTRY.get_sample_value("http_request_db_queries_count", labels) or 0.0,
+    )
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+async def run_scenario(client, scenario, requests, concurrency, users, tokens, questions, seed):
+    rng = random.Random(seed)
+    workload = []
+    for _ in range(requests):
+        user = rng.choice(users)
+        workload.append(request_for(scenario, user, tokens[user.id], questions, rng))
+    method, route = workload[0][0], workload[0][1]
+    before = query_totals(method, route)
+    
+    latencies, errors = [], 0
+    pending = iter(workload)
+    
+    async def worker():
+        nonlocal errors
+        for method, url, kwargs in pending:
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    
+    after = query_totals(method, route)
+    latencies.sort()
+    served = after[1] - before[1]
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "queries_per_request": round((after[0] - before[0]) / served, 2) if served else None,
+    }
+
+async def run(args):
+    import httpx
+    from ..auth import create_user_token
+    from ..database import engine
+    from ..main import app
+    
+    rng = random.Random(args.seed)
+    await app.router.startup()
+    try:
+        users, questions = await seed(args, rng)
+        tokens = {user.id: create_user_token(user) for user in users}
+        transport = httpx.ASGITransport(app=app)
+        results = {}
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for scenario in args.scenarios:
+                requests = args.login_requests if scenario == "login" else args.requests
+                results[scenario] = await run_scenario(
+                    client, scenario, requests, args.concurrency, users, tokens, questions, args.seed
+                )
+        return {
+            "database": engine.dialect.name,
+            "redis": "fakeredis" if args.redis_url is None else "redis",
+            "concurrency": args.concurrency,
+            "seed": {
+                "users": args.users, "quizzes": args.quizzes,
+                "questions_per_quiz": args.questions_per_quiz, "attempts_per_user": args.attempts_per_user,
+            },
+            "scenarios": results,
+        }
+    finally:
+        await app.router.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="defaults to a throwaway SQLite file; must be an empty database")
+    parser.add_argument("--redis-url", help="defaults to an in-process fakeredis")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--quizzes", type=int, default=20)
+    parser.add_argument("--questions-per-quiz", type=int, default=20)
+    parser.add_argument("--attempts-per-user", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=100, help="login is bcrypt-bound")
+    parser.add_argument("--scenarios", type=lambda value: value.split(","), default=SCENARIOS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        configure(args.database_url or "sqlite:///" + os.path.join(tmp, "bench.db"), args.redis_url)
+        report = asyncio.run(run(args))
+    
+    encoded = json.dumps(report, indent=2)
+    print(encoded)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(encoded + "\n")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Search latency as the question bank grows
+
+Run from the repository root:
+    python -m backend.benchmarks.search_latency --sizes 1000,10000,50000
+
+Point --database-url at PostgreSQL (migrated, or created by create_all) to
+measure the tsvector/GIN path; the default SQLite database exercises the
+LIKE-scan development fallback for contrast. The in-process inverted index
+used for learning sources is measured over the same documents.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from ..database import async_database_url
+from ..models import Base, Question, Quiz
+from ..search import search_questions
+from ..text_index import InvertedIndex
+
+QUERIES = ["pod", "rolling upd", "network policy", "persistent vol", "kubelet", "helm chart", "etcd api", "liveness probe"]
+# Each query phrase is planted in this many documents at every size, so the
+# match count stays constant and only the growth of the bank is measured
+MATCHES_PER_QUERY = 50
+PLANTED = ["pod", "rolling update", "network policy", "persistent volume", "kubelet", "helm chart", "etcd api", "liveness probe"]
+
+def corpus(size, rng):
+    """(question_text, explanation) pairs over a vocabulary that grows with the bank"""
+    vocabulary = size * 5
+    docs = [
+        [" ".join(f"t{rng.randrange(vocabulary)}" for _ in range(12)),
+         " ".join(f"t{rng.randrange(vocabulary)}" for _ in range(25))]
+        for _ in range(size)
+    ]
+    for phrase in PLANTED:
+        for n in rng.sample(range(size), min(size, MATCHES_PER_QUERY)):
+            docs[n][0] += " " + phrase
+    return docs
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1] * 1000, 3),
+    }
+
+async def bench_database(database_url, docs, repeats):
+    engine = create_async_engine(async_database_url(database_url))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(Quiz), [
+            {"id": q + 1, "title": f"Quiz {q}", "category": "fundamentals", "difficulty": "beginner"}
+            for q in range(max(1, len(docs) // 50))
+        ])
+        await conn.execute(insert(Question), [
+            {"quiz_id": n % max(1, len(docs) // 50) + 1, "question_text": text,
+             "explanation": explanation, "question_type": "multiple_choice", "correct_answer": "a"}
+            for n, (text, explanation) in enumerate(docs)
+        ])
+    sessionmaker = async_sessionmaker(engine)
+    samples = []
+    async with sessionmaker() as db:
+        await search_questions(db, QUERIES[0])  # warm up
+        for _ in range(repeats):
+            for query in QUERIES:
+                started = time.perf_counter()
+                await search_questions(db, query, limit=20)
+                samples.append(time.perf_counter() - started)
+        backend = "tsvector" if db.bind.dialect.name == "postgresql" else "like-scan"
+    await engine.dispose()
+    return {"backend": backend, **percentiles(samples)}
+
+def bench_inverted_index(docs, repeats):
+    index = InvertedIndex()
+    for n, (text, explanation) in enumerate(docs):
+        index.add(n, [(text, 2.0), (explanation, 1.0)])
+    index.freeze()
+    samples = []
+    for _ in range(repeats):
+        for query in QUERIES:
+            started = time.perf_counter()
+            index.search(query)[:20]
+            samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+    
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or "sqlite:///" + os.path.join(tmp, "bench.db")
+        for size in (int(s) for s in args.sizes.split(",")):
+            docs = corpus(size, random.Random(size))
+            results.append({
+                "questions": size,
+                "database": await bench_database(database_url, docs, args.repeats),
+                "inverted_index": bench_inverted_index(docs, args.repeats),
+            })
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+"""Serialization cost per 1k rows of the hot list endpoints
+
+Run from the repository root:
+    python -m backend.benchmarks.serialization --rows 1000
+
+Compares, for attempt history rows and catalog quizzes with their questions:
+  fastapi_default  ORM objects validated through response_model and
+                   encoded with the stdlib json module
+  pydantic_json    per-row model_dump_json (the default cached path)
+  orjson_tuples    column tuples encoded with orjson (FAST_JSON)
+No database is involved; rows are built in memory.
+"""
+from datetime import datetime, timedelta
+from typing import List
+import argparse
+import json
+import random
+import time
+
+from pydantic import TypeAdapter
+
+from ..cache import dump_models
+from ..models import Question, Quiz, QuizAttempt
+from ..schemas import QuestionResponse, QuizAttemptResponse, QuizResponse
+from ..serialization import dump_rows, dumps, schema_columns
+
+ATTEMPT_FIELDS, _ = schema_columns(QuizAttemptResponse, QuizAttempt)
+QUIZ_FIELDS, _ = schema_columns(QuizResponse, Quiz, exclude=("questions",))
+QUESTION_FIELDS, _ = schema_columns(QuestionResponse, Question)
+
+def attempt_rows(count, rng):
+    """(ORM objects, column tuples) of attempt history rows"""
+    now = datetime.utcnow()
+    tuples = [
+        (rng.randint(1, 50), {str(q): rng.choice("abcd") for q in range(1, 21)}, rng.randint(60, 900),
+         i, 1, rng.random() * 100, now - timedelta(minutes=i))
+        for i in range(1, count + 1)
+    ]
+    objects = [QuizAttempt(**dict(zip(ATTEMPT_FIELDS, row))) for row in tuples]
+    return objects, tuples
+
+def quiz_rows(count, questions_per_quiz, rng):
+    """(ORM objects, quiz tuples, question dicts per quiz) of catalog quizzes"""
+    now = datetime.utcnow()
+    objects, tuples, questions = [], [], {}
+    for i in range(1, count + 1):
+        row = (f"Quiz {i}", "x" * 120, "fundamentals", "beginner", 30, 70.0, True, i, now, now)
+        quiz = Quiz(**dict(zip(QUIZ_FIELDS, row)))
+        quiz.questions = [
+            Question(question_text=f"Question {i}.{n} " + "y" * 80, question_type="multiple_choice",
+                     options={"a": "A", "b": "B", "c": "C", "d": "D"}, correct_answer=rng.choice("abcd"),
+                     explanation="z" * 200, points=1, id=i * 100 + n, quiz_id=i, created_at=now, updated_at=None)
+            for n in range(questions_per_quiz)
+        ]
+        objects.append(quiz)
+        tuples.append(row)
+        questions[i] = [
+            {name: getattr(question, name) for name in QUESTION_FIELDS}
+            for question in quiz.questions
+        ]
+    return objects, tuples, questions
+
+def fastapi_default(schema, objects):
+    adapter = TypeAdapter(List[schema])
+    validated = adapter.validate_python(objects, from_attributes=True)
+    # response_model serialization followed by JSONResponse.render
+    return json.dumps(adapter.dump_python(validated, mode="json")).encode("utf-8")
+
+def encode_quizzes(tuples, questions):
+    return b"[" + b",".join(
+        dumps({**dict(zip(QUIZ_FIELDS, row)), "questions": questions[row[7]]}) for row in tuples
+    ) + b"]"
+
+def measure(fn, rows, repeat):
+    """Best-of-repeat milliseconds per 1k rows"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return round(best * 1000 * 1000 / rows, 3)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--questions-per-quiz", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    rng = random.Random(42)
+    
+    attempts, attempt_tuples = attempt_rows(args.rows, rng)
+    quizzes, quiz_tuples, questions = quiz_rows(args.rows, args.questions_per_quiz, rng)
+    results = {
+        "attempts_ms_per_1k": {
+            "fastapi_default": measure(lambda: fastapi_default(QuizAttemptResponse, attempts), args.rows, args.repeat),
+            "pydantic_json": measure(lambda: dump_models(QuizAttemptResponse, attempts), args.rows, args.repeat),
+            "orjson_tuples": measure(lambda: dump_rows(ATTEMPT_FIELDS, attempt_tuples), args.rows, args.repeat),
+        },
+        "quizzes_ms_per_1k": {
+            "fastapi_default": measure(lambda: fastapi_default(QuizResponse, quizzes), args.rows, args.repeat),
+            "pydantic_json": measure(lambda: dump_models(QuizResponse, quizzes), args.rows, args.repeat),
+            "orjson_tuples": measure(lambda: encode_quizzes(quiz_tuples, questions), args.rows, args.repeat),
+        },
+        "questions_per_quiz": args.questions_per_quiz,
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Sequence, Tuple, Type
+import asyncio
+import threading
+import time
+import redis.asyncio as redis
+from pydantic import BaseModel
+from .config import settings
+from .database import redis_client
+
+# Per-user hash holding the cached attempt/progress responses. Every field
+# derives from the user's attempts, so a submit simply drops the whole hash.
+USER_CACHE_KEY = "user_cache:{user_id}"
+
+cache_stats: Dict[str, int] = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+
+# Version counters of cache tags. Cached entries embed the versions of their
+# tags in their key, so purging a tag orphans every entry derived from it.
+# The local counter covers this pod, the Redis one every other pod.
+CACHE_TAG_KEY = "cache_tag:{tag}"
+_tag_versions: Dict[str, int] = {}
+
+# Loads currently running in this process, keyed by "<hash key>:<field>"
+_inflight: Dict[str, "asyncio.Future[str]"] = {}
+
+# KEYS: user cache hash, user tag counter. ARGV: field, value, TTL, tag
+# version read before the load. The user tag is bumped on invalidation by
+# whichever pod handled the submit, so a load that raced it is not written back.
+WRITE_BACK_LUA = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[4] then return 0 end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+_write_back = redis_client.register_script(WRITE_BACK_LUA)
+
+class TTLCache:
+    """Small in-process LRU cache whose entries expire after a TTL"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a live entry and mark it recently used"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store an entry, evicting the least recently used one when full"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """Drop an entry if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+def user_cache_key(user_id: int) -> str:
+    """Redis key of a user's cache hash"""
+    return USER_CACHE_KEY.format(user_id=user_id)
+
+def dump_models(schema: Type[BaseModel], rows: Iterable[Any]) -> str:
+    """Serialize ORM rows through a response schema into a JSON array"""
+    return "[" + ",".join(schema.model_validate(row).model_dump_json() for row in rows) + "]"
+
+def dump_model(schema: Type[BaseModel], row: Any) -> str:
+    """Serialize a single ORM row, or null when it is missing"""
+    if row is None:
+        return "null"
+    return schema.model_validate(row).model_dump_json()
+
+async def read_through(user_id: int, field: str, loader: Callable[[], Awaitable[str]]) -> str:
+    """Return a cached JSON value, loading it once on a miss"""
+    key = user_cache_key(user_id)
+    tag_key = CACHE_TAG_KEY.format(tag=user_tag(user_id))
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.hget(key, field)
+            pipe.get(tag_key)
+            cached, generation = await pipe.execute()
+    except redis.RedisError:
+        cache_stats["errors"] += 1
+        cached = generation = None
+        redis_down = True
+    else:
+        redis_down = False
+    if cached is not None:
+        cache_stats["hits"] += 1
+        return cached
+
+    cache_stats["misses"] += 1
+    flight_key = f"{key}:{field}"
+    pending = _inflight.get(flight_key)
+    if pending is not None:
+        cache_stats["coalesced"] += 1
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[flight_key] = future
+    try:
+        value = await loader()
+    except Exception as exc:
+        future.set_exception(exc)
+        future.exception()  # mark retrieved when nobody else was waiting
+        raise
+    finally:
+        _inflight.pop(flight_key, None)
+
+    future.set_result(value)
+    if not redis_down:
+        try:
+            await _write_back(keys=[key, tag_key], args=[field, value, settings.CACHE_TTL_SECONDS, generation or ""])
+        except redis.RedisError:
+            cache_stats["errors"] += 1
+    return value
+
+def user_tag(user_id: int) -> str:
+    """Cache tag of everything derived from a user's attempts"""
+    return f"user:{user_id}"
+
+async def tag_versions(tags: Sequence[str]) -> str:
+    """Current version of a set of tags, as a string to embed in cache keys"""
+    if not tags:
+        return ""
+    local = ".".join(str(_tag_versions.get(tag, 0)) for tag in tags)
+    try:
+        shared = await redis_client.mget([CACHE_TAG_KEY.format(tag=tag) for tag in tags])
+    except redis.RedisError:
+        cache_stats["errors"] += 1
+        return local
+    return local + ":" + ".".join(version or "0" for version in shared)
+
+async def purge_tags(*tags: str) -> None:
+    """Invalidate every cached entry carrying one of the tags"""
+    for tag in tags:
+        _tag_versions[tag] = _tag_versions.get(tag, 0) + 1
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.incr(CACHE_TAG_KEY.format(tag=tag))
+            await pipe.execute()
+    except redis.RedisError:
+        cache_stats["errors"] += 1
+
+async def invalidate_user(user_id: int) -> None:
+    """Drop every cached attempt/progress entry of a user"""
+    # Tag first: a write-back landing between the two is then refused
+    # instead of surviving the delete
+    await purge_tags(user_tag(user_id))
+    try:
+        await redis_client.delete(user_cache_key(user_id))
+    except redis.RedisError:
+        cache_stats["errors"] += 1
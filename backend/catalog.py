@@ -0,0 +1,266 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import time
+import redis.asyncio as redis
+from fastapi import Request
+from sqlalchemy import distinct, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from .cache import purge_tags
+from .config import settings
+from .database import READ_METHODS, ReadSessionLocal, SessionLocal, redis_client
+from .models import Quiz, Question
+from .schemas import QuestionResponse, QuizResponse
+from .serialization import FAST_JSON, dumps, schema_columns
+
+# Response cache tag of everything rendered from quizzes and questions
+CATALOG_TAG = "catalog"
+
+# Snapshot key: (is_active filter, category filter)
+CatalogKey = Tuple[Optional[bool], Optional[str]]
+
+# (quiz id, encoded QuizResponse, latest change to the quiz or its questions)
+CatalogEntry = Tuple[int, bytes, Optional[datetime]]
+
+def _latest(*timestamps: Optional[datetime]) -> Optional[datetime]:
+    return max(filter(None, timestamps), default=None)
+
+class CatalogSnapshot:
+    """Pre-serialized JSON of the quizzes matching one catalog filter"""
+
+    def __init__(self, entries: Iterable[CatalogEntry]):
+        self.ids: List[int] = []
+        self.items: List[bytes] = []
+        self.by_id: Dict[int, bytes] = {}
+        self.last_modified: Dict[int, datetime] = {}
+        for quiz_id, encoded, changed in entries:
+            self.ids.append(quiz_id)
+            self.items.append(encoded)
+            self.by_id[quiz_id] = encoded
+            if changed is not None:
+                self.last_modified[quiz_id] = changed
+
+    @classmethod
+    def from_quizzes(cls, quizzes: List[Quiz]) -> "CatalogSnapshot":
+        """Encode ORM quizzes (with loaded questions) through QuizResponse"""
+        return cls(
+            (
+                quiz.id,
+                QuizResponse.model_validate(quiz).model_dump_json().encode("utf-8"),
+                _latest(*(timestamp for row in (quiz, *quiz.questions) for timestamp in (row.updated_at, row.created_at)))
+            )
+            for quiz in quizzes
+        )
+
+    def latest(self) -> Optional[datetime]:
+        """Most recent change to any quiz or question in the snapshot"""
+        return max(self.last_modified.values(), default=None)
+
+    def page(self, skip: int = 0, limit: int = 100) -> Tuple[bytes, Optional[int]]:
+        """Return a JSON array of a slice of the snapshot and the id to continue after"""
+        return self._slice(skip, limit)
+
+    def page_after(self, after_id: int, limit: int = 100) -> Tuple[bytes, Optional[int]]:
+        """Return the page of quizzes whose id is greater than after_id"""
+        return self._slice(bisect_right(self.ids, after_id), limit)
+
+    def _slice(self, start: int, limit: int) -> Tuple[bytes, Optional[int]]:
+        end = start + limit
+        content = b"[" + b",".join(self.items[start:end]) + b"]"
+        return content, self.ids[end - 1] if start < end < len(self.ids) else None
+
+class QuestionPool:
+    """Question ids of one quiz or category with their quiz ids, sorted by id
+
+    Parallel arrays keep a pool of thousands of questions in a few dozen KB
+    and let sessions sample positions without touching the database.
+    """
+
+    __slots__ = ("ids", "quiz_ids")
+
+    def __init__(self):
+        self.ids = array("l")
+        self.quiz_ids = array("l")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def position(self, question_id: int) -> Optional[int]:
+        """Index of a question in the pool, or None if it is not part of it"""
+        index = bisect_left(self.ids, question_id)
+        if index < len(self.ids) and self.ids[index] == question_id:
+            return index
+        return None
+
+class QuestionPools:
+    """Pools of the questions of active quizzes, per quiz and per category"""
+
+    def __init__(self, rows: Iterable[Tuple[int, int, str]]):
+        self.quizzes: Dict[int, QuestionPool] = {}
+        self.categories: Dict[str, QuestionPool] = {}
+        # Rows are sorted by question id, so every pool is too
+        for question_id, quiz_id, category in rows:
+            for pool in (
+                self.quizzes.setdefault(quiz_id, QuestionPool()),
+                self.categories.setdefault(category, QuestionPool()),
+            ):
+                pool.ids.append(question_id)
+                pool.quiz_ids.append(quiz_id)
+
+# Snapshots and pools are rebuilt lazily after every invalidation. The
+# version and the time of the last change are shared through Redis so that
+# a write on one pod invalidates all of them.
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_CHANGED_KEY = "catalog:changed_at"
+_snapshots: Dict[CatalogKey, CatalogSnapshot] = {}
+_pools: Optional[QuestionPools] = None
+_version: Optional[str] = None
+_changed_at = 0.0
+
+async def _sync_version() -> None:
+    """Drop local snapshots if another pod changed the catalog"""
+    global _pools, _version, _changed_at
+    try:
+        current, changed_at = await redis_client.mget(CATALOG_VERSION_KEY, CATALOG_CHANGED_KEY)
+    except redis.RedisError:
+        return
+    if current != _version:
+        _snapshots.clear()
+        _pools = None
+        _version = current
+    _changed_at = max(_changed_at, float(changed_at or 0))
+
+async def get_catalog_db(request: Request):
+    """Session for catalog reads: the replica, unless the catalog changed so
+    recently that the replica may not have the change yet
+
+    What is read here is kept in the snapshots and the response cache until
+    the next change, so it must not come from a lagging replica.
+    """
+    await _sync_version()
+    recent = time.time() - _changed_at < settings.REPLICA_MAX_LAG_SECONDS
+    sessionmaker = ReadSessionLocal if request.method in READ_METHODS and not recent else SessionLocal
+    async with sessionmaker() as db:
+        yield db
+
+async def load_quizzes(
+    db: AsyncSession,
+    is_active: Optional[bool] = None,
+    category: Optional[str] = None
+) -> List[Quiz]:
+    """Load quizzes with their questions in two queries (selectin)"""
+    query = select(Quiz).options(selectinload(Quiz.questions))
+    if is_active is not None:
+        query = query.where(Quiz.is_active == is_active)
+    if category:
+        query = query.where(Quiz.category == category)
+    result = await db.execute(query.order_by(Quiz.id))
+    return list(result.scalars().all())
+
+QUIZ_FIELDS, QUIZ_COLUMNS = schema_columns(QuizResponse, Quiz, exclude=("questions",))
+QUESTION_FIELDS, QUESTION_COLUMNS = schema_columns(QuestionResponse, Question)
+
+async def load_catalog_entries(
+    db: AsyncSession,
+    is_active: Optional[bool] = None,
+    category: Optional[str] = None
+) -> List[CatalogEntry]:
+    """Encode quizzes and questions straight from column tuples (FAST_JSON)"""
+    query = select(*QUIZ_COLUMNS)
+    if is_active is not None:
+        query = query.where(Quiz.is_active == is_active)
+    if category:
+        query = query.where(Quiz.category == category)
+    quizzes = (await db.execute(query.order_by(Quiz.id))).all()
+    
+    questions: Dict[int, List[Dict[str, Any]]] = {}
+    if quizzes:
+        result = await db.execute(
+            select(*QUESTION_COLUMNS)
+            .where(Question.quiz_id.in_([row.id for row in quizzes]))
+            .order_by(Question.quiz_id, Question.id)
+        )
+        for row in result:
+            questions.setdefault(row.quiz_id, []).append(dict(zip(QUESTION_FIELDS, row)))
+    
+    entries = []
+    for row in quizzes:
+        quiz_questions = questions.get(row.id, [])
+        quiz = dict(zip(QUIZ_FIELDS, row))
+        quiz["questions"] = quiz_questions
+        changed = _latest(
+            row.updated_at, row.created_at,
+            *(question[name] for question in quiz_questions for name in ("updated_at", "created_at"))
+        )
+        entries.append((row.id, dumps(quiz), changed))
+    return entries
+
+async def get_snapshot(
+    db: AsyncSession,
+    is_active: Optional[bool] = None,
+    category: Optional[str] = None
+) -> CatalogSnapshot:
+    """Return the catalog snapshot for a filter, building it on first use"""
+    await _sync_version()
+    key = (is_active, category or None)
+    snapshot = _snapshots.get(key)
+    if snapshot is None:
+        if FAST_JSON:
+            snapshot = CatalogSnapshot(await load_catalog_entries(db, is_active, category))
+        else:
+            snapshot = CatalogSnapshot.from_quizzes(await load_quizzes(db, is_active, category))
+        _snapshots[key] = snapshot
+    return snapshot
+
+async def catalog_validator(
+    db: AsyncSession,
+    quiz_id: Optional[int] = None,
+    is_active: Optional[bool] = None,
+    category: Optional[str] = None,
+    **_: Any
+) -> Tuple[Optional[datetime], int]:
+    """Latest change and row count of the quizzes (and their questions) a catalog read renders"""
+    query = select(
+        func.max(func.coalesce(Quiz.updated_at, Quiz.created_at)),
+        func.max(func.coalesce(Question.updated_at, Question.created_at)),
+        func.count(distinct(Quiz.id)) + func.count(Question.id)
+    ).select_from(Quiz).outerjoin(Question, Question.quiz_id == Quiz.id)
+    if quiz_id:
+        query = query.where(Quiz.id == quiz_id)
+    if is_active is not None:
+        query = query.where(Quiz.is_active == is_active)
+    if category:
+        query = query.where(Quiz.category == category)
+    quiz_changed, question_changed, count = (await db.execute(query)).one()
+    return _latest(quiz_changed, question_changed), count
+
+async def get_question_pools(db: AsyncSession) -> QuestionPools:
+    """Return the question pools, building them on first use"""
+    global _pools
+    await _sync_version()
+    if _pools is None:
+        result = await db.execute(
+            select(Question.id, Question.quiz_id, Quiz.category)
+            .join(Quiz, Quiz.id == Question.quiz_id)
+            .where(Quiz.is_active.is_(True))
+            .order_by(Question.id)
+        )
+        _pools = QuestionPools(result.all())
+    return _pools
+
+async def invalidate_catalog() -> None:
+    """Drop all snapshots after quizzes or questions change"""
+    global _pools, _changed_at
+    _snapshots.clear()
+    _pools = None
+    _changed_at = time.time()
+    await purge_tags(CATALOG_TAG)
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.incr(CATALOG_VERSION_KEY)
+            pipe.set(CATALOG_CHANGED_KEY, repr(_changed_at))
+            await pipe.execute()
+    except redis.RedisError:
+        pass
@@ -1,26 +1,165 @@
-from sqlalchemy import create_engine
+from typing import Any, Dict, Optional
+import time
+import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
+from fastapi import Request
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from .config import settings
+from .metrics import REDIS_LATENCY, instrument_engine
 
-# Create database engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    echo=settings.DEBUG
-)
+def async_database_url(url: str) -> str:
+    """Map a sync database URL onto its asyncio driver"""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+# Checkout counters of the primary and replica pools
+pool_stats: Dict[str, Dict[str, float]] = {}
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long checkouts wait for a connection"""
+
+    def _do_get(self):
+        stats = pool_stats[self.logging_name]
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            stats["timeouts"] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            stats["wait_seconds_total"] += waited
+            stats["wait_seconds_max"] = max(stats["wait_seconds_max"], waited)
+
+def engine_options(name: str, url: str) -> Dict[str, Any]:
+    """Pool and driver options for an engine, from Settings"""
+    options: Dict[str, Any] = {"echo": settings.DEBUG, "pool_logging_name": name}
+    if settings.DB_PGBOUNCER:
+        # PgBouncer (transaction mode) does the pooling; asyncpg must not keep
+        # prepared statements, which do not survive a change of server connection
+        options["poolclass"] = NullPool
+        if url.startswith("postgresql+asyncpg://"):
+            options["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+    elif not url.startswith("sqlite"):
+        options.update(
+            poolclass=MeteredQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            pool_use_lifo=settings.DB_POOL_USE_LIFO
+        )
+    return options
+
+def create_engine(name: str, url: str) -> AsyncEngine:
+    """Create an engine whose pool reports into pool_stats[name]"""
+    url = async_database_url(url)
+    engine = create_async_engine(url, **engine_options(name, url))
+    stats = pool_stats[name] = {
+        "connects": 0, "checkouts": 0, "checkins": 0, "timeouts": 0,
+        "wait_seconds_total": 0.0, "wait_seconds_max": 0.0
+    }
+    for event_name in ("connect", "checkout", "checkin"):
+        def count(*args, counter=event_name + "s"):
+            stats[counter] += 1
+        event.listen(engine.sync_engine.pool, event_name, count)
+    instrument_engine(name, engine)
+    return engine
+
+def pool_status() -> Dict[str, Dict[str, Any]]:
+    """Checkout counters plus the live occupancy of each pool"""
+    status = {}
+    engines = {"primary": engine, "replica": replica_engine}
+    for name, pool_engine in engines.items():
+        if pool_engine is None:
+            continue
+        pool = pool_engine.sync_engine.pool
+        status[name] = dict(pool_stats[name], pool=pool.status())
+        if isinstance(pool, QueuePool):
+            status[name].update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    return status
+
+# Primary engine for writes and read-your-writes reads
+engine = create_engine("primary", settings.DATABASE_URL)
+# Optional read replica; GET requests are routed to it by get_db
+replica_engine = create_engine("replica", settings.DATABASE_REPLICA_URL) if settings.DATABASE_REPLICA_URL else None
 
 # Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+ReadSessionLocal = async_sessionmaker(
+    bind=replica_engine or engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+# Redis connection pool shared by every request
+redis_pool = redis.ConnectionPool(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    decode_responses=True
+)
+class InstrumentedPipeline(Pipeline):
+    """Pipeline whose round-trips are timed as a single PIPELINE command"""
+
+    async def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            REDIS_LATENCY.labels("PIPELINE").observe(time.perf_counter() - started)
+
+class InstrumentedRedis(redis.Redis):
+    """Redis client that times every command"""
+
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_LATENCY.labels(str(args[0]).upper()).observe(time.perf_counter() - started)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+redis_client = InstrumentedRedis(connection_pool=redis_pool)
 
 # Create Base class
 Base = declarative_base()
 
+# Methods whose requests never write
+READ_METHODS = {"GET", "HEAD"}
+
 # Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db(request: Request):
+    """Session on the replica for GET/HEAD requests, on the primary otherwise"""
+    sessionmaker = ReadSessionLocal if request.method in READ_METHODS else SessionLocal
+    async with sessionmaker() as db:
         yield db
-    finally:
-        db.close() 
\ No newline at end of file
+
+async def get_primary_db():
+    """Session on the primary, for reads that must see the latest writes
+
+    Anything that fills a cache after an invalidation reads here: filling it
+    from a lagging replica would keep stale data until the next write.
+    """
+    async with SessionLocal() as db:
+        yield db
+
+async def init_db():
+    """Create database tables"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+async def close_connections():
+    """Release pooled database and Redis connections"""
+    await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+    await redis_pool.disconnect()
@@ -0,0 +1,70 @@
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional, Sequence
+import csv
+import io
+import json
+from sqlalchemy import select
+from .config import settings
+from .database import ReadSessionLocal
+from .models import QuizAttempt, UserProgress
+
+# Columns exported per dataset, in output order
+EXPORT_COLUMNS: Dict[str, Sequence[Any]] = {
+    "attempts": (
+        QuizAttempt.id, QuizAttempt.user_id, QuizAttempt.quiz_id, QuizAttempt.score,
+        QuizAttempt.time_taken, QuizAttempt.completed_at, QuizAttempt.answers,
+    ),
+    "progress": (
+        UserProgress.id, UserProgress.user_id, UserProgress.quiz_id, UserProgress.best_score,
+        UserProgress.attempts_count, UserProgress.completed, UserProgress.last_attempt_at,
+        UserProgress.created_at, UserProgress.updated_at,
+    ),
+}
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def _plain(value: Any) -> Any:
+    """Convert a column value into something JSON and CSV can hold"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def _csv_cell(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"))
+    return _plain(value)
+
+async def stream_export(dataset: str, fmt: str, quiz_id: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Yield a dataset as NDJSON or CSV, one encoded chunk per fetched batch
+
+    Rows come from a server-side cursor EXPORT_BATCH_SIZE at a time, so
+    memory stays flat however large the table is. The generator opens its
+    own session because it outlives the request handler.
+    """
+    columns = EXPORT_COLUMNS[dataset]
+    names = [column.key for column in columns]
+    query = select(*columns).order_by(columns[0])
+    if quiz_id is not None:
+        query = query.where(columns[0].class_.quiz_id == quiz_id)
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer is not None:
+        writer.writerow(names)
+        yield buffer.getvalue().encode("utf-8")
+    
+    async with ReadSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            buffer.seek(0)
+            buffer.truncate()
+            for row in rows:
+                if writer is not None:
+                    writer.writerow([_csv_cell(value) for value in row])
+                else:
+                    buffer.write(json.dumps(
+                        {name: _plain(value) for name, value in zip(names, row)},
+                        separators=(",", ":")
+                    ))
+                    buffer.write("\n")
+            yield buffer.getvalue().encode("utf-8")
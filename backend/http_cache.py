@@ -0,0 +1,199 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Sequence, Tuple, Union
+import functools
+import hashlib
+import inspect
+import json
+import redis.asyncio as redis
+from fastapi import Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from .cache import TTLCache, cache_stats, tag_versions, user_tag
+from .config import settings
+from .database import redis_client
+from .serialization import FAST_JSON, dumps
+
+def make_etag(*parts: Union[str, bytes]) -> str:
+    """Strong ETag over the given parts"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else part.encode("utf-8"))
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match already names this ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+def http_date(value: datetime) -> str:
+    """Format a timestamp for Last-Modified; naive values are taken as UTC"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
+
+def not_modified_since(request: Request, last_modified: Optional[str]) -> bool:
+    """Whether If-Modified-Since is at or after Last-Modified"""
+    header = request.headers.get("if-modified-since")
+    if not header or not last_modified:
+        return False
+    try:
+        return parsedate_to_datetime(header) >= parsedate_to_datetime(last_modified)
+    except (TypeError, ValueError):
+        return False
+
+def conditional_response(
+    request: Request,
+    content: bytes,
+    etag: str,
+    media_type: str = "application/json",
+    cache_control: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Serve pre-encoded content, or 304 when the client already has it"""
+    headers = {**(headers or {}), "ETag": etag}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+    if request.headers.get("if-none-match"):
+        unchanged = etag_matches(request, etag)
+    else:
+        unchanged = not_modified_since(request, headers.get("Last-Modified"))
+    if unchanged:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=content, media_type=media_type, headers=headers)
+
+class CachedResponse(NamedTuple):
+    """Encoded body of a cached route response with its validators"""
+    content: bytes
+    etag: str
+    media_type: str
+    headers: Dict[str, str]
+
+    def pack(self) -> str:
+        return json.dumps([self.etag, self.media_type, self.headers, self.content.decode("utf-8")])
+
+    @classmethod
+    def unpack(cls, packed: str) -> "CachedResponse":
+        etag, media_type, headers, content = json.loads(packed)
+        return cls(content.encode("utf-8"), etag, media_type, headers)
+
+# Encoded responses of routes declared with cache_response. Keys embed the
+# versions of the route's tags, so purge_tags() makes old entries unreachable
+# and they simply age out.
+response_cache = TTLCache(settings.RESPONSE_CACHE_SIZE, settings.RESPONSE_CACHE_TTL_SECONDS)
+RESPONSE_CACHE_KEY = "response_cache:{key}"
+# Endpoint headers that are part of the cached representation
+CACHED_HEADERS = ("last-modified", "x-next-cursor")
+
+# Called with a route's arguments; returns the latest updated_at and the row
+# count of the data behind its response, which stand in for the body in ETags
+Validator = Callable[..., Awaitable[Tuple[Optional[datetime], int]]]
+
+def _encode(result: Any, etag: Optional[str] = None) -> Optional[CachedResponse]:
+    if isinstance(result, Response):
+        if result.status_code != status.HTTP_200_OK or not hasattr(result, "body"):
+            return None
+        content = bytes(result.body)
+        media_type = result.media_type or "application/json"
+        headers = {name.title(): value for name, value in result.headers.items() if name in CACHED_HEADERS}
+    else:
+        encoded = jsonable_encoder(result)
+        content = dumps(encoded) if FAST_JSON else json.dumps(encoded, separators=(",", ":")).encode("utf-8")
+        media_type = "application/json"
+        headers = {}
+    return CachedResponse(content, etag or make_etag(content), media_type, headers)
+
+async def _get_shared(key: str) -> Optional[CachedResponse]:
+    try:
+        packed = await redis_client.get(RESPONSE_CACHE_KEY.format(key=key))
+    except redis.RedisError:
+        cache_stats["errors"] += 1
+        return None
+    return CachedResponse.unpack(packed) if packed is not None else None
+
+async def _set_shared(key: str, cached: CachedResponse) -> None:
+    try:
+        await redis_client.setex(RESPONSE_CACHE_KEY.format(key=key), settings.RESPONSE_CACHE_TTL_SECONDS, cached.pack())
+    except redis.RedisError:
+        cache_stats["errors"] += 1
+
+def cache_response(
+    *tags: str,
+    vary_user: bool = False,
+    shared: bool = False,
+    cache_control: Optional[str] = None,
+    validator: Optional[Validator] = None
+) -> Callable:
+    """Cache a GET route's encoded response and answer conditional requests
+
+    Entries are keyed by path, query string and, with vary_user, the calling
+    principal (whose user tag is then added to the route's tags). shared
+    also keeps entries in Redis so that other pods can serve them.
+
+    With a validator the ETag is derived from its result and the tag
+    versions instead of the body, so on a cache miss a matching
+    If-None-Match is answered with 304 without running the route's query
+    or serializing anything.
+    """
+    def decorator(endpoint: Callable) -> Callable:
+        signature = inspect.signature(endpoint)
+        wants_request = "request" in signature.parameters
+        if not wants_request:
+            signature = signature.replace(parameters=[
+                *signature.parameters.values(),
+                inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+            ])
+
+        @functools.wraps(endpoint)
+        async def wrapper(**kwargs: Any) -> Response:
+            request: Request = kwargs["request"] if wants_request else kwargs.pop("request")
+            route_tags: Sequence[str] = tags
+            parts = [request.url.path, str(sorted(request.query_params.multi_items()))]
+            if vary_user:
+                user_id = kwargs["current_user"].id
+                route_tags = (*tags, user_tag(user_id))
+                parts.append(str(user_id))
+            versions = await tag_versions(route_tags)
+            key = make_etag(*parts, versions).strip('"')
+
+            cached = response_cache.get(key)
+            if cached is None and shared and settings.RESPONSE_CACHE_REDIS:
+                cached = await _get_shared(key)
+                if cached is not None:
+                    response_cache.set(key, cached)
+            if cached is None:
+                etag = None
+                if validator is not None:
+                    # Validated before running the route, so a change racing
+                    # with it can only make the ETag stale, never the body
+                    latest, count = await validator(**kwargs)
+                    # The tag versions catch writes that leave the validator
+                    # alone (edits within one timestamp tick, bulk UPDATEs
+                    # skipping onupdate). Only the versions shared through
+                    # Redis are used, so that every pod computes one ETag.
+                    shared_versions = versions.partition(":")[2] or versions
+                    etag = make_etag(*parts, shared_versions, str(latest), str(count))
+                    if etag_matches(request, etag):
+                        return conditional_response(request, b"", etag, cache_control=cache_control)
+                result = await endpoint(**kwargs)
+                cached = _encode(result, etag)
+                if cached is None:
+                    return result
+                response_cache.set(key, cached)
+                if shared and settings.RESPONSE_CACHE_REDIS:
+                    await _set_shared(key, cached)
+
+            return conditional_response(
+                request, cached.content, cached.etag, cached.media_type,
+                cache_control=cache_control, headers=cached.headers
+            )
+
+        wrapper.__signature__ = signature
+        return wrapper
+    return decorator
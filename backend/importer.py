@@ -0,0 +1,225 @@
+"""Bulk import of question banks
+
+A bank is either nested JSON/YAML (quizzes with their questions) or a flat
+CSV with one question per row and the quiz repeated in `quiz_*` columns.
+Rows are validated one at a time with the API schemas, then written in
+batched executemany inserts and updates inside a single transaction.
+
+Imports are idempotent: quizzes are matched on (title, category) and
+questions on (quiz, question_text), so re-running a bank updates rows in
+place instead of duplicating them.
+
+Run from the command line with:
+    python -m backend.importer <bank.json|bank.yaml|bank.csv> [--dry-run]
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+import asyncio
+import csv
+import io
+import json
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from .catalog import invalidate_catalog
+from .config import settings
+from .database import SessionLocal
+from .models import Quiz, Question
+from .schemas import ImportReport, ImportRowError, QuestionWithAnswer, QuizCreate
+from .scoring import invalidate_answer_key
+
+IMPORT_FORMATS = ("json", "yaml", "csv")
+QUESTION_FIELDS = tuple(QuestionWithAnswer.model_fields)
+
+# (row number, {"quiz": {...}, "question": {...}})
+BankRow = Tuple[int, Dict[str, Dict[str, Any]]]
+
+def detect_format(filename: str) -> str:
+    """Infer the bank format from a file name"""
+    extension = filename.rsplit(".", 1)[-1].lower()
+    return "yaml" if extension == "yml" else extension
+
+def _nested_rows(document: Any) -> Iterator[BankRow]:
+    quizzes = document.get("quizzes", []) if isinstance(document, dict) else document
+    if not isinstance(quizzes, list):
+        raise ValueError("Expected a list of quizzes")
+    index = 0
+    for quiz in quizzes:
+        if not isinstance(quiz, dict):
+            raise ValueError("Expected each quiz to be an object")
+        quiz = dict(quiz)
+        questions = quiz.pop("questions", None) or []
+        for question in questions:
+            if not isinstance(question, dict):
+                raise ValueError("Expected each question to be an object")
+            index += 1
+            yield index, {"quiz": quiz, "question": question}
+
+def _csv_rows(text: str) -> Iterator[BankRow]:
+    reader = csv.DictReader(io.StringIO(text))
+    index = 0
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as exc:
+            raise ValueError(f"row {index + 1}: {exc}")
+        index += 1
+        # Empty cells fall back to the schema defaults
+        quiz = {name[5:]: value for name, value in row.items() if name and name.startswith("quiz_") and value != ""}
+        question = {name: row[name] for name in QUESTION_FIELDS if row.get(name) not in (None, "")}
+        yield index, {"quiz": quiz, "question": question}
+
+def decode_bank(content: bytes) -> str:
+    """Decode a bank as UTF-8, naming the line of the first invalid byte"""
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError as exc:
+        line = content.count(b"\n", 0, exc.start) + 1
+        raise ValueError(f"line {line}: not valid UTF-8 ({exc.reason})")
+
+def parse_bank(fmt: str, text: str) -> Iterator[BankRow]:
+    """Iterate the rows of a question bank"""
+    if fmt == "csv":
+        return _csv_rows(text)
+    if fmt == "json":
+        return _nested_rows(json.loads(text))
+    if fmt == "yaml":
+        import yaml
+        try:
+            document = yaml.safe_load(text)
+        except yaml.YAMLError as exc:
+            raise ValueError(str(exc))
+        return _nested_rows(document)
+    raise ValueError(f"Unsupported format '{fmt}', expected one of {', '.join(IMPORT_FORMATS)}")
+
+def _error_detail(exc: Exception, section: str) -> str:
+    if isinstance(exc, ValidationError):
+        return "; ".join(
+            f"{section}.{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+            for error in exc.errors()
+        )
+    return f"{section}: {exc}"
+
+def _validate(raw: Dict[str, Dict[str, Any]]) -> Tuple[QuizCreate, QuestionWithAnswer]:
+    """Validate one bank row, raising ValueError with a readable detail"""
+    try:
+        quiz = QuizCreate.model_validate(raw["quiz"])
+    except ValidationError as exc:
+        raise ValueError(_error_detail(exc, "quiz"))
+    question = dict(raw["question"])
+    try:
+        if isinstance(question.get("options"), str):
+            question["options"] = json.loads(question["options"])
+        return quiz, QuestionWithAnswer.model_validate(question)
+    except (ValidationError, ValueError) as exc:
+        raise ValueError(_error_detail(exc, "question"))
+
+def _batches(rows: List[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+    for start in range(0, len(rows), settings.IMPORT_BATCH_SIZE):
+        yield rows[start:start + settings.IMPORT_BATCH_SIZE]
+
+async def import_bank(db: AsyncSession, rows: Iterable[BankRow], dry_run: bool = False) -> ImportReport:
+    """Validate and upsert a question bank in one transaction"""
+    report = ImportReport(dry_run=dry_run)
+    quizzes: Dict[Tuple[str, str], QuizCreate] = {}
+    questions: Dict[Tuple[str, str], Dict[str, QuestionWithAnswer]] = {}
+    
+    # Streaming validation pass: bad rows are reported, the rest imported
+    for index, raw in rows:
+        try:
+            quiz, question = _validate(raw)
+        except ValueError as exc:
+            report.errors.append(ImportRowError(index=index, detail=str(exc)))
+            continue
+        key = (quiz.title, quiz.category)
+        quizzes.setdefault(key, quiz)
+        bank = questions.setdefault(key, {})
+        if question.question_text in bank:
+            report.errors.append(ImportRowError(index=index, detail="Duplicate question in bank"))
+            continue
+        bank[question.question_text] = question
+    
+    if not quizzes:
+        return report
+    
+    # Resolve quizzes by natural key, creating the missing ones
+    result = await db.execute(
+        select(Quiz.id, Quiz.title, Quiz.category)
+        .where(Quiz.title.in_({title for title, _ in quizzes}))
+        .order_by(Quiz.id)
+    )
+    quiz_ids: Dict[Tuple[str, str], int] = {}
+    for row in result:
+        quiz_ids.setdefault((row.title, row.category), row.id)
+    
+    missing = [key for key in quizzes if key not in quiz_ids]
+    if missing:
+        result = await db.execute(
+            insert(Quiz).returning(Quiz.id, sort_by_parameter_order=True),
+            [quizzes[key].model_dump() for key in missing]
+        )
+        quiz_ids.update(zip(missing, result.scalars().all()))
+        report.quizzes_created = len(missing)
+    
+    # Diff questions against what is already stored
+    result = await db.execute(
+        select(Question).where(Question.quiz_id.in_(quiz_ids.values()))
+    )
+    existing = {(question.quiz_id, question.question_text): question for question in result.scalars()}
+    
+    inserts: List[Dict[str, Any]] = []
+    updates: List[Dict[str, Any]] = []
+    touched = set()
+    for key, bank in questions.items():
+        quiz_id = quiz_ids[key]
+        for text, question in bank.items():
+            values = question.model_dump()
+            stored = existing.get((quiz_id, text))
+            if stored is None:
+                inserts.append({**values, "quiz_id": quiz_id})
+            elif any(getattr(stored, name) != value for name, value in values.items()):
+                updates.append({**values, "id": stored.id})
+            else:
+                report.questions_unchanged += 1
+                continue
+            touched.add(quiz_id)
+    
+    for batch in _batches(inserts):
+        await db.execute(insert(Question), batch)
+    for batch in _batches(updates):
+        await db.execute(update(Question), batch)
+    if touched:
+        # Bumping updated_at versions the cached answer keys
+        await db.execute(update(Quiz).where(Quiz.id.in_(touched)).values(updated_at=func.now()))
+    report.questions_created = len(inserts)
+    report.questions_updated = len(updates)
+    
+    if dry_run:
+        await db.rollback()
+        return report
+    
+    await db.commit()
+    for quiz_id in touched:
+        await invalidate_answer_key(quiz_id)
+    if touched or missing:
+        await invalidate_catalog()
+    return report
+
+async def _main(argv: List[str]) -> None:
+    paths = [arg for arg in argv if not arg.startswith("--")]
+    if len(paths) != 1:
+        raise SystemExit("usage: python -m backend.importer <bank.json|bank.yaml|bank.csv> [--dry-run]")
+    with open(paths[0], "rb") as f:
+        content = f.read()
+    async with SessionLocal() as db:
+        try:
+            rows = parse_bank(detect_format(paths[0]), decode_bank(content))
+            report = await import_bank(db, rows, dry_run="--dry-run" in argv)
+        except ValueError as exc:
+            raise SystemExit(f"Invalid question bank: {exc}")
+    print(report.model_dump_json(indent=2))
+
+if __name__ == "__main__":
+    import sys
+    asyncio.run(_main(sys.argv[1:]))
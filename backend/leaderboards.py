@@ -0,0 +1,221 @@
+"""Per-quiz and global leaderboards kept in Redis sorted sets
+
+Members are user ids. A member's ZSET score packs the points (best score in
+hundredths; for the global board, the sum of the user's per-quiz bests)
+into the high bits and the inverted time it was reached, in seconds since
+2024-01-01 UTC, into the low 30 bits (enough until 2058), so equal points
+rank whoever got there first. Doubles hold integers exactly up to 2**53,
+which leaves 2**23 hundredths for the points: 838 perfect quiz scores on
+the global board.
+
+Rebuild from PostgreSQL after a Redis flush with:
+    python -m backend.leaderboards rebuild
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import redis.asyncio as redis
+from fastapi import HTTPException, status
+from sqlalchemy import and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .config import settings
+from .database import SessionLocal, redis_client
+from .models import QuizAttempt, User, UserProgress
+
+GLOBAL_BOARD_KEY = "leaderboard:global"
+QUIZ_BOARD_KEY = "leaderboard:quiz:{quiz_id}"
+TIME_BITS = 2 ** 30
+BOARD_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+# Most points a board entry holds exactly (838 perfect scores)
+MAX_POINTS = 2 ** 53 // TIME_BITS - 1
+
+# KEYS: quiz board, global board. ARGV: user id, points, board time.
+# Raises the user's quiz entry if the new points beat it and moves the
+# global entry by the improvement, atomically. Scores are formatted with
+# %.17g: Lua's default number-to-string conversion (%.14g) would round
+# away the low time bits.
+RECORD_SCORE_LUA = """
+local shift = 1073741824
+local points = tonumber(ARGV[2])
+local stamp = shift - 1 - tonumber(ARGV[3])
+local new = points * shift + stamp
+local old = redis.call('ZSCORE', KEYS[1], ARGV[1])
+local old_points = 0
+if old then
+    old = tonumber(old)
+    if new <= old then return 0 end
+    old_points = math.floor(old / shift)
+end
+redis.call('ZADD', KEYS[1], string.format('%.17g', new), ARGV[1])
+local total = points - old_points
+local current = redis.call('ZSCORE', KEYS[2], ARGV[1])
+if current then total = total + math.floor(tonumber(current) / shift) end
+redis.call('ZADD', KEYS[2], string.format('%.17g', total * shift + stamp), ARGV[1])
+return 1
+"""
+_record_score = redis_client.register_script(RECORD_SCORE_LUA)
+
+def quiz_board_key(quiz_id: int) -> str:
+    return QUIZ_BOARD_KEY.format(quiz_id=quiz_id)
+
+def to_points(score: float) -> int:
+    """Score percentage in hundredths"""
+    return int(round(score * 100))
+
+def board_time(moment: datetime) -> int:
+    """Seconds since BOARD_EPOCH of a (naive UTC or aware) datetime, clamped to TIME_BITS"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return min(max(int((moment - BOARD_EPOCH).total_seconds()), 0), TIME_BITS - 1)
+
+def pack(points: int, timestamp: int) -> int:
+    """ZSET score of points reached at a time"""
+    return points * TIME_BITS + (TIME_BITS - 1 - timestamp)
+
+def unpack_points(value: float) -> float:
+    """Score percentage (or sum of them) held in a ZSET score"""
+    return (int(value) // TIME_BITS) / 100
+
+async def record_score(user_id: int, quiz_id: int, score: float, completed_at: datetime) -> None:
+    """Feed a scored attempt into the quiz and global boards"""
+    try:
+        await _record_score(
+            keys=[quiz_board_key(quiz_id), GLOBAL_BOARD_KEY],
+            args=[user_id, to_points(score), board_time(completed_at)]
+        )
+    except redis.RedisError:
+        # The boards are derived data; a rebuild restores missed updates
+        pass
+
+async def _usernames(db: AsyncSession, user_ids: List[int]) -> Dict[int, str]:
+    if not user_ids:
+        return {}
+    result = await db.execute(select(User.id, User.username).where(User.id.in_(user_ids)))
+    return dict(result.all())
+
+async def get_board(db: AsyncSession, key: str, user_id: int, limit: int = 10) -> Dict[str, Any]:
+    """Top entries of a board plus the requesting user's rank"""
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.zrevrange(key, 0, limit - 1, withscores=True)
+            pipe.zrevrank(key, user_id)
+            pipe.zscore(key, user_id)
+            pipe.zcard(key)
+            top, my_rank, my_score, size = await pipe.execute()
+    except redis.RedisError:
+        # The boards only live in Redis
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Leaderboards are temporarily unavailable"
+        )
+    
+    names = await _usernames(db, [int(member) for member, _ in top])
+    entries = [
+        {
+            "rank": position + 1,
+            "user_id": int(member),
+            "username": names.get(int(member)),
+            "score": unpack_points(value),
+        }
+        for position, (member, value) in enumerate(top)
+    ]
+    me = None
+    if my_rank is not None:
+        me = {"rank": my_rank + 1, "user_id": user_id, "score": unpack_points(my_score)}
+    return {"entries": entries, "me": me, "total": size}
+
+def _best_scores(*criteria: Any):
+    """(user, quiz, best score, earliest time it was reached) of progress rows"""
+    return (
+        select(
+            UserProgress.user_id, UserProgress.quiz_id, UserProgress.best_score,
+            func.min(QuizAttempt.completed_at).label("reached_at")
+        )
+        .join(QuizAttempt, and_(
+            QuizAttempt.user_id == UserProgress.user_id,
+            QuizAttempt.quiz_id == UserProgress.quiz_id,
+            QuizAttempt.score >= UserProgress.best_score
+        ))
+        .where(*criteria)
+        .group_by(UserProgress.user_id, UserProgress.quiz_id, UserProgress.best_score)
+        .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+    )
+
+async def rebuild_leaderboards(db: AsyncSession) -> Dict[str, int]:
+    """Recreate every board from user_progress and quiz_attempts
+
+    The time of each best score is the earliest attempt that reached it.
+    Boards are written under temporary keys and swapped in with RENAME.
+    """
+    suffix = ":rebuild"
+    totals: Dict[int, Tuple[int, int]] = {}
+    quiz_keys = set()
+    entries = 0
+    result = await db.stream(_best_scores())
+    async for rows in result.partitions():
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for user_id, quiz_id, best_score, reached_at in rows:
+                points, timestamp = to_points(best_score or 0), board_time(reached_at)
+                key = quiz_board_key(quiz_id) + suffix
+                quiz_keys.add(key)
+                pipe.zadd(key, {user_id: pack(points, timestamp)})
+                total, latest = totals.get(user_id, (0, 0))
+                totals[user_id] = (total + points, max(latest, timestamp))
+                entries += 1
+            await pipe.execute()
+    
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for user_id, (total, latest) in totals.items():
+            pipe.zadd(GLOBAL_BOARD_KEY + suffix, {user_id: pack(total, latest)})
+        await pipe.execute()
+    
+    stale = [key async for key in redis_client.scan_iter(match=QUIZ_BOARD_KEY.format(quiz_id="*"))
+             if not key.endswith(suffix) and key + suffix not in quiz_keys]
+    async with redis_client.pipeline(transaction=True) as pipe:
+        for key in quiz_keys:
+            pipe.rename(key, key[:-len(suffix)])
+        if totals:
+            pipe.rename(GLOBAL_BOARD_KEY + suffix, GLOBAL_BOARD_KEY)
+        else:
+            pipe.delete(GLOBAL_BOARD_KEY)
+        if stale:
+            pipe.delete(*stale)
+        await pipe.execute()
+    return {"quizzes": len(quiz_keys), "entries": entries, "users": len(totals)}
+
+async def rebuild_quiz_leaderboard(db: AsyncSession, quiz_id: int) -> Dict[str, int]:
+    """Recreate one quiz's board and the global entries of the users on it
+
+    For re-scoring a single quiz: only the progress of users who took it is
+    read, and no other quiz board is touched.
+    """
+    players = select(UserProgress.user_id).where(UserProgress.quiz_id == quiz_id)
+    scores: Dict[int, int] = {}
+    totals: Dict[int, Tuple[int, int]] = {}
+    result = await db.stream(_best_scores(UserProgress.user_id.in_(players)))
+    async for rows in result.partitions():
+        for user_id, row_quiz_id, best_score, reached_at in rows:
+            points, timestamp = to_points(best_score or 0), board_time(reached_at)
+            if row_quiz_id == quiz_id:
+                scores[user_id] = pack(points, timestamp)
+            total, latest = totals.get(user_id, (0, 0))
+            totals[user_id] = (total + points, max(latest, timestamp))
+    
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.delete(quiz_board_key(quiz_id))
+        if scores:
+            pipe.zadd(quiz_board_key(quiz_id), scores)
+        if totals:
+            pipe.zadd(GLOBAL_BOARD_KEY, {user_id: pack(total, latest) for user_id, (total, latest) in totals.items()})
+        await pipe.execute()
+    return {"entries": len(scores), "users": len(totals)}
+
+async def _main(command: Optional[str]) -> None:
+    if command != "rebuild":
+        raise SystemExit("usage: python -m backend.leaderboards rebuild")
+    async with SessionLocal() as db:
+        print(await rebuild_leaderboards(db))
+
+if __name__ == "__main__":
+    import sys
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -0,0 +1,204 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+import json
+import os
+from .cache import TTLCache
+from .http_cache import make_etag
+from .text_index import InvertedIndex
+
+RESOURCES_DIR = Path(__file__).resolve().parent / "resources"
+SOURCES_PATH = RESOURCES_DIR / "learning_sources.json"
+MARKDOWN_PATH = RESOURCES_DIR / "learning_sources.md"
+MARKDOWN_LAST_UPDATED = "2024-03-15"
+
+# Fields that can be filtered on, each backed by an index
+INDEXED_FIELDS = ("category", "difficulty", "type", "cost")
+
+# Served when learning_sources.json is missing
+FALLBACK_SOURCES: Dict[str, Any] = {
+    "learning_sources": [
+        {
+            "id": "kube-academy",
+            "title": "KubeAcademy",
+            "url": "https://kube.academy",
+            "provider": "VMware",
+            "type": "learning_platform",
+            "difficulty": "mixed",
+            "category": "kubernetes",
+            "description": "Free Kubernetes learning platform offering courses, tutorials, and hands-on labs for all skill levels.",
+            "topics": [
+                "Kubernetes Fundamentals",
+                "Advanced Concepts",
+                "Security",
+                "Networking",
+                "Storage",
+                "Monitoring",
+                "Troubleshooting",
+                "Best Practices"
+            ],
+            "duration": "self-paced",
+            "cost": "free",
+            "rating": 4.7
+        },
+        {
+            "id": "freecodecamp-kcna",
+            "title": "KCNA Study Course on freeCodeCamp",
+            "url": "https://www.freecodecamp.org/news/tag/kubernetes/",
+            "provider": "freeCodeCamp",
+            "type": "course",
+            "difficulty": "beginner",
+            "category": "kubernetes",
+            "description": "Comprehensive study guide and practice materials for the Kubernetes and Cloud Native Associate (KCNA) certification exam.",
+            "topics": [
+                "Kubernetes Fundamentals",
+                "Cloud Native Concepts",
+                "Container Orchestration",
+                "Microservices Architecture",
+                "DevOps Practices",
+                "Exam Preparation",
+                "Practice Questions"
+            ],
+            "duration": "self-paced",
+            "cost": "free",
+            "rating": 4.8
+        }
+    ],
+    "categories": {
+        "kubernetes": {
+            "name": "Kubernetes",
+            "description": "Container orchestration and management"
+        }
+    },
+    "difficulty_levels": {
+        "beginner": {
+            "name": "Beginner",
+            "description": "No prior experience required"
+        },
+        "intermediate": {
+            "name": "Intermediate",
+            "description": "Some prior knowledge recommended"
+        }
+    }
+}
+
+# Query shape: (filters as sorted (field, value) pairs, topic, sort, skip, limit)
+SourcesQuery = Tuple[Tuple[Tuple[str, str], ...], Optional[str], Optional[str], int, Optional[int]]
+
+class LearningSourcesIndex:
+    """Parsed learning sources with per-field indexes and encoded responses"""
+
+    def __init__(self, document: Dict[str, Any], mtime: Optional[float]):
+        self.document = document
+        self.mtime = mtime
+        self.sources: List[Dict[str, Any]] = document.get("learning_sources", [])
+        self.body = json.dumps(document, separators=(",", ":")).encode("utf-8")
+        self.etag = make_etag(self.body)
+        self.indexes: Dict[str, Dict[str, Set[int]]] = {field: {} for field in INDEXED_FIELDS}
+        self.topics: Dict[str, Set[int]] = {}
+        for position, source in enumerate(self.sources):
+            for field in INDEXED_FIELDS:
+                value = source.get(field)
+                if value is not None:
+                    self.indexes[field].setdefault(str(value).lower(), set()).add(position)
+            for topic in source.get("topics", []):
+                self.topics.setdefault(topic.lower(), set()).add(position)
+        # Encoded filtered responses, valid for the lifetime of this index
+        self.responses = TTLCache(maxsize=256, ttl=float("inf"))
+        self.text_index = InvertedIndex()
+        for position, source in enumerate(self.sources):
+            self.text_index.add(position, [
+                (source.get("title", ""), 3.0),
+                (" ".join(source.get("topics", [])), 2.0),
+                (source.get("provider", ""), 1.0),
+                (source.get("description", ""), 1.0),
+            ])
+        self.text_index.freeze()
+
+    def select(self, filters: Dict[str, str], topic: Optional[str]) -> List[int]:
+        """Positions of the sources matching every filter, in file order"""
+        matches: Optional[Set[int]] = None
+        for field, value in filters.items():
+            found = self.indexes[field].get(value.lower(), set())
+            matches = found if matches is None else matches & found
+        if topic:
+            found = self.topics.get(topic.lower(), set())
+            matches = found if matches is None else matches & found
+        if matches is None:
+            return list(range(len(self.sources)))
+        return sorted(matches)
+
+    def query(self, query: SourcesQuery) -> Tuple[bytes, str]:
+        """Encoded response body and ETag of a filtered, sorted page"""
+        cached = self.responses.get(query)
+        if cached is not None:
+            return cached
+
+        filters, topic, sort, skip, limit = query
+        positions = self.select(dict(filters), topic)
+        if sort in ("rating", "-rating"):
+            positions.sort(key=lambda p: self.sources[p].get("rating") or 0, reverse=sort == "-rating")
+        total = len(positions)
+        end = None if limit is None else skip + limit
+        page = [self.sources[p] for p in positions[skip:end]]
+
+        document = {**self.document, "learning_sources": page, "total": total}
+        body = json.dumps(document, separators=(",", ":")).encode("utf-8")
+        encoded = (body, make_etag(self.etag, repr(query)))
+        self.responses.set(query, encoded)
+        return encoded
+
+class MarkdownDocument:
+    """Learning sources markdown with its encoded JSON response"""
+
+    def __init__(self, content: str, mtime: float):
+        self.mtime = mtime
+        self.body = json.dumps({
+            "content": content,
+            "format": "markdown",
+            "last_updated": MARKDOWN_LAST_UPDATED
+        }).encode("utf-8")
+        self.etag = make_etag(self.body)
+
+_index: Optional[LearningSourcesIndex] = None
+_markdown: Optional[MarkdownDocument] = None
+
+def _mtime(path: Path) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+def get_index() -> LearningSourcesIndex:
+    """Current learning sources index, reloaded when the file changes"""
+    global _index
+    mtime = _mtime(SOURCES_PATH)
+    if _index is None or _index.mtime != mtime:
+        if mtime is None:
+            _index = LearningSourcesIndex(FALLBACK_SOURCES, None)
+        else:
+            with open(SOURCES_PATH, "r", encoding="utf-8") as f:
+                _index = LearningSourcesIndex(json.load(f), mtime)
+    return _index
+
+def get_markdown() -> MarkdownDocument:
+    """Current markdown document, reloaded when the file changes
+
+    Raises FileNotFoundError when the file does not exist.
+    """
+    global _markdown
+    mtime = _mtime(MARKDOWN_PATH)
+    if mtime is None:
+        _markdown = None
+        raise FileNotFoundError(str(MARKDOWN_PATH))
+    if _markdown is None or _markdown.mtime != mtime:
+        with open(MARKDOWN_PATH, "r", encoding="utf-8") as f:
+            _markdown = MarkdownDocument(f.read(), mtime)
+    return _markdown
+
+def load_learning_sources() -> None:
+    """Load both documents up front, e.g. at startup"""
+    get_index()
+    try:
+        get_markdown()
+    except FileNotFoundError:
+        pass
@@ -1,32 +1,64 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, status, BackgroundTasks, File, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from fastapi.security import HTTPBearer
+from prometheus_client import REGISTRY
+from sqlalchemy import select, text, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-import redis
-import json
-import os
-from datetime import datetime, timedelta
+from datetime import datetime
 
-from .database import get_db, engine
-from .models import Base, User, Quiz, Question, UserProgress, QuizAttempt
+from .database import get_db, get_primary_db, init_db, close_connections, pool_status, SessionLocal, redis_client
+from .models import User, Quiz, Question, UserProgress, QuizAttempt
 from .schemas import (
     UserCreate, UserResponse, QuizCreate, QuizResponse, 
-    QuestionCreate, QuestionResponse, QuizAttemptCreate,
-    QuizAttemptResponse, UserProgressResponse
+    QuestionCreate, QuestionResponse, QuestionAdminResponse, QuizAttemptCreate,
+    QuizAttemptResponse, UserProgressResponse, Principal,
+    QuizAttemptBatchCreate, QuizAttemptBatchItem, QuizAttemptBatchResponse, ImportReport,
+    QuizSessionCreate, QuizSessionAnswer, QuizSessionResponse, QuizSessionResult, SessionQuestion,
+    ReviewAnswer, ReviewCard, ReviewResult
+)
+from .auth import (
+    create_user_token, get_current_user, verify_password_async,
+    get_password_hash_async, hash_executor, hash_pool_status
 )
-from .auth import create_access_token, get_current_user, verify_password, get_password_hash
 from .config import settings
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
+from .catalog import CATALOG_TAG, catalog_validator, get_catalog_db, get_question_pools, get_snapshot, invalidate_catalog
+from .cache import read_through, invalidate_user, dump_model, dump_models, cache_stats
+from .scoring import AnswerKey, get_answer_key, invalidate_answer_key
+from .submissions import ScoredAttempt, progress_validator, record_attempt, record_attempts
+from .write_behind import enqueue_attempts
+from .exports import EXPORT_COLUMNS, EXPORT_FORMATS, stream_export
+from .http_cache import cache_response, conditional_response, http_date
+from .learning_sources import get_index, get_markdown, load_learning_sources
+from .ratelimit import RateLimitMiddleware
+from .reviews import backfill_reviews, due_reviews, record_review
+from .search import SEARCH_TYPES, search
+from .sessions import (
+    QuizSession, claim_attempt, create_session, finish_session, get_session, grade_session,
+    record_answer, release_attempt, store_result
+)
+from .analytics import backfill_analytics, get_quiz_stats, record_attempt_stats
+from .importer import IMPORT_FORMATS, decode_bank, detect_format, import_bank, parse_bank
+from .rescoring import create_job, get_job, run_rescore_job
+from .leaderboards import GLOBAL_BOARD_KEY, quiz_board_key, get_board, record_score, rebuild_leaderboards
+from .metrics import MetricsMiddleware, StatsCollector, metrics_body
+from .serialization import FAST_JSON, dump_rows, default_response_class, schema_columns
+from .text_index import tokenize
+from .pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_id_cursor, decode_time_id_cursor, page_response, pack_page, unpack_page
 
 app = FastAPI(
     title="KCNA Learning Platform API",
     description="A comprehensive API for learning Kubernetes concepts",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=default_response_class()
 )
 
+# Rate limiting runs inside the metrics middleware so 429s are recorded
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
+REGISTRY.register(StatsCollector(pool_status, hash_pool_status, cache_stats))
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -34,17 +66,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-)
-
-# Redis connection
-redis_client = redis.Redis(
-    host=settings.REDIS_HOST,
-    port=settings.REDIS_PORT,
-    decode_responses=True
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 security = HTTPBearer()
 
+# Learning sources are public and change only on deploy
+LEARNING_SOURCES_CACHE_CONTROL = "public, max-age=300"
+# Authenticated responses: browsers keep them but must revalidate via ETag
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+# Columns of QuizAttemptResponse, for the FAST_JSON attempt history path
+ATTEMPT_FIELDS, ATTEMPT_COLUMNS = schema_columns(QuizAttemptResponse, QuizAttempt)
+
+@app.on_event("startup")
+async def create_tables():
+    """Create database tables and load static resources"""
+    await init_db()
+    load_learning_sources()
+
+@app.on_event("shutdown")
+async def shutdown_pools():
+    """Stop the password hashing workers and close pooled connections"""
+    hash_executor.shutdown(wait=False)
+    await close_connections()
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -54,16 +100,22 @@ async def root():
         "status": "healthy"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    content, media_type = metrics_body()
+    return Response(content=content, media_type=media_type)
+
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
     try:
         # Test database connection
-        db = next(get_db())
-        db.execute("SELECT 1")
+        async with SessionLocal() as db:
+            await db.execute(text("SELECT 1"))
         
         # Test Redis connection
-        redis_client.ping()
+        await redis_client.ping()
         
         return {
             "status": "healthy",
@@ -79,10 +131,11 @@ async def health_check():
 
 # Authentication endpoints
 @app.post("/auth/register", response_model=UserResponse)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user"""
     # Check if user already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    result = await db.execute(select(User).where(User.email == user_data.email))
+    existing_user = result.scalars().first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -90,7 +143,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     user = User(
         email=user_data.email,
         username=user_data.username,
@@ -98,22 +151,23 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     return user
 
 @app.post("/auth/login")
-async def login(email: str, password: str, db: Session = Depends(get_db)):
+async def login(email: str, password: str, db: AsyncSession = Depends(get_db)):
     """Login user and return access token"""
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.hashed_password):
+    result = await db.execute(select(User).where(User.email == email))
+    user = result.scalars().first()
+    if not user or not await verify_password_async(password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_user_token(user)
     return {
         "access_token": access_token,
         "token_type": "bearer",
@@ -122,36 +176,51 @@ async def login(email: str, password: str, db: Session = Depends(get_db)):
 
 # Quiz endpoints
 @app.get("/quizzes", response_model=List[QuizResponse])
+@cache_response(CATALOG_TAG, cache_control=PRIVATE_CACHE_CONTROL, validator=catalog_validator)
 async def get_quizzes(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=settings.PAGE_SIZE_MAX),
+    is_active: Optional[bool] = None,
+    category: Optional[str] = None,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_catalog_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Get all available quizzes"""
-    quizzes = db.query(Quiz).offset(skip).limit(limit).all()
-    return quizzes
+    snapshot = await get_snapshot(db, is_active, category)
+    if cursor:
+        content, last_id = snapshot.page_after(decode_id_cursor(cursor), limit)
+    else:
+        content, last_id = snapshot.page(skip, limit)
+    response = page_response(content, encode_cursor(last_id) if last_id is not None else None)
+    latest = snapshot.latest()
+    if latest is not None:
+        response.headers["Last-Modified"] = http_date(latest)
+    return response
 
 @app.get("/quizzes/{quiz_id}", response_model=QuizResponse)
+@cache_response(CATALOG_TAG, cache_control=PRIVATE_CACHE_CONTROL, validator=catalog_validator)
 async def get_quiz(
     quiz_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_catalog_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Get a specific quiz with its questions"""
-    quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
+    snapshot = await get_snapshot(db)
+    quiz = snapshot.by_id.get(quiz_id)
     if not quiz:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Quiz not found"
         )
-    return quiz
+    headers = {"Last-Modified": http_date(snapshot.last_modified[quiz_id])} if quiz_id in snapshot.last_modified else None
+    return Response(content=quiz, media_type="application/json", headers=headers)
 
 @app.post("/quizzes", response_model=QuizResponse)
 async def create_quiz(
     quiz_data: QuizCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Create a new quiz (admin only)"""
     if not current_user.is_admin:
@@ -162,32 +231,45 @@ async def create_quiz(
     
     quiz = Quiz(**quiz_data.dict())
     db.add(quiz)
-    db.commit()
-    db.refresh(quiz)
+    await db.commit()
+    await db.refresh(quiz, ["created_at", "updated_at", "questions"])
+    await invalidate_catalog()
     return quiz
 
 # Question endpoints
 @app.get("/questions", response_model=List[QuestionResponse])
+@cache_response(CATALOG_TAG, shared=True, cache_control=PRIVATE_CACHE_CONTROL, validator=catalog_validator)
 async def get_questions(
     quiz_id: Optional[int] = None,
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_catalog_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Get questions, optionally filtered by quiz"""
-    query = db.query(Question)
+    query = select(Question)
     if quiz_id:
-        query = query.filter(Question.quiz_id == quiz_id)
+        query = query.where(Question.quiz_id == quiz_id)
+    if cursor:
+        query = query.where(Question.id > decode_id_cursor(cursor))
+    else:
+        query = query.offset(skip)
     
-    questions = query.offset(skip).limit(limit).all()
-    return questions
+    result = await db.execute(query.order_by(Question.id).limit(limit))
+    questions = result.scalars().all()
+    next_cursor = encode_cursor(questions[-1].id) if questions and len(questions) == limit else None
+    response = page_response(dump_models(QuestionResponse, questions), next_cursor)
+    changed = [question.updated_at or question.created_at for question in questions]
+    if any(changed):
+        response.headers["Last-Modified"] = http_date(max(filter(None, changed)))
+    return response
 
-@app.post("/questions", response_model=QuestionResponse)
+@app.post("/questions", response_model=QuestionAdminResponse)
 async def create_question(
     question_data: QuestionCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Create a new question (admin only)"""
     if not current_user.is_admin:
@@ -198,140 +280,628 @@ async def create_question(
     
     question = Question(**question_data.dict())
     db.add(question)
-    db.commit()
-    db.refresh(question)
+    # Bumping the quiz's updated_at versions its cached answer key
+    await db.execute(
+        update(Quiz).where(Quiz.id == question_data.quiz_id).values(updated_at=datetime.utcnow())
+    )
+    await db.commit()
+    await db.refresh(question)
+    await invalidate_answer_key(question.quiz_id)
+    await invalidate_catalog()
     return question
 
+@app.post("/admin/import", response_model=ImportReport)
+async def import_question_bank(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    dry_run: bool = False,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Bulk import a JSON, YAML or CSV question bank (admin only)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    
+    fmt = format or detect_format(file.filename or "")
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported format, expected one of: {', '.join(IMPORT_FORMATS)}"
+        )
+    content = await file.read(settings.IMPORT_MAX_BYTES + 1)
+    if len(content) > settings.IMPORT_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Question bank too large"
+        )
+    
+    try:
+        rows = parse_bank(fmt, decode_bank(content))
+        return await import_bank(db, rows, dry_run=dry_run)
+    except ValueError as exc:
+        # Undecodable or malformed documents; row-level problems are reported instead
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid question bank: {exc}"
+        )
+
 # Quiz attempt endpoints
 @app.post("/quiz-attempts", response_model=QuizAttemptResponse)
 async def submit_quiz_attempt(
     attempt_data: QuizAttemptCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Submit a quiz attempt and calculate score"""
-    # Get the quiz
-    quiz = db.query(Quiz).filter(Quiz.id == attempt_data.quiz_id).first()
-    if not quiz:
+    answer_key = await get_answer_key(db, attempt_data.quiz_id)
+    if answer_key is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Quiz not found"
         )
     
-    # Get all questions for this quiz
-    questions = db.query(Question).filter(Question.quiz_id == attempt_data.quiz_id).all()
-    
-    # Calculate score
-    correct_answers = 0
-    total_questions = len(questions)
-    
-    for question in questions:
-        if question.id in attempt_data.answers:
-            user_answer = attempt_data.answers[question.id]
-            if user_answer == question.correct_answer:
-                correct_answers += 1
-    
-    score = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
-    
-    # Create quiz attempt
-    attempt = QuizAttempt(
+    score, _ = answer_key.score(attempt_data.answers)
+    attempt = await record_attempt(
+        db,
         user_id=current_user.id,
         quiz_id=attempt_data.quiz_id,
         answers=attempt_data.answers,
         score=score,
-        completed_at=datetime.utcnow()
+        passed=answer_key.passed(score),
+        time_taken=attempt_data.time_taken,
+        update_progress=not settings.WRITE_BEHIND,
+        answer_key=None if settings.WRITE_BEHIND else answer_key
     )
+    await _after_attempt(db, attempt, answer_key, attempt_data.answers)
     
-    db.add(attempt)
-    db.commit()
-    db.refresh(attempt)
-    
-    # Update user progress
-    progress = db.query(UserProgress).filter(
-        UserProgress.user_id == current_user.id,
-        UserProgress.quiz_id == attempt_data.quiz_id
-    ).first()
-    
-    if not progress:
-        progress = UserProgress(
-            user_id=current_user.id,
-            quiz_id=attempt_data.quiz_id,
-            best_score=score,
-            attempts_count=1,
-            last_attempt_at=datetime.utcnow()
-        )
-        db.add(progress)
+    return attempt
+
+async def _after_attempt(db: AsyncSession, attempt: QuizAttempt, answer_key: AnswerKey, answers: dict) -> None:
+    """Update caches, leaderboards and analytics (or queue them) for a new attempt"""
+    await invalidate_user(attempt.user_id)
+    if settings.WRITE_BEHIND:
+        await enqueue_attempts(db, [attempt])
     else:
-        progress.attempts_count += 1
-        progress.last_attempt_at = datetime.utcnow()
-        if score > progress.best_score:
-            progress.best_score = score
-    
-    db.commit()
-    
-    # Cache the result in Redis
-    cache_key = f"quiz_attempt:{attempt.id}"
-    redis_client.setex(
-        cache_key,
-        3600,  # 1 hour TTL
-        json.dumps({
-            "id": attempt.id,
-            "score": score,
-            "total_questions": total_questions,
-            "correct_answers": correct_answers
-        })
+        await record_score(attempt.user_id, attempt.quiz_id, attempt.score, attempt.completed_at)
+        await record_attempt_stats(attempt.id, answer_key, answers, attempt.score)
+
+@app.post("/quiz-attempts/batch", response_model=QuizAttemptBatchResponse)
+async def submit_quiz_attempts_batch(
+    batch: QuizAttemptBatchCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Submit many quiz attempts at once, e.g. replayed by offline clients"""
+    if len(batch.attempts) > settings.QUIZ_ATTEMPT_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.QUIZ_ATTEMPT_BATCH_MAX} attempts per batch"
+        )
+    
+    answer_keys = {}
+    for quiz_id in {item.quiz_id for item in batch.attempts}:
+        answer_keys[quiz_id] = await get_answer_key(db, quiz_id)
+    
+    results = [QuizAttemptBatchItem(index=index, status="error") for index in range(len(batch.attempts))]
+    scored, scored_indexes = [], []
+    for index, item in enumerate(batch.attempts):
+        answer_key = answer_keys[item.quiz_id]
+        if answer_key is None:
+            results[index].detail = "Quiz not found"
+            continue
+        score, _ = answer_key.score(item.answers)
+        scored.append(ScoredAttempt(item.quiz_id, item.answers, score, answer_key.passed(score), item.time_taken))
+        scored_indexes.append(index)
+    
+    attempts = await record_attempts(
+        db, current_user.id, scored,
+        update_progress=not settings.WRITE_BEHIND,
+        answer_keys=None if settings.WRITE_BEHIND else answer_keys
     )
+    for index, attempt in zip(scored_indexes, attempts):
+        results[index].status = "created"
+        results[index].attempt = QuizAttemptResponse.model_validate(attempt)
+        if not settings.WRITE_BEHIND:
+            await record_score(current_user.id, attempt.quiz_id, attempt.score, attempt.completed_at)
+            await record_attempt_stats(attempt.id, answer_keys[attempt.quiz_id], batch.attempts[index].answers, attempt.score)
+    if attempts:
+        await invalidate_user(current_user.id)
+        if settings.WRITE_BEHIND:
+            await enqueue_attempts(db, attempts)
     
-    return attempt
+    return QuizAttemptBatchResponse(results=results)
+
+# Adaptive quiz sessions
+@app.post("/quiz-sessions", response_model=QuizSessionResponse, status_code=status.HTTP_201_CREATED)
+async def start_quiz_session(
+    session_data: QuizSessionCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Start a session of questions sampled from a quiz or a category"""
+    if (session_data.quiz_id is None) == (session_data.category is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give either quiz_id or category"
+        )
+    if not 1 <= session_data.size <= settings.SESSION_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"size must be between 1 and {settings.SESSION_MAX_QUESTIONS}"
+        )
+    
+    pools = await get_question_pools(db)
+    if session_data.quiz_id is not None:
+        pool = pools.quizzes.get(session_data.quiz_id)
+    else:
+        pool = pools.categories.get(session_data.category)
+    if pool is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No active questions to sample"
+        )
+    
+    time_limit = None
+    if session_data.quiz_id is not None:
+        result = await db.execute(select(Quiz.time_limit).where(Quiz.id == session_data.quiz_id))
+        time_limit = result.scalar()
+    session = await create_session(
+        db, current_user.id, pool, session_data.size,
+        session_data.quiz_id, session_data.category, time_limit
+    )
+    return await _session_response(db, session)
+
+@app.get("/quiz-sessions/{session_id}", response_model=QuizSessionResponse)
+async def get_quiz_session(
+    session_id: str,
+    db: AsyncSession = Depends(get_primary_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Get a session's current question, or its result once finished"""
+    session = await _own_session(session_id, current_user)
+    return await _session_response(db, session)
+
+@app.post("/quiz-sessions/{session_id}/answer", response_model=QuizSessionResponse)
+async def answer_quiz_session(
+    session_id: str,
+    answer: QuizSessionAnswer,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Answer the current question and get the next one"""
+    session = await _own_session(session_id, current_user)
+    if session.finished:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Session expired" if session.expired else "Session finished"
+        )
+    position = await record_answer(session, answer.answer)
+    if position is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Question already answered"
+        )
+    
+    session = session._replace(
+        position=position,
+        answers={**session.answers, session.position: answer.answer}
+    )
+    return await _session_response(db, session)
+
+async def _own_session(session_id: str, current_user: Principal) -> QuizSession:
+    session = await get_session(session_id)
+    if session is None or session.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found"
+        )
+    return session
+
+async def _session_response(db: AsyncSession, session: QuizSession) -> QuizSessionResponse:
+    """Serve the current question, finishing the session after the last one"""
+    question = None
+    while not session.finished:
+        question = await db.get(Question, session.question_ids[session.position])
+        if question is not None:
+            break
+        # Deleted since the session was sampled: pass over it unanswered.
+        # It left the answer key too, so it carries no points.
+        position = await record_answer(session, "")
+        session = session._replace(position=position if position is not None else session.position + 1)
+    
+    response = QuizSessionResponse(
+        session_id=session.session_id,
+        quiz_id=session.quiz_id,
+        category=session.category,
+        position=min(session.position, session.total),
+        total=session.total,
+        deadline=session.deadline_at()
+    )
+    if question is not None:
+        response.question = SessionQuestion.model_validate(question)
+        return response
+    
+    result = session.result
+    if result is None:
+        result = await finish_session(session, await grade_session(db, session))
+    if result.get("attempt_id") is None:
+        # Retried until recorded, so a failure here does not lose the attempt
+        answer_key = await _session_answer_key(db, session)
+        if answer_key is not None and await claim_attempt(session):
+            result["attempt_id"] = await _record_session_attempt(db, session, answer_key)
+            await store_result(session, result)
+    response.result = QuizSessionResult(**result)
+    return response
+
+async def _session_answer_key(db: AsyncSession, session: QuizSession) -> Optional[AnswerKey]:
+    """Answer key of the quiz a session covered in full, if it did"""
+    if session.quiz_id is None:
+        return None
+    answer_key = await get_answer_key(db, session.quiz_id)
+    if answer_key is None or set(answer_key.question_ids) != set(session.question_ids):
+        return None
+    return answer_key
+
+async def _record_session_attempt(db: AsyncSession, session: QuizSession, answer_key: AnswerKey) -> int:
+    """Record a finished session as a quiz attempt"""
+    answers = {
+        question_id: session.answers[index]
+        for index, question_id in enumerate(session.question_ids)
+        if index in session.answers
+    }
+    score, _ = answer_key.score(answers)
+    try:
+        attempt = await record_attempt(
+            db,
+            user_id=session.user_id,
+            quiz_id=session.quiz_id,
+            answers=answers,
+            score=score,
+            passed=answer_key.passed(score),
+            update_progress=not settings.WRITE_BEHIND,
+            answer_key=None if settings.WRITE_BEHIND else answer_key
+        )
+    except Exception:
+        # Nothing was recorded; let a retry claim the attempt again
+        await release_attempt(session)
+        raise
+    await _after_attempt(db, attempt, answer_key, answers)
+    return attempt.id
+
+# Spaced-repetition reviews
+@app.get("/reviews/due", response_model=List[ReviewCard])
+async def get_due_reviews(
+    limit: int = Query(20, ge=1, le=settings.REVIEW_DUE_MAX),
+    quiz_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_primary_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Get your review cards that are due, most overdue first"""
+    cards = await due_reviews(db, current_user.id, limit, quiz_id)
+    questions = {}
+    if cards:
+        result = await db.execute(select(Question).where(Question.id.in_([card.question_id for card in cards])))
+        questions = {question.id: question for question in result.scalars()}
+    return [
+        ReviewCard(
+            question=SessionQuestion.model_validate(questions[card.question_id]),
+            repetitions=card.repetitions,
+            interval_days=card.interval_days,
+            lapses=card.lapses,
+            next_review_at=card.next_review_at
+        )
+        for card in cards if card.question_id in questions
+    ]
+
+@app.post("/reviews/{question_id}/answer", response_model=ReviewResult)
+async def answer_review(
+    question_id: int,
+    answer: ReviewAnswer,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Answer a review card and reschedule it"""
+    question = await db.get(Question, question_id)
+    if question is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Question not found"
+        )
+    
+    correct = answer.answer == question.correct_answer
+    state = await record_review(db, current_user.id, question.id, question.quiz_id, correct)
+    await db.commit()
+    return ReviewResult(
+        question_id=question.id,
+        correct=correct,
+        correct_answer=question.correct_answer,
+        explanation=question.explanation,
+        interval_days=state.interval_days,
+        next_review_at=state.next_review_at
+    )
+
+@app.post("/admin/reviews/backfill")
+async def backfill_reviews_endpoint(
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Build review cards from all existing attempts (admin only)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return await backfill_reviews(db)
 
 @app.get("/quiz-attempts", response_model=List[QuizAttemptResponse])
 async def get_user_attempts(
     quiz_id: Optional[int] = None,
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_primary_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Get user's quiz attempts"""
-    query = db.query(QuizAttempt).filter(QuizAttempt.user_id == current_user.id)
-    if quiz_id:
-        query = query.filter(QuizAttempt.quiz_id == quiz_id)
+    after = decode_time_id_cursor(cursor) if cursor else None
+    
+    async def load():
+        query = select(*ATTEMPT_COLUMNS) if FAST_JSON else select(QuizAttempt)
+        query = query.where(QuizAttempt.user_id == current_user.id)
+        if quiz_id:
+            query = query.where(QuizAttempt.quiz_id == quiz_id)
+        if after:
+            query = query.where(tuple_(QuizAttempt.completed_at, QuizAttempt.id) < after)
+        else:
+            query = query.offset(skip)
+        result = await db.execute(
+            query.order_by(QuizAttempt.completed_at.desc(), QuizAttempt.id.desc()).limit(limit)
+        )
+        attempts = result.all() if FAST_JSON else result.scalars().all()
+        next_cursor = None
+        if attempts and len(attempts) == limit:
+            next_cursor = encode_cursor(attempts[-1].completed_at, attempts[-1].id)
+        if FAST_JSON:
+            return pack_page(dump_rows(ATTEMPT_FIELDS, attempts).decode("utf-8"), next_cursor)
+        return pack_page(dump_models(QuizAttemptResponse, attempts), next_cursor)
     
-    attempts = query.order_by(QuizAttempt.completed_at.desc()).offset(skip).limit(limit).all()
-    return attempts
+    field = f"attempts:{quiz_id or 'all'}:{cursor or skip}:{limit}"
+    content, next_cursor = unpack_page(await read_through(current_user.id, field, load))
+    return page_response(content, next_cursor)
 
 # Progress endpoints
 @app.get("/progress", response_model=List[UserProgressResponse])
+@cache_response(vary_user=True, cache_control=PRIVATE_CACHE_CONTROL, validator=progress_validator)
 async def get_user_progress(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_primary_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Get user's learning progress"""
-    progress = db.query(UserProgress).filter(UserProgress.user_id == current_user.id).all()
-    return progress
+    async def load():
+        result = await db.execute(select(UserProgress).where(UserProgress.user_id == current_user.id))
+        return dump_models(UserProgressResponse, result.scalars().all())
+    
+    content = await read_through(current_user.id, "progress:all", load)
+    return Response(content=content, media_type="application/json")
 
 @app.get("/progress/{quiz_id}", response_model=UserProgressResponse)
+@cache_response(vary_user=True, cache_control=PRIVATE_CACHE_CONTROL, validator=progress_validator)
 async def get_quiz_progress(
     quiz_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_primary_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Get user's progress for a specific quiz"""
-    progress = db.query(UserProgress).filter(
-        UserProgress.user_id == current_user.id,
-        UserProgress.quiz_id == quiz_id
-    ).first()
+    async def load():
+        result = await db.execute(select(UserProgress).where(
+            UserProgress.user_id == current_user.id,
+            UserProgress.quiz_id == quiz_id
+        ))
+        return dump_model(UserProgressResponse, result.scalars().first())
     
-    if not progress:
+    content = await read_through(current_user.id, f"progress:{quiz_id}", load)
+    if content == "null":
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No progress found for this quiz"
         )
     
-    return progress
+    return Response(content=content, media_type="application/json")
+
+@app.get("/admin/export/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: str = "ndjson",
+    quiz_id: Optional[int] = None,
+    current_user: Principal = Depends(get_current_user)
+):
+    """Stream all quiz attempts or progress rows as NDJSON or CSV (admin only)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    if dataset not in EXPORT_COLUMNS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown dataset, expected one of: {', '.join(EXPORT_COLUMNS)}"
+        )
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown format, expected one of: {', '.join(EXPORT_FORMATS)}"
+        )
+    
+    return StreamingResponse(
+        stream_export(dataset, format, quiz_id),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.{format}"'}
+    )
+
+@app.get("/auth/hash-pool")
+async def get_hash_pool_stats(current_user: Principal = Depends(get_current_user)):
+    """Get password hashing pool queue depth and counters (admin only)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return hash_pool_status()
+
+@app.get("/admin/db-pool")
+async def get_db_pool_status(current_user: Principal = Depends(get_current_user)):
+    """Get database pool occupancy and checkout wait metrics (admin only)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return pool_status()
+
+@app.get("/cache/stats")
+async def get_cache_stats(current_user: Principal = Depends(get_current_user)):
+    """Get attempt/progress cache hit and miss counters (admin only)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return cache_stats
+
+# Leaderboards
+@app.get("/leaderboards/global")
+async def get_global_leaderboard(
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Get the top users by sum of best quiz scores, plus your own rank"""
+    return await get_board(db, GLOBAL_BOARD_KEY, current_user.id, limit)
+
+@app.get("/leaderboards/quizzes/{quiz_id}")
+async def get_quiz_leaderboard(
+    quiz_id: int,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Get the top users by best score on a quiz, plus your own rank"""
+    return await get_board(db, quiz_board_key(quiz_id), current_user.id, limit)
+
+@app.post("/admin/leaderboards/rebuild")
+async def rebuild_leaderboards_endpoint(
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Recreate all leaderboards from the database (admin only)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return await rebuild_leaderboards(db)
+
+# Analytics
+@app.get("/analytics/quizzes/{quiz_id}")
+async def get_quiz_analytics(
+    quiz_id: int,
+    current_user: Principal = Depends(get_current_user)
+):
+    """Get pass rate, score statistics and per-question difficulty (admin only)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return await get_quiz_stats(quiz_id)
+
+@app.post("/admin/analytics/backfill")
+async def backfill_analytics_endpoint(
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Recompute analytics aggregates from all attempts (admin only)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return await backfill_analytics(db)
+
+@app.post("/admin/quizzes/{quiz_id}/rescore", status_code=status.HTTP_202_ACCEPTED)
+async def rescore_quiz_endpoint(
+    quiz_id: int,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Re-score all attempts of a quiz after an answer-key fix (admin only)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    if await db.get(Quiz, quiz_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Quiz not found"
+        )
+    
+    job_id = await create_job(quiz_id)
+    background_tasks.add_task(run_rescore_job, quiz_id, job_id)
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/admin/rescore-jobs/{job_id}")
+async def get_rescore_job(
+    job_id: str,
+    current_user: Principal = Depends(get_current_user)
+):
+    """Get the progress of a re-score job (admin only)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Re-score job not found"
+        )
+    return job
+
+# Search
+@app.get("/search")
+async def search_content(
+    q: str,
+    types: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Full-text search over questions, quizzes and learning sources"""
+    requested = [t for t in (types.split(",") if types else SEARCH_TYPES) if t]
+    unknown = [t for t in requested if t not in SEARCH_TYPES]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown search types: {', '.join(unknown)}"
+        )
+    if not tokenize(q):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Search query has no searchable terms"
+        )
+    
+    return {"query": q, "results": await search(db, q, requested, skip, limit)}
 
 # KCNA Learning Resources
 @app.get("/learning-resources")
+@cache_response(cache_control=LEARNING_SOURCES_CACHE_CONTROL)
 async def get_learning_resources():
     """Get KCNA learning resources and topics"""
     return {
@@ -420,97 +990,40 @@ async def get_learning_resources():
     }
 
 @app.get("/external-learning-sources")
-async def get_external_learning_sources():
+async def get_external_learning_sources(
+    request: Request,
+    category: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    type: Optional[str] = None,
+    cost: Optional[str] = None,
+    topic: Optional[str] = None,
+    sort: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=settings.PAGE_SIZE_MAX)
+):
     """Get external learning sources for KCNA certification"""
     try:
-        # Load external learning sources from JSON file
-        with open("backend/resources/learning_sources.json", "r", encoding="utf-8") as f:
-            learning_sources = json.load(f)
-        return learning_sources
-    except FileNotFoundError:
-        # Fallback to hardcoded data if file not found
-        return {
-            "learning_sources": [
-                {
-                    "id": "kube-academy",
-                    "title": "KubeAcademy",
-                    "url": "https://kube.academy",
-                    "provider": "VMware",
-                    "type": "learning_platform",
-                    "difficulty": "mixed",
-                    "category": "kubernetes",
-                    "description": "Free Kubernetes learning platform offering courses, tutorials, and hands-on labs for all skill levels.",
-                    "topics": [
-                        "Kubernetes Fundamentals",
-                        "Advanced Concepts",
-                        "Security",
-                        "Networking",
-                        "Storage",
-                        "Monitoring",
-                        "Troubleshooting",
-                        "Best Practices"
-                    ],
-                    "duration": "self-paced",
-                    "cost": "free",
-                    "rating": 4.7
-                },
-                {
-                    "id": "freecodecamp-kcna",
-                    "title": "KCNA Study Course on freeCodeCamp",
-                    "url": "https://www.freecodecamp.org/news/tag/kubernetes/",
-                    "provider": "freeCodeCamp",
-                    "type": "course",
-                    "difficulty": "beginner",
-                    "category": "kubernetes",
-                    "description": "Comprehensive study guide and practice materials for the Kubernetes and Cloud Native Associate (KCNA) certification exam.",
-                    "topics": [
-                        "Kubernetes Fundamentals",
-                        "Cloud Native Concepts",
-                        "Container Orchestration",
-                        "Microservices Architecture",
-                        "DevOps Practices",
-                        "Exam Preparation",
-                        "Practice Questions"
-                    ],
-                    "duration": "self-paced",
-                    "cost": "free",
-                    "rating": 4.8
-                }
-            ],
-            "categories": {
-                "kubernetes": {
-                    "name": "Kubernetes",
-                    "description": "Container orchestration and management"
-                }
-            },
-            "difficulty_levels": {
-                "beginner": {
-                    "name": "Beginner",
-                    "description": "No prior experience required"
-                },
-                "intermediate": {
-                    "name": "Intermediate",
-                    "description": "Some prior knowledge recommended"
-                }
-            }
-        }
+        index = get_index()
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error loading learning sources: {str(e)}"
         )
+    
+    filters = {"category": category, "difficulty": difficulty, "type": type, "cost": cost}
+    filters = tuple(sorted((field, value) for field, value in filters.items() if value))
+    if not filters and not topic and not sort and not skip and limit is None:
+        content, etag = index.body, index.etag
+    else:
+        content, etag = index.query((filters, topic, sort, skip, limit))
+    
+    return conditional_response(request, content, etag, cache_control=LEARNING_SOURCES_CACHE_CONTROL)
 
 @app.get("/learning-sources-markdown")
-async def get_learning_sources_markdown():
+async def get_learning_sources_markdown(request: Request):
     """Get learning sources in Markdown format"""
     try:
-        with open("backend/resources/learning_sources.md", "r", encoding="utf-8") as f:
-            markdown_content = f.read()
-        return {
-            "content": markdown_content,
-            "format": "markdown",
-            "last_updated": "2024-03-15"
-        }
+        markdown = get_markdown()
     except FileNotFoundError:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -521,6 +1034,8 @@ async def get_learning_sources_markdown():
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error loading markdown content: {str(e)}"
         )
+    
+    return conditional_response(request, markdown.body, markdown.etag, cache_control=LEARNING_SOURCES_CACHE_CONTROL)
 
 if __name__ == "__main__":
     import uvicorn
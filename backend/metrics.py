@@ -0,0 +1,195 @@
+"""Prometheus metrics for the API
+
+Request latency is recorded per route template by MetricsMiddleware, and
+SQL statements are counted and timed per request through engine events.
+Redis commands and bcrypt calls are timed where they are issued. Pool,
+hash-pool and cache counters are read at scrape time by StatsCollector.
+The write-behind worker (backend.worker) serves its lag and backlog
+gauges on a port of its own.
+
+With SLOW_REQUEST_LOG enabled, requests slower than SLOW_REQUEST_SECONDS
+are logged together with the statements they ran.
+"""
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from .config import settings
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"]
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements executed per request",
+    ["method", "route"], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request",
+    ["method", "route"]
+)
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed", ["engine"])
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "SQL statement latency", ["engine"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+REDIS_LATENCY = Histogram(
+    "redis_command_duration_seconds", "Redis command (or pipeline) latency", ["command"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+)
+PASSWORD_HASH_LATENCY = Histogram(
+    "password_hash_duration_seconds", "bcrypt hash/verify time, excluding queueing", ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1, 2)
+)
+RATE_LIMITED = Counter(
+    "rate_limited_requests_total", "Requests refused with 429", ["rule", "source"]
+)
+WRITE_BEHIND_EVENTS = Counter("write_behind_events_total", "Attempt events applied by the worker")
+WRITE_BEHIND_LAG = Gauge(
+    "write_behind_lag_seconds", "Age of the newest attempt event when the worker applied it"
+)
+WRITE_BEHIND_BACKLOG = Gauge(
+    "write_behind_backlog", "Attempt events not yet applied", ["state"]
+)
+
+slow_request_log = logging.getLogger("backend.slow_requests")
+
+class RequestStats:
+    """SQL statements run while serving one request"""
+
+    __slots__ = ("queries", "db_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements: List[Tuple[str, float]] = []
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def instrument_engine(name: str, engine: AsyncEngine) -> None:
+    """Count and time every statement an engine executes"""
+    labels = {"engine": name}
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        DB_QUERIES.labels(**labels).inc()
+        DB_QUERY_LATENCY.labels(**labels).observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+            if settings.SLOW_REQUEST_LOG:
+                stats.statements.append((statement, elapsed))
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def failed(context):
+        # A failed statement never reaches after_cursor_execute
+        if context.connection is not None and context.execution_context is not None:
+            started = context.connection.info.get("query_started")
+            if started:
+                started.pop()
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and SQL usage per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_stats.reset(token)
+            # Label by template, never by raw path, to bound cardinality
+            route = scope.get("route")
+            route_label = getattr(route, "path_format", None) or "unmatched"
+            method = scope["method"]
+            REQUEST_LATENCY.labels(method, route_label, str(status_code)).observe(elapsed)
+            REQUEST_QUERIES.labels(method, route_label).observe(stats.queries)
+            REQUEST_DB_SECONDS.labels(method, route_label).observe(stats.db_seconds)
+            if settings.SLOW_REQUEST_LOG and elapsed >= settings.SLOW_REQUEST_SECONDS:
+                _log_slow_request(method, scope.get("path", ""), status_code, elapsed, stats)
+
+def _log_slow_request(method: str, path: str, status_code: int, elapsed: float, stats: RequestStats) -> None:
+    lines = [
+        f"{method} {path} -> {status_code} took {elapsed * 1000:.1f}ms, "
+        f"{stats.queries} queries in {stats.db_seconds * 1000:.1f}ms"
+    ]
+    for statement, seconds in stats.statements:
+        lines.append(f"  {seconds * 1000:8.2f}ms  {' '.join(statement.split())[:500]}")
+    slow_request_log.warning("\n".join(lines))
+
+class StatsCollector:
+    """Expose the app's internal counter dicts at scrape time"""
+
+    def __init__(
+        self,
+        pool_status: Callable[[], Dict[str, Dict[str, Any]]],
+        hash_pool_status: Callable[[], Dict[str, int]],
+        cache_stats: Dict[str, int]
+    ):
+        self.pool_status = pool_status
+        self.hash_pool_status = hash_pool_status
+        self.cache_stats = cache_stats
+
+    def collect(self) -> Iterable[Any]:
+        pools = self.pool_status()
+        gauges = {
+            "size": GaugeMetricFamily("db_pool_size", "Configured pool size", labels=["engine"]),
+            "checked_out": GaugeMetricFamily("db_pool_checked_out", "Connections in use", labels=["engine"]),
+            "overflow": GaugeMetricFamily("db_pool_overflow", "Connections beyond pool_size", labels=["engine"]),
+        }
+        counters = {
+            "connects": CounterMetricFamily("db_pool_connects", "New database connections", labels=["engine"]),
+            "checkouts": CounterMetricFamily("db_pool_checkouts", "Pool checkouts", labels=["engine"]),
+            "timeouts": CounterMetricFamily("db_pool_timeouts", "Checkouts that timed out", labels=["engine"]),
+            "wait_seconds_total": CounterMetricFamily(
+                "db_pool_wait_seconds", "Time spent waiting for a pooled connection", labels=["engine"]
+            ),
+        }
+        for name, stats in pools.items():
+            for key, family in gauges.items():
+                if key in stats:
+                    family.add_metric([name], stats[key])
+            for key, family in counters.items():
+                family.add_metric([name], stats[key])
+        yield from gauges.values()
+        yield from counters.values()
+        
+        hashing = self.hash_pool_status()
+        yield GaugeMetricFamily("password_hash_pending", "Queued and running bcrypt jobs", value=hashing["pending"])
+        yield CounterMetricFamily("password_hash_rejected", "bcrypt jobs rejected with 503", value=hashing["rejected"])
+        
+        cache = CounterMetricFamily("user_cache_requests", "Attempt/progress cache lookups", labels=["result"])
+        for result, count in self.cache_stats.items():
+            cache.add_metric([result], count)
+        yield cache
+
+def metrics_body() -> Tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, with its content type"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,83 @@
+"""Initial schema
+
+Databases created by Base.metadata.create_all before migrations existed
+should be marked with `alembic stamp 0001` instead of upgraded.
+
+Revision ID: 0001
+Revises:
+Create Date: 2024-03-15
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer, primary_key=True, index=True),
+        sa.Column("email", sa.String, nullable=False, unique=True, index=True),
+        sa.Column("username", sa.String, nullable=False, unique=True, index=True),
+        sa.Column("hashed_password", sa.String, nullable=False),
+        sa.Column("is_admin", sa.Boolean),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_table(
+        "quizzes",
+        sa.Column("id", sa.Integer, primary_key=True, index=True),
+        sa.Column("title", sa.String, nullable=False),
+        sa.Column("description", sa.Text),
+        sa.Column("category", sa.String, nullable=False),
+        sa.Column("difficulty", sa.String, nullable=False),
+        sa.Column("time_limit", sa.Integer),
+        sa.Column("passing_score", sa.Float),
+        sa.Column("is_active", sa.Boolean),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_table(
+        "questions",
+        sa.Column("id", sa.Integer, primary_key=True, index=True),
+        sa.Column("quiz_id", sa.Integer, sa.ForeignKey("quizzes.id"), nullable=False),
+        sa.Column("question_text", sa.Text, nullable=False),
+        sa.Column("question_type", sa.String, nullable=False),
+        sa.Column("options", sa.JSON),
+        sa.Column("correct_answer", sa.String, nullable=False),
+        sa.Column("explanation", sa.Text),
+        sa.Column("points", sa.Integer),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_table(
+        "quiz_attempts",
+        sa.Column("id", sa.Integer, primary_key=True, index=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("quiz_id", sa.Integer, sa.ForeignKey("quizzes.id"), nullable=False),
+        sa.Column("answers", sa.JSON, nullable=False),
+        sa.Column("score", sa.Float, nullable=False),
+        sa.Column("time_taken", sa.Integer),
+        sa.Column("completed_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_table(
+        "user_progress",
+        sa.Column("id", sa.Integer, primary_key=True, index=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("quiz_id", sa.Integer, sa.ForeignKey("quizzes.id"), nullable=False),
+        sa.Column("best_score", sa.Float),
+        sa.Column("attempts_count", sa.Integer),
+        sa.Column("last_attempt_at", sa.DateTime(timezone=True)),
+        sa.Column("completed", sa.Boolean),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+
+def downgrade():
+    op.drop_table("user_progress")
+    op.drop_table("quiz_attempts")
+    op.drop_table("questions")
+    op.drop_table("quizzes")
+    op.drop_table("users")
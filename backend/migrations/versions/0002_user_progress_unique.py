@@ -0,0 +1,49 @@
+"""Unique (user_id, quiz_id) on user_progress
+
+Concurrent submits could create several progress rows for the same user
+and quiz. Duplicates are merged into the oldest row before the constraint
+that backs the progress upsert is added.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-03-20
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.execute("""
+        UPDATE user_progress AS p
+        SET best_score = agg.best_score,
+            attempts_count = agg.attempts_count,
+            last_attempt_at = agg.last_attempt_at,
+            completed = agg.completed
+        FROM (
+            SELECT MIN(id) AS keep_id,
+                   MAX(best_score) AS best_score,
+                   SUM(attempts_count) AS attempts_count,
+                   MAX(last_attempt_at) AS last_attempt_at,
+                   BOOL_OR(completed) AS completed
+            FROM user_progress
+            GROUP BY user_id, quiz_id
+            HAVING COUNT(*) > 1
+        ) AS agg
+        WHERE p.id = agg.keep_id
+    """)
+    op.execute("""
+        DELETE FROM user_progress AS p
+        USING user_progress AS k
+        WHERE p.user_id = k.user_id
+          AND p.quiz_id = k.quiz_id
+          AND p.id > k.id
+    """)
+    op.create_unique_constraint(
+        "uq_user_progress_user_quiz", "user_progress", ["user_id", "quiz_id"]
+    )
+
+def downgrade():
+    op.drop_constraint("uq_user_progress_user_quiz", "user_progress", type_="unique")
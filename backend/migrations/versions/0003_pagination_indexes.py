@@ -0,0 +1,29 @@
+"""Indexes for keyset pagination of attempts and questions
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-03-25
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index(
+        "ix_quiz_attempts_user_completed", "quiz_attempts",
+        ["user_id", sa.text("completed_at DESC"), sa.text("id DESC")]
+    )
+    op.create_index(
+        "ix_quiz_attempts_user_quiz_completed", "quiz_attempts",
+        ["user_id", "quiz_id", sa.text("completed_at DESC"), sa.text("id DESC")]
+    )
+    op.create_index("ix_questions_quiz_id", "questions", ["quiz_id"])
+
+def downgrade():
+    op.drop_index("ix_questions_quiz_id", table_name="questions")
+    op.drop_index("ix_quiz_attempts_user_quiz_completed", table_name="quiz_attempts")
+    op.drop_index("ix_quiz_attempts_user_completed", table_name="quiz_attempts")
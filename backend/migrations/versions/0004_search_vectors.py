@@ -0,0 +1,32 @@
+"""Full-text search vectors on questions and quizzes (PostgreSQL)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2024-04-02
+"""
+from alembic import op
+from backend.models import QUESTION_SEARCH_VECTOR, QUIZ_SEARCH_VECTOR
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTORS = (("questions", QUESTION_SEARCH_VECTOR), ("quizzes", QUIZ_SEARCH_VECTOR))
+
+def upgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for table, expression in SEARCH_VECTORS:
+        op.execute(
+            f"ALTER TABLE {table} ADD COLUMN search_vector tsvector "
+            f"GENERATED ALWAYS AS ({expression}) STORED"
+        )
+        op.execute(f"CREATE INDEX ix_{table}_search_vector ON {table} USING GIN (search_vector)")
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for table, _ in SEARCH_VECTORS:
+        op.execute(f"DROP INDEX ix_{table}_search_vector")
+        op.execute(f"ALTER TABLE {table} DROP COLUMN search_vector")
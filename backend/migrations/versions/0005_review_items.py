@@ -0,0 +1,34 @@
+"""Spaced-repetition review cards
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2024-05-06
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "review_items",
+        sa.Column("id", sa.Integer, primary_key=True, index=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("question_id", sa.Integer, sa.ForeignKey("questions.id"), nullable=False),
+        sa.Column("quiz_id", sa.Integer, sa.ForeignKey("quizzes.id"), nullable=False),
+        sa.Column("repetitions", sa.Integer, nullable=False),
+        sa.Column("interval_days", sa.Float, nullable=False),
+        sa.Column("ease", sa.Float, nullable=False),
+        sa.Column("lapses", sa.Integer, nullable=False),
+        sa.Column("next_review_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("last_reviewed_at", sa.DateTime(timezone=True), nullable=False),
+        sa.UniqueConstraint("user_id", "question_id", name="uq_review_items_user_question"),
+    )
+    op.create_index("ix_review_items_user_due", "review_items", ["user_id", "next_review_at"])
+
+def downgrade():
+    op.drop_index("ix_review_items_user_due", table_name="review_items")
+    op.drop_table("review_items")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, Boolean, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, Boolean, JSON, ForeignKey, UniqueConstraint, Index, DDL, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -41,7 +41,7 @@ class Question(Base):
     __tablename__ = "questions"
     
     id = Column(Integer, primary_key=True, index=True)
-    quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False, index=True)
     question_text = Column(Text, nullable=False)
     question_type = Column(String, nullable=False)  # "multiple_choice", "true_false", "fill_blank"
     options = Column(JSON)  # For multiple choice questions
@@ -69,8 +69,22 @@ class QuizAttempt(Base):
     user = relationship("User", back_populates="quiz_attempts")
     quiz = relationship("Quiz", back_populates="attempts")
 
+# Attempt history is read newest first per user, optionally per quiz, and
+# paginated on (completed_at, id)
+Index(
+    "ix_quiz_attempts_user_completed",
+    QuizAttempt.user_id, QuizAttempt.completed_at.desc(), QuizAttempt.id.desc()
+)
+Index(
+    "ix_quiz_attempts_user_quiz_completed",
+    QuizAttempt.user_id, QuizAttempt.quiz_id, QuizAttempt.completed_at.desc(), QuizAttempt.id.desc()
+)
+
 class UserProgress(Base):
     __tablename__ = "user_progress"
+    __table_args__ = (
+        UniqueConstraint("user_id", "quiz_id", name="uq_user_progress_user_quiz"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -84,4 +98,45 @@ class UserProgress(Base):
     
     # Relationships
     user = relationship("User", back_populates="progress")
-    quiz = relationship("Quiz", back_populates="progress") 
\ No newline at end of file
+    quiz = relationship("Quiz", back_populates="progress") 
+# Full-text search vectors (PostgreSQL only). They are generated columns
+# kept out of the mapped models; migration 0004 adds them to existing
+# databases, and these hooks cover tables made by create_all.
+QUESTION_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(question_text, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(explanation, '')), 'B')"
+)
+QUIZ_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+
+for _table, _expression in ((Question.__table__, QUESTION_SEARCH_VECTOR), (Quiz.__table__, QUIZ_SEARCH_VECTOR)):
+    event.listen(_table, "after_create", DDL(
+        f"ALTER TABLE {_table.name} ADD COLUMN search_vector tsvector "
+        f"GENERATED ALWAYS AS ({_expression}) STORED"
+    ).execute_if(dialect="postgresql"))
+    event.listen(_table, "after_create", DDL(
+        f"CREATE INDEX ix_{_table.name}_search_vector ON {_table.name} USING GIN (search_vector)"
+    ).execute_if(dialect="postgresql"))
+
+# Spaced-repetition card: SM-2 state of one question for one user
+class ReviewItem(Base):
+    __tablename__ = "review_items"
+    __table_args__ = (
+        UniqueConstraint("user_id", "question_id", name="uq_review_items_user_question"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    question_id = Column(Integer, ForeignKey("questions.id"), nullable=False)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False)
+    repetitions = Column(Integer, nullable=False, default=0)  # correct reviews in a row
+    interval_days = Column(Float, nullable=False, default=0.0)
+    ease = Column(Float, nullable=False, default=2.5)
+    lapses = Column(Integer, nullable=False, default=0)
+    next_review_at = Column(DateTime(timezone=True), nullable=False)
+    last_reviewed_at = Column(DateTime(timezone=True), nullable=False)
+
+# The due queue is read as a range of next_review_at per user
+Index("ix_review_items_user_due", ReviewItem.user_id, ReviewItem.next_review_at)
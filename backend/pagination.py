@@ -0,0 +1,60 @@
+from datetime import datetime
+from typing import Any, List, Optional, Tuple, Union
+import base64
+import json
+from fastapi import HTTPException, Response, status
+
+# Keyset pagination. A cursor is an opaque, URL-safe token holding the sort
+# key of the last row of the previous page; the next page starts strictly
+# after it. The token of the following page is sent in this header:
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(*key: Any) -> str:
+    """Encode a sort key as an opaque cursor"""
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in key]
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Decode a cursor back into its sort key values"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list):
+            raise ValueError("cursor is not a list")
+        return values
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+def decode_id_cursor(cursor: str) -> int:
+    """Decode a cursor keyed on id"""
+    values = decode_cursor(cursor)
+    if len(values) != 1 or not isinstance(values[0], int):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+    return values[0]
+
+def decode_time_id_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor keyed on (timestamp, id)"""
+    values = decode_cursor(cursor)
+    try:
+        timestamp, row_id = values
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+
+def page_response(content: Union[str, bytes], next_cursor: Optional[str]) -> Response:
+    """JSON response carrying the next cursor, if there is a next page"""
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return Response(content=content, media_type="application/json", headers=headers)
+
+def pack_page(content: str, next_cursor: Optional[str]) -> str:
+    """Bundle a page and its next cursor into one cacheable string"""
+    return f"{next_cursor or ''}\n{content}"
+
+def unpack_page(packed: str) -> Tuple[str, Optional[str]]:
+    """Split a string made by pack_page"""
+    next_cursor, _, content = packed.partition("\n")
+    return content, next_cursor or None
@@ -0,0 +1,187 @@
+"""Token-bucket rate limiting in front of the API
+
+RATE_LIMITS maps "METHOD /path" to the buckets a request has to take a
+token from, e.g. "ip=20/60,principal=5/60": 20 requests per 60 seconds per
+client address and 5 per 60 seconds per principal (the login email, or the
+subject of the bearer token). Buckets are shared by all pods through Redis
+and checked atomically by one Lua script; a request is only charged when
+every bucket has a token.
+
+Each pod also keeps local copies of its buckets. A pod's local bucket only
+ever sees a subset of the requests charged to the shared one, so (up to
+clock differences) it never holds fewer tokens and a local refusal is
+always right: retry storms are shed without a Redis round-trip. Without
+Redis the local buckets are the only limit.
+
+Refused requests get 429 with Retry-After before routing, so they never
+reach the database or bcrypt.
+"""
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs
+import json
+import math
+import time
+import redis.asyncio as redis
+from .auth import decode_token
+from .cache import TTLCache
+from .config import settings
+from .database import redis_client
+from .metrics import RATE_LIMITED
+
+RATE_LIMIT_KEY = "ratelimit:{rule}:{scope}:{subject}"
+
+class Bucket(NamedTuple):
+    """Token bucket parameters: burst capacity and refill rate"""
+    scope: str  # "ip" or "principal"
+    capacity: int
+    per_second: float
+
+def parse_rule(spec: str) -> List[Bucket]:
+    """Parse "ip=20/60,principal=5/60" into buckets"""
+    buckets = []
+    for part in spec.split(","):
+        scope, _, limit = part.strip().partition("=")
+        capacity, _, seconds = limit.partition("/")
+        if scope not in ("ip", "principal"):
+            raise ValueError(f"Unknown rate limit scope {scope!r}")
+        buckets.append(Bucket(scope, int(capacity), int(capacity) / float(seconds)))
+    return buckets
+
+RULES: Dict[str, List[Bucket]] = {route: parse_rule(spec) for route, spec in settings.RATE_LIMITS.items()}
+
+# KEYS: buckets. ARGV: capacity and refill per second of each bucket, in
+# order. Takes a token from every bucket if all of them have one; returns
+# 0 and the milliseconds until they do otherwise. Times come from Redis so
+# all pods share one clock.
+TOKEN_BUCKET_LUA = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i - 1])
+    local rate = tonumber(ARGV[2 * i])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if tokens < 1 then
+        wait = math.max(wait, (1 - tokens) / rate)
+    end
+end
+if wait > 0 then
+    return {0, math.ceil(wait * 1000)}
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i - 1])
+    local rate = tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - 1), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000))
+end
+return {1, 0}
+"""
+_take_tokens = redis_client.register_script(TOKEN_BUCKET_LUA)
+
+# Local buckets: key -> [tokens, monotonic time]. An entry that expired has
+# refilled completely, so the TTL only needs to cover the slowest refill.
+_local = TTLCache(
+    settings.RATE_LIMIT_LOCAL_KEYS,
+    max((bucket.capacity / bucket.per_second for rule in RULES.values() for bucket in rule), default=1)
+)
+
+def _local_wait(keys: List[str], buckets: List[Bucket], now: float) -> Tuple[float, List[List[float]]]:
+    """Seconds until every local bucket has a token, and their refilled states"""
+    states, wait = [], 0.0
+    for key, bucket in zip(keys, buckets):
+        state = _local.get(key) or [float(bucket.capacity), now]
+        state = [min(bucket.capacity, state[0] + (now - state[1]) * bucket.per_second), now]
+        if state[0] < 1:
+            wait = max(wait, (1 - state[0]) / bucket.per_second)
+        states.append(state)
+    return wait, states
+
+def _client_ip(scope) -> str:
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                # The last hop was appended by our own ingress
+                return value.decode("latin-1").split(",")[-1].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def _principal(scope) -> Optional[str]:
+    """Login email from the query string, else the bearer token's subject"""
+    email = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("email")
+    if email:
+        return email[0].strip().lower()
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer":
+                claims = decode_token(token)
+                if claims is not None:
+                    return claims["sub"]
+    return None
+
+async def check_rate_limit(rule: str, scope) -> Optional[float]:
+    """Take a token for a request; None if allowed, else seconds to wait"""
+    keys, buckets = [], []
+    for bucket in RULES[rule]:
+        subject = _client_ip(scope) if bucket.scope == "ip" else _principal(scope)
+        if subject is not None:
+            keys.append(RATE_LIMIT_KEY.format(rule=rule, scope=bucket.scope, subject=subject))
+            buckets.append(bucket)
+    if not keys:
+        return None
+
+    wait, states = _local_wait(keys, buckets, time.monotonic())
+    if wait > 0:
+        RATE_LIMITED.labels(rule, "local").inc()
+        return wait
+
+    try:
+        allowed, wait_ms = await _take_tokens(
+            keys=keys,
+            args=[value for bucket in buckets for value in (bucket.capacity, bucket.per_second)]
+        )
+    except redis.RedisError:
+        # Fall back to the per-pod limit
+        allowed, wait_ms = 1, 0
+    if not allowed:
+        RATE_LIMITED.labels(rule, "redis").inc()
+        return wait_ms / 1000
+
+    for key, state in zip(keys, states):
+        state[0] -= 1
+        _local.set(key, state)
+    return None
+
+class RateLimitMiddleware:
+    """ASGI middleware answering 429 to requests over their route's limits"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        rule = f"{scope['method']} {scope['path']}"
+        wait = await check_rate_limit(rule, scope) if rule in RULES else None
+        if wait is None:
+            await self.app(scope, receive, send)
+            return
+
+        body = json.dumps({"detail": "Too many requests, please retry later"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                (b"retry-after", str(max(1, math.ceil(wait))).encode("ascii")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
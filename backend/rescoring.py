@@ -0,0 +1,178 @@
+"""Bulk re-scoring of a quiz's attempts after an answer-key correction
+
+Attempts are read in id-ordered chunks. Each chunk's answers are laid out
+as an (attempts x questions) matrix aligned to the answer key, scored with
+one vectorized comparison and a dot product with the points, and written
+back with a bulk UPDATE of the scores that changed. best_score and
+completed are then recomputed for every user of the quiz, and the quiz's
+leaderboard, its users' global totals and its analytics rebuilt; other
+quizzes are left alone.
+
+Run from the command line with:
+    python -m backend.rescoring <quiz_id>
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import asyncio
+import uuid
+import numpy as np
+import redis.asyncio as redis
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from .analytics import backfill_analytics
+from .cache import invalidate_user
+from .catalog import invalidate_catalog
+from .config import settings
+from .database import SessionLocal, redis_client
+from .leaderboards import rebuild_quiz_leaderboard
+from .models import Quiz, QuizAttempt, UserProgress
+from .scoring import AnswerKey, invalidate_answer_key, load_answer_key
+
+RESCORE_JOB_KEY = "rescore_job:{job_id}"
+RESCORE_JOB_TTL_SECONDS = 7 * 24 * 3600
+
+def score_matrix(answer_key: AnswerKey, answers: List[Dict[str, Any]]) -> np.ndarray:
+    """Points-weighted percentage scores of a chunk of stored answers
+
+    Answers are encoded as integers (the index of the equal correct answer,
+    -1 for anything else), so checking them is one broadcast comparison of
+    an integer matrix against the key.
+    """
+    if answer_key.total_points == 0:
+        return np.zeros(len(answers))
+    # JSON object keys come back as strings
+    columns = {str(question_id): column for column, question_id in enumerate(answer_key.question_ids)}
+    codes: Dict[Optional[str], int] = {}
+    correct = np.array([codes.setdefault(answer, len(codes)) for answer in answer_key.correct], dtype=np.int64)
+    points = np.array(answer_key.points, dtype=np.int64)
+    
+    # An unanswered question compares like a None answer
+    given = np.full((len(answers), len(columns)), codes.get(None, -1), dtype=np.int64)
+    cells = [
+        (row, columns[str(question_id)], codes.get(answer, -1))
+        for row, attempt_answers in enumerate(answers)
+        for question_id, answer in attempt_answers.items()
+        if str(question_id) in columns
+    ]
+    if cells:
+        rows, cols, values = np.array(cells, dtype=np.int64).T
+        given[rows, cols] = values
+    earned = (given == correct).astype(np.int64) @ points
+    return earned / answer_key.total_points * 100
+
+async def _report(job_id: Optional[str], **fields: Any) -> None:
+    if job_id is None:
+        return
+    try:
+        key = RESCORE_JOB_KEY.format(job_id=job_id)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={name: str(value) for name, value in fields.items()})
+            pipe.expire(key, RESCORE_JOB_TTL_SECONDS)
+            await pipe.execute()
+    except redis.RedisError:
+        pass
+
+async def rescore_quiz(db: AsyncSession, quiz_id: int, job_id: Optional[str] = None) -> Dict[str, Any]:
+    """Re-score every attempt of a quiz against its current answer key"""
+    # Bump the quiz version and drop the cached key before scoring, so
+    # submissions from now on are graded with the corrected key too
+    await db.execute(update(Quiz).where(Quiz.id == quiz_id).values(updated_at=func.now()))
+    await db.commit()
+    await invalidate_answer_key(quiz_id)
+    answer_key = await load_answer_key(db, quiz_id)
+    if answer_key is None:
+        await _report(job_id, status="failed", detail="Quiz not found")
+        raise ValueError(f"Quiz {quiz_id} not found")
+    
+    total = await db.scalar(select(func.count()).where(QuizAttempt.quiz_id == quiz_id))
+    await _report(job_id, status="running", quiz_id=quiz_id, total=total, processed=0, changed=0,
+                  started_at=datetime.utcnow().isoformat())
+    
+    processed = changed = 0
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(QuizAttempt.id, QuizAttempt.answers, QuizAttempt.score)
+            .where(QuizAttempt.quiz_id == quiz_id, QuizAttempt.id > last_id)
+            .order_by(QuizAttempt.id)
+            .limit(settings.RESCORE_CHUNK_SIZE)
+        )
+        rows = result.all()
+        if not rows:
+            break
+        
+        ids = np.array([row.id for row in rows], dtype=np.int64)
+        old_scores = np.array([row.score for row in rows], dtype=np.float64)
+        new_scores = score_matrix(answer_key, [row.answers or {} for row in rows])
+        stale = ~np.isclose(old_scores, new_scores)
+        if stale.any():
+            await db.execute(update(QuizAttempt), [
+                {"id": int(attempt_id), "score": float(score)}
+                for attempt_id, score in zip(ids[stale], new_scores[stale])
+            ])
+        await db.commit()
+        
+        processed += len(rows)
+        changed += int(stale.sum())
+        last_id = int(ids[-1])
+        await _report(job_id, processed=processed, changed=changed)
+    
+    best_score = (
+        select(func.max(QuizAttempt.score))
+        .where(QuizAttempt.quiz_id == quiz_id, QuizAttempt.user_id == UserProgress.user_id)
+        .scalar_subquery()
+    )
+    await db.execute(
+        update(UserProgress)
+        .where(UserProgress.quiz_id == quiz_id)
+        .values(best_score=func.coalesce(best_score, 0), updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        update(UserProgress)
+        .where(UserProgress.quiz_id == quiz_id)
+        .values(completed=UserProgress.best_score >= answer_key.passing_score)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    
+    # Everything derived from the old scores or the old key is now stale
+    await invalidate_catalog()
+    user_ids = (await db.scalars(select(UserProgress.user_id).where(UserProgress.quiz_id == quiz_id))).all()
+    for user_id in user_ids:
+        await invalidate_user(user_id)
+    await rebuild_quiz_leaderboard(db, quiz_id)
+    await backfill_analytics(db, quiz_id)
+    
+    summary = {"quiz_id": quiz_id, "total": total, "processed": processed, "changed": changed, "users": len(user_ids)}
+    await _report(job_id, status="finished", users=len(user_ids), finished_at=datetime.utcnow().isoformat())
+    return summary
+
+async def create_job(quiz_id: int) -> str:
+    """Record a queued re-score job, so it can be polled before it starts"""
+    job_id = uuid.uuid4().hex
+    await _report(job_id, status="queued", quiz_id=quiz_id)
+    return job_id
+
+async def run_rescore_job(quiz_id: int, job_id: str) -> None:
+    """Background entry point: re-score with a session of its own"""
+    async with SessionLocal() as db:
+        try:
+            await rescore_quiz(db, quiz_id, job_id)
+        except Exception as exc:
+            await _report(job_id, status="failed", detail=str(exc))
+
+async def get_job(job_id: str) -> Optional[Dict[str, str]]:
+    """Progress of a re-score job, or None if unknown"""
+    job = await redis_client.hgetall(RESCORE_JOB_KEY.format(job_id=job_id))
+    return job or None
+
+async def _main(argv: List[str]) -> None:
+    if len(argv) != 1 or not argv[0].isdigit():
+        raise SystemExit("usage: python -m backend.rescoring <quiz_id>")
+    async with SessionLocal() as db:
+        print(await rescore_quiz(db, int(argv[0])))
+
+if __name__ == "__main__":
+    import sys
+    asyncio.run(_main(sys.argv[1:]))
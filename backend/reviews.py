@@ -0,0 +1,212 @@
+"""Spaced-repetition review scheduling (SM-2)
+
+Every graded answer updates the user's card for that question in
+review_items: correct answers grow the review interval by the card's ease
+factor, wrong (or missing) ones reset it to a day and lower the ease. Due
+cards are read from the (user_id, next_review_at) index, so fetching the
+next N cards is a range scan rather than a pass over attempt history.
+
+A card only moves forward in time: an answer at or before the card's last
+review is ignored, which makes replaying an attempt (a write-behind
+redelivery) a no-op.
+
+Build cards from existing quiz_attempts with:
+    python -m backend.reviews backfill
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import asyncio
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from .config import settings
+from .database import SessionLocal
+from .models import QuizAttempt, ReviewItem
+from .scoring import AnswerKey, load_answer_key
+
+# SM-2 answer quality on its 0-5 scale; answers here are only right or wrong
+CORRECT_QUALITY = 4
+WRONG_QUALITY = 1
+MIN_EASE = 1.3
+INITIAL_EASE = 2.5
+
+class ReviewState(NamedTuple):
+    """SM-2 state of a card"""
+    quiz_id: int
+    repetitions: int
+    interval_days: float
+    ease: float
+    lapses: int
+    next_review_at: datetime
+    last_reviewed_at: datetime
+
+class GradedAnswers(NamedTuple):
+    """A user's answers to (some of) a quiz's questions at one point in time"""
+    user_id: int
+    answer_key: AnswerKey
+    answers: Dict[int, str]
+    reviewed_at: datetime
+
+def _utc(moment: datetime) -> datetime:
+    # SQLite hands back naive UTC timestamps
+    return moment if moment.tzinfo is not None else moment.replace(tzinfo=timezone.utc)
+
+def schedule(state: Optional[ReviewState], quiz_id: int, correct: bool, reviewed_at: datetime) -> ReviewState:
+    """Apply one review to a card (None for a new card)"""
+    repetitions, interval, ease, lapses = (
+        (state.repetitions, state.interval_days, state.ease, state.lapses)
+        if state is not None else (0, 0.0, INITIAL_EASE, 0)
+    )
+    quality = CORRECT_QUALITY if correct else WRONG_QUALITY
+    if correct:
+        interval = 1.0 if repetitions == 0 else 6.0 if repetitions == 1 else round(interval * ease, 2)
+        repetitions += 1
+    else:
+        interval = 1.0
+        repetitions = 0
+        lapses += 1
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return ReviewState(
+        quiz_id, repetitions, interval, ease, lapses,
+        reviewed_at + timedelta(days=interval), reviewed_at
+    )
+
+def review_upsert(dialect_name: str, rows: List[Dict[str, Any]], inclusive: bool = False):
+    """INSERT ... ON CONFLICT statement writing cards unless the stored one is newer
+
+    With inclusive=True a card reviewed at the very same time is replaced
+    too, so a backfill can overwrite cards built from the same attempts.
+    """
+    insert_for_dialect = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    stmt = insert_for_dialect(ReviewItem).values(rows)
+    excluded = stmt.excluded
+    newer = (
+        excluded.last_reviewed_at >= ReviewItem.last_reviewed_at
+        if inclusive else excluded.last_reviewed_at > ReviewItem.last_reviewed_at
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[ReviewItem.user_id, ReviewItem.question_id],
+        set_={
+            name: getattr(excluded, name)
+            for name in ("quiz_id", "repetitions", "interval_days", "ease", "lapses", "next_review_at", "last_reviewed_at")
+        },
+        where=newer
+    )
+
+def _rows(states: Dict[Tuple[int, int], ReviewState]) -> List[Dict[str, Any]]:
+    return [
+        {"user_id": user_id, "question_id": question_id, **state._asdict()}
+        for (user_id, question_id), state in states.items()
+    ]
+
+async def load_states(db: AsyncSession, pairs: Iterable[Tuple[int, int]]) -> Dict[Tuple[int, int], ReviewState]:
+    """Current cards of (user, question) pairs"""
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return {}
+    result = await db.execute(
+        select(ReviewItem.user_id, ReviewItem.question_id, *(getattr(ReviewItem, name) for name in ReviewState._fields))
+        .where(tuple_(ReviewItem.user_id, ReviewItem.question_id).in_(pairs))
+    )
+    return {(row[0], row[1]): ReviewState(*row[2:]) for row in result}
+
+async def record_reviews(db: AsyncSession, graded: Iterable[GradedAnswers]) -> int:
+    """Update the cards of every question graded in a batch; the caller commits
+
+    Returns the number of cards written.
+    """
+    graded = sorted(graded, key=lambda item: _utc(item.reviewed_at))
+    pairs = [(item.user_id, question_id) for item in graded for question_id in item.answer_key.question_ids]
+    states = await load_states(db, pairs)
+    changed = {}
+    for item in graded:
+        reviewed_at = _utc(item.reviewed_at)
+        for question_id, correct in item.answer_key.grade(item.answers):
+            key = (item.user_id, question_id)
+            state = states.get(key)
+            if state is not None and reviewed_at <= _utc(state.last_reviewed_at):
+                continue
+            states[key] = changed[key] = schedule(state, item.answer_key.quiz_id, correct, reviewed_at)
+    if changed:
+        await db.execute(review_upsert(db.bind.dialect.name, _rows(changed)))
+    return len(changed)
+
+async def record_review(db: AsyncSession, user_id: int, question_id: int, quiz_id: int, correct: bool) -> ReviewState:
+    """Review a single card now (review mode); the caller commits"""
+    reviewed_at = datetime.now(timezone.utc)
+    states = await load_states(db, [(user_id, question_id)])
+    state = schedule(states.get((user_id, question_id)), quiz_id, correct, reviewed_at)
+    await db.execute(review_upsert(db.bind.dialect.name, _rows({(user_id, question_id): state})))
+    return state
+
+async def due_reviews(
+    db: AsyncSession,
+    user_id: int,
+    limit: int = 20,
+    quiz_id: Optional[int] = None
+) -> List[ReviewItem]:
+    """The user's cards that are due, most overdue first"""
+    query = select(ReviewItem).where(ReviewItem.user_id == user_id, ReviewItem.next_review_at <= func.now())
+    if quiz_id is not None:
+        query = query.where(ReviewItem.quiz_id == quiz_id)
+    result = await db.execute(query.order_by(ReviewItem.next_review_at).limit(limit))
+    return list(result.scalars().all())
+
+async def backfill_reviews(db: AsyncSession) -> Dict[str, int]:
+    """Replay all attempts, oldest first, into review cards
+
+    Users are processed in keyset chunks, each in its own transaction.
+    Cards reviewed after the replayed attempts (in review mode) are kept.
+    """
+    answer_keys: Dict[int, Optional[AnswerKey]] = {}
+    users = attempts = cards = 0
+    last_user_id = 0
+    while True:
+        result = await db.execute(
+            select(QuizAttempt.user_id)
+            .where(QuizAttempt.user_id > last_user_id)
+            .group_by(QuizAttempt.user_id)
+            .order_by(QuizAttempt.user_id)
+            .limit(settings.REVIEW_BACKFILL_USERS)
+        )
+        user_ids = list(result.scalars().all())
+        if not user_ids:
+            break
+        last_user_id = user_ids[-1]
+
+        result = await db.execute(
+            select(QuizAttempt.user_id, QuizAttempt.quiz_id, QuizAttempt.answers, QuizAttempt.completed_at)
+            .where(QuizAttempt.user_id.in_(user_ids))
+            .order_by(QuizAttempt.user_id, QuizAttempt.completed_at, QuizAttempt.id)
+        )
+        states: Dict[Tuple[int, int], ReviewState] = {}
+        for user_id, quiz_id, answers, completed_at in result:
+            if quiz_id not in answer_keys:
+                answer_keys[quiz_id] = await load_answer_key(db, quiz_id)
+            answer_key = answer_keys[quiz_id]
+            if answer_key is None:
+                continue
+            reviewed_at = _utc(completed_at)
+            # JSON object keys come back as strings
+            for question_id, correct in answer_key.grade({int(k): v for k, v in answers.items()}):
+                key = (user_id, question_id)
+                states[key] = schedule(states.get(key), quiz_id, correct, reviewed_at)
+            attempts += 1
+
+        rows = _rows(states)
+        for start in range(0, len(rows), settings.IMPORT_BATCH_SIZE):
+            await db.execute(review_upsert(db.bind.dialect.name, rows[start:start + settings.IMPORT_BATCH_SIZE], inclusive=True))
+        await db.commit()
+        users += len(user_ids)
+        cards += len(rows)
+    return {"users": users, "attempts": attempts, "cards": cards}
+
+async def _main(command: Optional[str]) -> None:
+    if command != "backfill":
+        raise SystemExit("usage: python -m backend.reviews backfill")
+    async with SessionLocal() as db:
+        print(await backfill_reviews(db))
+
+if __name__ == "__main__":
+    import sys
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -41,16 +41,18 @@ class QuizResponse(QuizBase):
     class Config:
         from_attributes = True
 
-# Question schemas
+# Question schemas; answers and explanations never reach quiz takers
 class QuestionBase(BaseModel):
     question_text: str
     question_type: str
     options: Optional[Dict[str, Any]] = None
+    points: int = 1
+
+class QuestionWithAnswer(QuestionBase):
     correct_answer: str
     explanation: Optional[str] = None
-    points: int = 1
 
-class QuestionCreate(QuestionBase):
+class QuestionCreate(QuestionWithAnswer):
     quiz_id: int
 
 class QuestionResponse(QuestionBase):
@@ -62,6 +64,15 @@ class QuestionResponse(QuestionBase):
     class Config:
         from_attributes = True
 
+class QuestionAdminResponse(QuestionWithAnswer):
+    id: int
+    quiz_id: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
 # Quiz attempt schemas
 class QuizAttemptBase(BaseModel):
     quiz_id: int
@@ -80,6 +91,88 @@ class QuizAttemptResponse(QuizAttemptBase):
     class Config:
         from_attributes = True
 
+# Batch submission of attempts queued offline by mobile clients
+class QuizAttemptBatchCreate(BaseModel):
+    attempts: List[QuizAttemptCreate]
+
+class QuizAttemptBatchItem(BaseModel):
+    index: int
+    status: str  # "created" or "error"
+    attempt: Optional[QuizAttemptResponse] = None
+    detail: Optional[str] = None
+
+class QuizAttemptBatchResponse(BaseModel):
+    results: List[QuizAttemptBatchItem]
+
+# Bulk import of question banks
+class ImportRowError(BaseModel):
+    index: int
+    detail: str
+
+class ImportReport(BaseModel):
+    quizzes_created: int = 0
+    questions_created: int = 0
+    questions_updated: int = 0
+    questions_unchanged: int = 0
+    errors: List[ImportRowError] = []
+    dry_run: bool = False
+
+# Adaptive quiz sessions: questions are served one at a time, without answers
+class QuizSessionCreate(BaseModel):
+    quiz_id: Optional[int] = None
+    category: Optional[str] = None
+    size: int = 10
+
+class SessionQuestion(BaseModel):
+    id: int
+    quiz_id: int
+    question_text: str
+    question_type: str
+    options: Optional[Dict[str, Any]] = None
+    points: int = 1
+    
+    class Config:
+        from_attributes = True
+
+class QuizSessionAnswer(BaseModel):
+    answer: str
+
+class QuizSessionResult(BaseModel):
+    correct: int
+    total: int
+    score: float
+    expired: bool = False
+    attempt_id: Optional[int] = None  # set when the session covered a whole quiz
+
+class QuizSessionResponse(BaseModel):
+    session_id: str
+    quiz_id: Optional[int] = None
+    category: Optional[str] = None
+    position: int
+    total: int
+    deadline: Optional[datetime] = None
+    question: Optional[SessionQuestion] = None
+    result: Optional[QuizSessionResult] = None
+
+# Spaced-repetition review cards
+class ReviewCard(BaseModel):
+    question: SessionQuestion
+    repetitions: int
+    interval_days: float
+    lapses: int
+    next_review_at: datetime
+
+class ReviewAnswer(BaseModel):
+    answer: str
+
+class ReviewResult(BaseModel):
+    question_id: int
+    correct: bool
+    correct_answer: str
+    explanation: Optional[str] = None
+    interval_days: float
+    next_review_at: datetime
+
 # User progress schemas
 class UserProgressBase(BaseModel):
     quiz_id: int
@@ -105,6 +198,16 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     email: Optional[str] = None
 
+# Authenticated principal, cached so requests can skip the users table
+class Principal(BaseModel):
+    id: int
+    email: str
+    username: str
+    is_admin: bool = False
+    
+    class Config:
+        from_attributes = True
+
 # Update the forward references
 QuizResponse.model_rebuild()
 QuestionResponse.model_rebuild() 
\ No newline at end of file
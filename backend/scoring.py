@@ -0,0 +1,158 @@
+from typing import Dict, List, Optional, Tuple
+import json
+import redis.asyncio as redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .cache import TTLCache
+from .config import settings
+from .database import redis_client
+from .models import Quiz, Question
+
+class AnswerKey:
+    """Compact, immutable answer key of a quiz
+
+    Question ids, correct answers and points are parallel tuples, so scoring
+    never needs the question rows themselves. `version` is the quiz's
+    updated_at (or created_at) at the time the key was built.
+    """
+
+    __slots__ = ("quiz_id", "version", "passing_score", "question_ids", "correct", "points", "total_points")
+
+    def __init__(
+        self,
+        quiz_id: int,
+        version: str,
+        passing_score: float,
+        question_ids: Tuple[int, ...],
+        correct: Tuple[str, ...],
+        points: Tuple[int, ...]
+    ):
+        self.quiz_id = quiz_id
+        self.version = version
+        self.passing_score = passing_score
+        self.question_ids = question_ids
+        self.correct = correct
+        self.points = points
+        self.total_points = sum(points)
+
+    def score(self, answers: Dict[int, str]) -> Tuple[float, int]:
+        """Return the points-weighted percentage score and number of correct answers"""
+        correct_answers = 0
+        earned = 0
+        for question_id, correct, points in zip(self.question_ids, self.correct, self.points):
+            if answers.get(question_id) == correct:
+                correct_answers += 1
+                earned += points
+        score = (earned / self.total_points) * 100 if self.total_points > 0 else 0
+        return score, correct_answers
+
+    def grade(self, answers: Dict[int, str]) -> List[Tuple[int, bool]]:
+        """(question id, answered correctly) for every question of the quiz"""
+        return [
+            (question_id, answers.get(question_id) == correct)
+            for question_id, correct in zip(self.question_ids, self.correct)
+        ]
+
+    def passed(self, score: float) -> bool:
+        """Whether a score reaches the quiz's passing score"""
+        return score >= self.passing_score
+
+    def to_json(self) -> str:
+        """Encode the key for the shared Redis tier"""
+        return json.dumps([
+            self.quiz_id, self.version, self.passing_score,
+            self.question_ids, self.correct, self.points
+        ])
+
+    @classmethod
+    def from_json(cls, raw: str) -> "AnswerKey":
+        """Decode a key stored by to_json"""
+        quiz_id, version, passing_score, question_ids, correct, points = json.loads(raw)
+        return cls(quiz_id, version, passing_score, tuple(question_ids), tuple(correct), tuple(points))
+
+# Process-local keys, checked against the version pointer held in Redis so a
+# question added on one pod is picked up by all of them. Without Redis the
+# local TTL bounds staleness instead.
+answer_keys = TTLCache(settings.ANSWER_KEY_CACHE_SIZE, settings.ANSWER_KEY_CACHE_TTL_SECONDS)
+ANSWER_KEY_VERSION_KEY = "answer_key_version:{quiz_id}"
+ANSWER_KEY_KEY = "answer_key:{quiz_id}:{version}"
+
+async def load_answer_key(db: AsyncSession, quiz_id: int) -> Optional[AnswerKey]:
+    """Build a quiz's answer key from the database, or None if the quiz does not exist"""
+    # One query: the outer join still yields a row for a quiz with no questions
+    result = await db.execute(
+        select(
+            Quiz.passing_score, Quiz.updated_at, Quiz.created_at,
+            Question.id, Question.correct_answer, Question.points
+        )
+        .outerjoin(Question, Question.quiz_id == Quiz.id)
+        .where(Quiz.id == quiz_id)
+        .order_by(Question.id)
+    )
+    rows = result.all()
+    if not rows:
+        return None
+
+    first = rows[0]
+    questions = [row for row in rows if row.id is not None]
+    version = first.updated_at or first.created_at
+    return AnswerKey(
+        quiz_id,
+        version.isoformat() if version else "",
+        first.passing_score if first.passing_score is not None else 70.0,
+        tuple(row.id for row in questions),
+        tuple(row.correct_answer for row in questions),
+        tuple(row.points if row.points is not None else 1 for row in questions)
+    )
+
+async def get_answer_key(db: AsyncSession, quiz_id: int) -> Optional[AnswerKey]:
+    """Return a quiz's answer key, or None if the quiz does not exist"""
+    try:
+        version = await redis_client.get(ANSWER_KEY_VERSION_KEY.format(quiz_id=quiz_id))
+        shared = True
+    except redis.RedisError:
+        version, shared = None, False
+
+    key = answer_keys.get(quiz_id)
+    if key is not None and (not shared or key.version == version):
+        return key
+
+    if version is not None:
+        try:
+            cached = await redis_client.get(ANSWER_KEY_KEY.format(quiz_id=quiz_id, version=version))
+        except redis.RedisError:
+            cached = None
+        if cached is not None:
+            key = AnswerKey.from_json(cached)
+            answer_keys.set(quiz_id, key)
+            return key
+
+    key = await load_answer_key(db, quiz_id)
+    if key is None:
+        return None
+    answer_keys.set(quiz_id, key)
+    if shared:
+        try:
+            async with redis_client.pipeline() as pipe:
+                pipe.setex(
+                    ANSWER_KEY_KEY.format(quiz_id=quiz_id, version=key.version),
+                    settings.CACHE_TTL_SECONDS,
+                    key.to_json()
+                )
+                pipe.setex(
+                    ANSWER_KEY_VERSION_KEY.format(quiz_id=quiz_id),
+                    settings.CACHE_TTL_SECONDS,
+                    key.version
+                )
+                await pipe.execute()
+        except redis.RedisError:
+            pass
+    return key
+
+async def invalidate_answer_key(quiz_id: int) -> None:
+    """Forget a quiz's answer key after its questions change"""
+    answer_keys.pop(quiz_id)
+    try:
+        await redis_client.delete(ANSWER_KEY_VERSION_KEY.format(quiz_id=quiz_id))
+    except redis.RedisError:
+        pass
@@ -0,0 +1,79 @@
+from typing import Any, Dict, List
+from sqlalchemy import and_, literal_column, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from .learning_sources import get_index
+from .models import Question, Quiz
+from .text_index import tokenize
+
+SEARCH_TYPES = ("questions", "quizzes", "learning_sources")
+
+def prefix_tsquery(query: str) -> str:
+    """to_tsquery input matching every token of a query as a prefix"""
+    return " & ".join(f"{token}:*" for token in tokenize(query))
+
+async def _search_table(db: AsyncSession, model: Any, columns: List[Any], text_columns: List[Any], query: str, skip: int, limit: int) -> List[Dict[str, Any]]:
+    """Ranked matches from a table's search_vector (PostgreSQL), or a LIKE scan elsewhere"""
+    if db.bind.dialect.name == "postgresql":
+        tsquery = func.to_tsquery("english", prefix_tsquery(query))
+        vector = literal_column(f"{model.__tablename__}.search_vector")
+        rank = func.ts_rank_cd(vector, tsquery).label("rank")
+        stmt = (
+            select(*columns, rank)
+            .where(vector.op("@@")(tsquery))
+            .order_by(rank.desc(), model.id)
+        )
+    else:
+        # Development fallback without a text index: every token must
+        # appear in one of the text columns
+        conditions = [
+            func.lower(func.coalesce(text_columns[0], "") + " " + func.coalesce(text_columns[1], "")).contains(token)
+            for token in tokenize(query)
+        ]
+        stmt = select(*columns, literal_column("0.0").label("rank")).where(and_(*conditions)).order_by(model.id)
+    
+    result = await db.execute(stmt.offset(skip).limit(limit))
+    return [dict(row._mapping) for row in result]
+
+async def search_questions(db: AsyncSession, query: str, skip: int = 0, limit: int = 20) -> List[Dict[str, Any]]:
+    """Questions whose text or explanation matches the query"""
+    return await _search_table(
+        db, Question,
+        [Question.id, Question.quiz_id, Question.question_text],
+        [Question.question_text, Question.explanation],
+        query, skip, limit
+    )
+
+async def search_quizzes(db: AsyncSession, query: str, skip: int = 0, limit: int = 20) -> List[Dict[str, Any]]:
+    """Quizzes whose title or description matches the query"""
+    return await _search_table(
+        db, Quiz,
+        [Quiz.id, Quiz.title, Quiz.description, Quiz.category, Quiz.difficulty],
+        [Quiz.title, Quiz.description],
+        query, skip, limit
+    )
+
+def search_learning_sources(query: str, skip: int = 0, limit: int = 20) -> List[Dict[str, Any]]:
+    """Learning sources whose title, topics, provider or description match the query"""
+    index = get_index()
+    results = []
+    for position, rank in index.text_index.search(query)[skip:skip + limit]:
+        source = index.sources[position]
+        results.append({
+            "id": source.get("id"),
+            "title": source.get("title"),
+            "url": source.get("url"),
+            "category": source.get("category"),
+            "rank": round(rank, 4),
+        })
+    return results
+
+async def search(db: AsyncSession, query: str, types: List[str], skip: int = 0, limit: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+    """Ranked results per requested type"""
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    if "questions" in types:
+        results["questions"] = await search_questions(db, query, skip, limit)
+    if "quizzes" in types:
+        results["quizzes"] = await search_quizzes(db, query, skip, limit)
+    if "learning_sources" in types:
+        results["learning_sources"] = search_learning_sources(query, skip, limit)
+    return results
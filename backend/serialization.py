@@ -0,0 +1,40 @@
+"""Fast JSON encoding for the hot list endpoints
+
+With FAST_JSON enabled and orjson installed, /quizzes and /quiz-attempts
+select plain column tuples and encode them with orjson, instead of loading
+ORM objects and validating each one through its response schema. The JSON
+is the same: columns come from the schema's own field order and datetimes
+are rendered the way pydantic renders them.
+"""
+from typing import Any, Iterable, Sequence, Tuple, Type
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from .config import settings
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+except ImportError:  # optional dependency
+    orjson = None
+    ORJSONResponse = None
+
+FAST_JSON = settings.FAST_JSON and orjson is not None
+# pydantic writes UTC offsets as "Z"; JSON answer maps may carry int keys
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+def default_response_class() -> Type[JSONResponse]:
+    """Response class for routes that return plain Python data"""
+    return ORJSONResponse if FAST_JSON else JSONResponse
+
+def schema_columns(schema: Type[BaseModel], model: Any, exclude: Sequence[str] = ()) -> Tuple[Tuple[str, ...], Tuple[Any, ...]]:
+    """Field names of a response schema and the model columns that back them"""
+    names = tuple(name for name in schema.model_fields if name not in exclude)
+    return names, tuple(getattr(model, name) for name in names)
+
+def dumps(value: Any) -> bytes:
+    """Encode a value with orjson"""
+    return orjson.dumps(value, option=ORJSON_OPTIONS)
+
+def dump_rows(names: Sequence[str], rows: Iterable[Sequence[Any]]) -> bytes:
+    """Encode column tuples as a JSON array of objects"""
+    return orjson.dumps([dict(zip(names, row)) for row in rows], option=ORJSON_OPTIONS)
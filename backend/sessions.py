@@ -0,0 +1,256 @@
+"""Adaptive quiz sessions
+
+A session samples questions from the pool of one quiz or one category,
+weighted towards questions the user got wrong in recent attempts, and
+serves them one at a time so answers never reach the client. Its state is
+a Redis hash, quiz_session:{id}:
+
+    u, q, c   user id, quiz id (0 for category sessions), category
+    d         deadline as unix seconds, 0 when untimed
+    p         position of the current question
+    ids, qz   question and quiz ids, packed little-endian uint32 in base64
+    a{n}      answer given to question n
+    r         JSON result, written once when the session finishes
+    f         claim on recording the finished session as a quiz attempt
+"""
+from bisect import bisect_right
+from collections import Counter
+from datetime import datetime, timezone
+from itertools import accumulate
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional
+import base64
+import heapq
+import json
+import random
+import struct
+import time
+import uuid
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .catalog import QuestionPool
+from .config import settings
+from .database import redis_client
+from .models import QuizAttempt
+from .scoring import get_answer_key
+
+SESSION_KEY = "quiz_session:{session_id}"
+# Results stay readable this long after a timed session's deadline
+SESSION_GRACE_SECONDS = 3600
+
+# KEYS: session. ARGV: position the answer is for, answer.
+# Returns the new position, -1 if the session moved on meanwhile (a
+# concurrent answer) and -2 if it no longer exists.
+RECORD_ANSWER_LUA = """
+local position = redis.call('HGET', KEYS[1], 'p')
+if not position then return -2 end
+if position ~= ARGV[1] then return -1 end
+redis.call('HSET', KEYS[1], 'a' .. ARGV[1], ARGV[2])
+return redis.call('HINCRBY', KEYS[1], 'p', 1)
+"""
+_record_answer = redis_client.register_script(RECORD_ANSWER_LUA)
+
+# KEYS: session. ARGV: result. Stores the result unless one already is and
+# returns the stored one, or nil if the session no longer exists.
+FINISH_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return nil end
+local stored = redis.call('HGET', KEYS[1], 'r')
+if stored then return stored end
+redis.call('HSET', KEYS[1], 'r', ARGV[1])
+return ARGV[1]
+"""
+_finish = redis_client.register_script(FINISH_LUA)
+
+def pack_ids(ids: List[int]) -> str:
+    return base64.b64encode(struct.pack(f"<{len(ids)}I", *ids)).decode("ascii")
+
+def unpack_ids(packed: str) -> List[int]:
+    raw = base64.b64decode(packed)
+    return list(struct.unpack(f"<{len(raw) // 4}I", raw))
+
+def sample_positions(size: int, weights: Mapping[int, float], n: int, rng: random.Random = random) -> List[int]:
+    """Sample n of range(size) without replacement, in draw order
+
+    Position i is drawn with weight 1 + weights.get(i, 0). Small samples
+    draw from the uniform part of the pool by index and from the few
+    weighted positions by bisection, rejecting repeats, so they cost O(n)
+    rather than O(size).
+    """
+    if n >= size:
+        positions = list(range(size))
+        rng.shuffle(positions)
+        return positions
+    if not weights:
+        return rng.sample(range(size), n)
+    if 2 * n > size:
+        # Dense sample: repeats would be frequent, use weighted random keys
+        keys = {i: rng.random() ** (1.0 / (1.0 + weights.get(i, 0))) for i in range(size)}
+        return heapq.nlargest(n, keys, key=keys.__getitem__)
+
+    weighted = list(weights)
+    cumulative = list(accumulate(weights[i] for i in weighted))
+    total = size + cumulative[-1]
+    chosen: Dict[int, None] = {}
+    while len(chosen) < n:
+        r = rng.random() * total
+        if r < size:
+            position = int(r)
+        else:
+            position = weighted[min(bisect_right(cumulative, r - size), len(weighted) - 1)]
+        chosen.setdefault(position)
+    return list(chosen)
+
+async def load_mistakes(db: AsyncSession, user_id: int, pool: QuestionPool) -> Dict[int, int]:
+    """Count wrong or missing answers per pool position over recent attempts"""
+    quiz_ids = set(pool.quiz_ids)
+    result = await db.execute(
+        select(QuizAttempt.quiz_id, QuizAttempt.answers)
+        .where(QuizAttempt.user_id == user_id, QuizAttempt.quiz_id.in_(quiz_ids))
+        .order_by(QuizAttempt.completed_at.desc(), QuizAttempt.id.desc())
+        .limit(settings.SESSION_HISTORY_ATTEMPTS)
+    )
+    mistakes: Counter = Counter()
+    for quiz_id, answers in result:
+        answer_key = await get_answer_key(db, quiz_id)
+        if answer_key is None:
+            continue
+        # JSON object keys come back as strings
+        graded = answer_key.grade({int(k): v for k, v in answers.items()})
+        for question_id, correct in graded:
+            if not correct:
+                position = pool.position(question_id)
+                if position is not None:
+                    mistakes[position] += 1
+    return dict(mistakes)
+
+class QuizSession(NamedTuple):
+    """Decoded state of a session"""
+    session_id: str
+    user_id: int
+    quiz_id: Optional[int]
+    category: Optional[str]
+    deadline: Optional[int]
+    position: int
+    question_ids: List[int]
+    quiz_ids: List[int]
+    answers: Dict[int, str]
+    result: Optional[Dict[str, Any]]
+
+    @property
+    def total(self) -> int:
+        return len(self.question_ids)
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.time() >= self.deadline
+
+    @property
+    def finished(self) -> bool:
+        return self.position >= self.total or self.expired
+
+    def deadline_at(self) -> Optional[datetime]:
+        return datetime.fromtimestamp(self.deadline, timezone.utc) if self.deadline is not None else None
+
+    @classmethod
+    def from_hash(cls, session_id: str, fields: Dict[str, str]) -> "QuizSession":
+        return cls(
+            session_id,
+            int(fields["u"]),
+            int(fields["q"]) or None,
+            fields["c"] or None,
+            int(fields["d"]) or None,
+            int(fields["p"]),
+            unpack_ids(fields["ids"]),
+            unpack_ids(fields["qz"]),
+            {int(name[1:]): value for name, value in fields.items() if name.startswith("a")},
+            json.loads(fields["r"]) if "r" in fields else None
+        )
+
+async def create_session(
+    db: AsyncSession,
+    user_id: int,
+    pool: QuestionPool,
+    size: int,
+    quiz_id: Optional[int] = None,
+    category: Optional[str] = None,
+    time_limit: Optional[int] = None
+) -> QuizSession:
+    """Sample a session's questions from a pool and store its state"""
+    mistakes = await load_mistakes(db, user_id, pool)
+    weights = {position: count * settings.SESSION_MISTAKE_WEIGHT for position, count in mistakes.items()}
+    positions = sample_positions(len(pool), weights, size)
+    question_ids = [pool.ids[position] for position in positions]
+    quiz_ids = [pool.quiz_ids[position] for position in positions]
+
+    deadline = int(time.time()) + time_limit * 60 if time_limit else None
+    session = QuizSession(
+        uuid.uuid4().hex, user_id, quiz_id, category, deadline, 0, question_ids, quiz_ids, {}, None
+    )
+    key = SESSION_KEY.format(session_id=session.session_id)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping={
+            "u": user_id,
+            "q": quiz_id or 0,
+            "c": category or "",
+            "d": deadline or 0,
+            "p": 0,
+            "ids": pack_ids(question_ids),
+            "qz": pack_ids(quiz_ids),
+        })
+        if deadline is not None:
+            pipe.expireat(key, deadline + SESSION_GRACE_SECONDS)
+        else:
+            pipe.expire(key, settings.SESSION_TTL_SECONDS)
+        await pipe.execute()
+    return session
+
+async def get_session(session_id: str) -> Optional[QuizSession]:
+    """Load a session, or None if it does not exist or has expired"""
+    fields = await redis_client.hgetall(SESSION_KEY.format(session_id=session_id))
+    return QuizSession.from_hash(session_id, fields) if fields else None
+
+async def record_answer(session: QuizSession, answer: str) -> Optional[int]:
+    """Answer the current question; the new position, or None if already answered"""
+    position = await _record_answer(
+        keys=[SESSION_KEY.format(session_id=session.session_id)],
+        args=[session.position, answer]
+    )
+    return position if position >= 0 else None
+
+async def grade_session(db: AsyncSession, session: QuizSession) -> Dict[str, Any]:
+    """Points-weighted score of a session's answers; unanswered counts as wrong"""
+    correct_answers = earned = total_points = 0
+    answer_keys = {}
+    for index, (question_id, quiz_id) in enumerate(zip(session.question_ids, session.quiz_ids)):
+        if quiz_id not in answer_keys:
+            answer_key = await get_answer_key(db, quiz_id)
+            answer_keys[quiz_id] = (
+                dict(zip(answer_key.question_ids, zip(answer_key.correct, answer_key.points)))
+                if answer_key is not None else {}
+            )
+        correct, points = answer_keys[quiz_id].get(question_id, (None, 0))
+        total_points += points
+        if correct is not None and session.answers.get(index) == correct:
+            correct_answers += 1
+            earned += points
+    return {
+        "correct": correct_answers,
+        "total": session.total,
+        "score": (earned / total_points) * 100 if total_points > 0 else 0,
+        "expired": session.position < session.total,
+    }
+
+async def finish_session(session: QuizSession, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Store a finished session's result; the first one stored wins"""
+    stored = await _finish(keys=[SESSION_KEY.format(session_id=session.session_id)], args=[json.dumps(result)])
+    return json.loads(stored) if stored is not None else result
+
+async def claim_attempt(session: QuizSession) -> bool:
+    """True for exactly one caller recording a session's attempt"""
+    return bool(await redis_client.hsetnx(SESSION_KEY.format(session_id=session.session_id), "f", 1))
+
+async def release_attempt(session: QuizSession) -> None:
+    """Give up the attempt claim after failing to record it"""
+    await redis_client.hdel(SESSION_KEY.format(session_id=session.session_id), "f")
+
+async def store_result(session: QuizSession, result: Dict[str, Any]) -> None:
+    await redis_client.hset(SESSION_KEY.format(session_id=session.session_id), "r", json.dumps(result))
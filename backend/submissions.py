@@ -0,0 +1,189 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import case, func, insert, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import Quiz, QuizAttempt, UserProgress
+from .reviews import GradedAnswers, record_reviews
+from .scoring import AnswerKey
+
+class ScoredAttempt(NamedTuple):
+    """An attempt that has been scored and is ready to be stored"""
+    quiz_id: int
+    answers: Dict[int, str]
+    score: float
+    passed: bool
+    time_taken: Optional[int] = None
+
+def progress_upsert(dialect_name: str, rows: List[Dict[str, Any]]):
+    """INSERT ... ON CONFLICT statement merging attempts into user_progress
+
+    Each row needs user_id, quiz_id, best_score, attempts_count,
+    last_attempt_at and completed, with at most one row per (user, quiz).
+    """
+    insert_for_dialect = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    stmt = insert_for_dialect(UserProgress).values(rows)
+    excluded = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[UserProgress.user_id, UserProgress.quiz_id],
+        set_={
+            "best_score": case(
+                (excluded.best_score > func.coalesce(UserProgress.best_score, 0), excluded.best_score),
+                else_=UserProgress.best_score
+            ),
+            "attempts_count": func.coalesce(UserProgress.attempts_count, 0) + excluded.attempts_count,
+            "last_attempt_at": excluded.last_attempt_at,
+            "completed": func.coalesce(UserProgress.completed, False) | excluded.completed,
+            "updated_at": func.now(),
+        }
+    )
+
+def merge_progress(user_id: int, attempts: List[ScoredAttempt], completed_at: datetime) -> List[Dict[str, Any]]:
+    """Collapse attempts into one progress row per quiz for progress_upsert"""
+    merged: Dict[int, Dict[str, Any]] = {}
+    for attempt in attempts:
+        row = merged.get(attempt.quiz_id)
+        if row is None:
+            merged[attempt.quiz_id] = {
+                "user_id": user_id,
+                "quiz_id": attempt.quiz_id,
+                "best_score": attempt.score,
+                "attempts_count": 1,
+                "last_attempt_at": completed_at,
+                "completed": attempt.passed,
+            }
+        else:
+            row["best_score"] = max(row["best_score"], attempt.score)
+            row["attempts_count"] += 1
+            row["completed"] = row["completed"] or attempt.passed
+    return list(merged.values())
+
+async def refresh_progress(db: AsyncSession, pairs: Iterable[Tuple[int, int]]) -> None:
+    """Recompute the progress rows of (user, quiz) pairs from their attempts
+
+    Idempotent and order-independent, unlike progress_upsert, so it is safe
+    for write-behind consumers that may see an attempt more than once. A
+    row only moves forward: a recompute that saw fewer attempts than the
+    stored row (a slower concurrent consumer) is ignored.
+    """
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return
+    result = await db.execute(
+        select(
+            QuizAttempt.user_id,
+            QuizAttempt.quiz_id,
+            func.max(QuizAttempt.score).label("best_score"),
+            func.count().label("attempts_count"),
+            func.max(QuizAttempt.completed_at).label("last_attempt_at"),
+            Quiz.passing_score,
+        )
+        .join(Quiz, Quiz.id == QuizAttempt.quiz_id)
+        .where(tuple_(QuizAttempt.user_id, QuizAttempt.quiz_id).in_(pairs))
+        .group_by(QuizAttempt.user_id, QuizAttempt.quiz_id, Quiz.passing_score)
+    )
+    rows = [
+        {
+            "user_id": row.user_id,
+            "quiz_id": row.quiz_id,
+            "best_score": row.best_score,
+            "attempts_count": row.attempts_count,
+            "last_attempt_at": row.last_attempt_at,
+            "completed": row.best_score >= (row.passing_score if row.passing_score is not None else 70.0),
+        }
+        for row in result
+    ]
+    if not rows:
+        return
+    
+    insert_for_dialect = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    stmt = insert_for_dialect(UserProgress).values(rows)
+    excluded = stmt.excluded
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[UserProgress.user_id, UserProgress.quiz_id],
+        set_={
+            "best_score": excluded.best_score,
+            "attempts_count": excluded.attempts_count,
+            "last_attempt_at": excluded.last_attempt_at,
+            "completed": excluded.completed,
+            "updated_at": func.now(),
+        },
+        where=func.coalesce(UserProgress.attempts_count, 0) <= excluded.attempts_count
+    ))
+
+async def record_attempts(
+    db: AsyncSession,
+    user_id: int,
+    attempts: List[ScoredAttempt],
+    update_progress: bool = True,
+    answer_keys: Optional[Dict[int, AnswerKey]] = None
+) -> List[QuizAttempt]:
+    """Bulk-insert attempts and upsert the user's progress in one transaction
+
+    With answer_keys (by quiz id) the review cards of the answered questions
+    are updated in the same transaction. With update_progress=False and no
+    answer_keys only the attempts are written; the rest is then left to the
+    write-behind worker.
+    """
+    if not attempts:
+        return []
+    
+    completed_at = datetime.utcnow()
+    result = await db.scalars(
+        insert(QuizAttempt).returning(QuizAttempt, sort_by_parameter_order=True),
+        [
+            {
+                "user_id": user_id,
+                "quiz_id": attempt.quiz_id,
+                "answers": attempt.answers,
+                "score": attempt.score,
+                "time_taken": attempt.time_taken,
+                "completed_at": completed_at,
+            }
+            for attempt in attempts
+        ]
+    )
+    stored = list(result.all())
+    
+    if update_progress:
+        await db.execute(progress_upsert(db.bind.dialect.name, merge_progress(user_id, attempts, completed_at)))
+    if answer_keys is not None:
+        await record_reviews(db, [
+            GradedAnswers(user_id, answer_keys[attempt.quiz_id], attempt.answers, completed_at)
+            for attempt in attempts
+        ])
+    await db.commit()
+    return stored
+
+async def record_attempt(
+    db: AsyncSession,
+    user_id: int,
+    quiz_id: int,
+    answers: Dict[int, str],
+    score: float,
+    passed: bool,
+    time_taken: Optional[int] = None,
+    update_progress: bool = True,
+    answer_key: Optional[AnswerKey] = None
+) -> QuizAttempt:
+    """Insert an attempt and upsert the user's progress (and review cards) in one transaction"""
+    attempts = await record_attempts(
+        db, user_id, [ScoredAttempt(quiz_id, answers, score, passed, time_taken)], update_progress,
+        {quiz_id: answer_key} if answer_key is not None else None
+    )
+    return attempts[0]
+
+async def progress_validator(
+    db: AsyncSession,
+    current_user: Any,
+    quiz_id: Optional[int] = None,
+    **_: Any
+) -> Tuple[Optional[datetime], int]:
+    """Latest change and row count of the progress rows a progress read renders"""
+    query = select(
+        func.max(func.coalesce(UserProgress.updated_at, UserProgress.created_at)), func.count()
+    ).where(UserProgress.user_id == current_user.id)
+    if quiz_id is not None:
+        query = query.where(UserProgress.quiz_id == quiz_id)
+    latest, count = (await db.execute(query)).one()
+    return latest, count
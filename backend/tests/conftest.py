@@ -0,0 +1,91 @@
+"""Test fixtures: the app on a throwaway SQLite database and fakeredis"""
+import itertools
+import os
+import sqlite3
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix="kcna-tests-"), "test.db")
+os.environ["DATABASE_URL"] = "sqlite:///" + DATABASE_PATH
+os.environ["DEBUG"] = "false"
+# Every test client shares one address
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+import fakeredis
+import redis.asyncio as redis
+from backend import database
+
+# Modules bind redis_client at import, so swap it before importing the app
+database.redis_pool = redis.ConnectionPool(
+    connection_class=fakeredis.aioredis.FakeConnection,
+    server=fakeredis.FakeServer(),
+    decode_responses=True
+)
+database.redis_client = database.InstrumentedRedis(connection_pool=database.redis_pool)
+
+from fastapi.testclient import TestClient
+from backend.main import app
+
+_users = itertools.count(1)
+
+def run_sql(statement: str, *params):
+    """Run a statement on the test database outside the app"""
+    connection = sqlite3.connect(DATABASE_PATH)
+    try:
+        rows = connection.execute(statement, params).fetchall()
+        connection.commit()
+        return rows
+    finally:
+        connection.close()
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def sql():
+    return run_sql
+
+@pytest.fixture
+def run(client):
+    """Run a coroutine function on the app's event loop"""
+    def call(function, *args):
+        return client.portal.call(function, *args)
+    return call
+
+@pytest.fixture
+def make_user(client):
+    """Register a fresh user and return its Authorization header"""
+    def make(admin: bool = False):
+        n = next(_users)
+        email = f"user{n}@example.com"
+        client.post("/auth/register", json={"email": email, "username": f"user{n}", "password": "password"})
+        if admin:
+            run_sql("UPDATE users SET is_admin = 1 WHERE email = ?", email)
+        token = client.post("/auth/login", params={"email": email, "password": "password"}).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+    return make
+
+@pytest.fixture
+def make_quiz(client, make_user):
+    """Create a quiz with questions as a fresh admin and return its id"""
+    def make(answers=("a", "b"), admin=None, **fields):
+        headers = admin or make_user(admin=True)
+        quiz = client.post(
+            "/quizzes",
+            json={"title": f"Quiz {next(_users)}", "category": "fundamentals", "difficulty": "beginner", **fields},
+            headers=headers
+        ).json()
+        for n, answer in enumerate(answers):
+            client.post("/questions", json={
+                "quiz_id": quiz["id"], "question_text": f"Question {n}?", "question_type": "multiple_choice",
+                "options": {"a": "A", "b": "B"}, "correct_answer": answer
+            }, headers=headers)
+        return quiz["id"]
+    return make
@@ -0,0 +1,75 @@
+import redis.asyncio as redis
+from backend.analytics import BACKFILL_PREFIX, BACKFILL_RUNS_KEY, QUIZ_STATS_KEY, record_attempt_stats_once
+from backend.database import SessionLocal, redis_client
+from backend.scoring import load_answer_key
+
+def submit(client, headers, quiz_id):
+    question_ids = [question["id"] for question in client.get(f"/quizzes/{quiz_id}", headers=headers).json()["questions"]]
+    answers = {str(question_id): "a" for question_id in question_ids}
+    response = client.post("/quiz-attempts", json={"quiz_id": quiz_id, "answers": answers}, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+def redeliver(run, attempt):
+    async def apply():
+        async with SessionLocal() as db:
+            answer_key = await load_answer_key(db, attempt["quiz_id"])
+        answers = {int(question_id): answer for question_id, answer in attempt["answers"].items()}
+        await record_attempt_stats_once([(attempt["id"], answer_key, answers, attempt["score"])])
+    run(apply)
+
+def test_redelivered_attempt_is_counted_once(client, run, make_user, make_quiz):
+    admin = make_user(admin=True)
+    quiz_id = make_quiz(admin=admin)
+    attempt = submit(client, admin, quiz_id)
+    redeliver(run, attempt)
+    stats = client.get(f"/analytics/quizzes/{quiz_id}", headers=admin).json()
+    assert stats["attempts"] == 1
+    assert stats["average_score"] == attempt["score"]
+
+def test_backfill_only_replaces_its_own_keys(client, run, make_user, make_quiz):
+    admin = make_user(admin=True)
+    quiz_id = make_quiz(admin=admin)
+    first = submit(client, admin, quiz_id)
+    submit(client, admin, quiz_id)
+    run(redis_client.set, "analytics:unrelated", "kept")
+    
+    assert client.post("/admin/analytics/backfill", headers=admin).status_code == 200
+    assert run(redis_client.get, "analytics:unrelated") == "kept"
+    assert run(redis_client.keys, "analytics_tmp:*") == []
+    assert run(redis_client.hlen, BACKFILL_RUNS_KEY) == 0
+    # Counted by the backfill, so a late live update must not add it again
+    redeliver(run, first)
+    assert client.get(f"/analytics/quizzes/{quiz_id}", headers=admin).json()["attempts"] == 2
+
+def test_running_backfill_receives_live_updates(client, run, make_user, make_quiz):
+    admin = make_user(admin=True)
+    quiz_id = make_quiz(admin=admin)
+    run(redis_client.hset, BACKFILL_RUNS_KEY, "test", 0)
+    try:
+        submit(client, admin, quiz_id)
+    finally:
+        run(redis_client.hdel, BACKFILL_RUNS_KEY, "test")
+    prefix = BACKFILL_PREFIX.format(token="test")
+    quiz_key = QUIZ_STATS_KEY.format(quiz_id=quiz_id)
+    assert run(redis_client.hget, prefix + quiz_key, "count") == "1"
+    assert quiz_key in run(redis_client.smembers, prefix + "keys")
+    run(redis_client.delete, *run(redis_client.keys, prefix + "*"))
+
+def test_stats_are_unavailable_without_redis(client, make_user, monkeypatch):
+    admin = make_user(admin=True)
+    async def fail(*args, **kwargs):
+        raise redis.ConnectionError("Redis is down")
+    monkeypatch.setattr(type(redis_client.pipeline()), "execute", fail)
+    response = client.get("/analytics/quizzes/1", headers=admin)
+    assert response.status_code == 503
+
+def test_backfill_of_one_quiz_ignores_other_quizzes(client, run, make_user, make_quiz):
+    admin = make_user(admin=True)
+    quiz_id = make_quiz(admin=admin)
+    run(redis_client.hset, BACKFILL_RUNS_KEY, "test", f"0 {quiz_id + 1}")
+    try:
+        submit(client, admin, quiz_id)
+    finally:
+        run(redis_client.hdel, BACKFILL_RUNS_KEY, "test")
+    assert run(redis_client.keys, BACKFILL_PREFIX.format(token="test") + "*") == []
@@ -0,0 +1,24 @@
+from backend.cache import CACHE_TAG_KEY, invalidate_user, read_through, user_cache_key, user_tag
+from backend.database import redis_client
+
+def test_load_is_written_back(run):
+    async def load():
+        return "[1]"
+    assert run(read_through, 9001, "field", load) == "[1]"
+    assert run(redis_client.hget, user_cache_key(9001), "field") == "[1]"
+
+def test_load_racing_another_pods_invalidation_is_not_written_back(run):
+    async def load():
+        # Another pod handling a submit bumps the user's tag in Redis only
+        await redis_client.incr(CACHE_TAG_KEY.format(tag=user_tag(9002)))
+        await redis_client.delete(user_cache_key(9002))
+        return "[stale]"
+    assert run(read_through, 9002, "field", load) == "[stale]"
+    assert run(redis_client.hget, user_cache_key(9002), "field") is None
+
+def test_invalidation_drops_cached_entries(run):
+    async def load():
+        return "[1]"
+    run(read_through, 9003, "field", load)
+    run(invalidate_user, 9003)
+    assert run(redis_client.exists, user_cache_key(9003)) == 0
@@ -0,0 +1,31 @@
+from backend.catalog import invalidate_catalog
+
+def test_quiz_etag_changes_when_validator_does_not(client, run, sql, make_user, make_quiz):
+    headers = make_user()
+    quiz_id = make_quiz()
+    response = client.get(f"/quizzes/{quiz_id}", headers=headers)
+    etag = response.headers["etag"]
+    assert client.get(f"/quizzes/{quiz_id}", headers={**headers, "If-None-Match": etag}).status_code == 304
+    
+    # A bulk UPDATE leaves updated_at and the row count as they were
+    sql("UPDATE questions SET question_text = 'Reworded?' WHERE quiz_id = ?", quiz_id)
+    run(invalidate_catalog)
+    response = client.get(f"/quizzes/{quiz_id}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["questions"][0]["question_text"] == "Reworded?"
+
+def test_progress_304_skips_the_route(client, make_user, make_quiz, monkeypatch):
+    headers = make_user()
+    quiz_id = make_quiz(answers=("a",))
+    question_id = client.get(f"/quizzes/{quiz_id}", headers=headers).json()["questions"][0]["id"]
+    client.post("/quiz-attempts", json={"quiz_id": quiz_id, "answers": {str(question_id): "a"}}, headers=headers)
+    etag = client.get("/progress", headers=headers).headers["etag"]
+    
+    from backend import http_cache, main
+    async def not_called(*args, **kwargs):
+        raise AssertionError("the route ran")
+    monkeypatch.setattr(http_cache.response_cache, "get", lambda key: None)
+    monkeypatch.setattr(main, "read_through", not_called)
+    response = client.get("/progress", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+from backend.database import redis_client
+from backend.leaderboards import (
+    BOARD_EPOCH, GLOBAL_BOARD_KEY, MAX_POINTS, board_time, pack, record_score, to_points, unpack_points
+)
+
+PERFECT_SCORES = 838
+
+def test_documented_capacity_is_exact():
+    assert MAX_POINTS >= to_points(100) * PERFECT_SCORES
+    latest = board_time(datetime(2058, 1, 1))
+    for points in (MAX_POINTS, to_points(100) * PERFECT_SCORES):
+        for timestamp in (0, latest):
+            value = pack(points, timestamp)
+            assert int(float(value)) == value
+            assert unpack_points(float(value)) == points / 100
+        # Equal points still rank the earlier time higher
+        assert float(pack(points, 0)) > float(pack(points, 1))
+
+def test_board_time_is_clamped():
+    assert board_time(BOARD_EPOCH - timedelta(days=1)) == 0
+    assert board_time(datetime(2100, 1, 1)) == board_time(datetime(2200, 1, 1))
+
+def test_global_board_at_capacity_keeps_tie_break(run):
+    first, second = 900001, 900002
+    reached = datetime(2030, 6, 1)
+    
+    async def fill():
+        await redis_client.delete(GLOBAL_BOARD_KEY)
+        for quiz_id in range(1, PERFECT_SCORES + 1):
+            await record_score(first, 900000 + quiz_id, 100.0, reached)
+            await record_score(second, 900000 + quiz_id, 100.0, reached + timedelta(seconds=1))
+        return await redis_client.zrevrange(GLOBAL_BOARD_KEY, 0, -1, withscores=True)
+    
+    board = run(fill)
+    assert [int(member) for member, _ in board[:2]] == [first, second]
+    assert unpack_points(board[0][1]) == 100.0 * PERFECT_SCORES
+    assert unpack_points(board[1][1]) == 100.0 * PERFECT_SCORES
+    run(redis_client.delete, GLOBAL_BOARD_KEY)
@@ -0,0 +1,48 @@
+import pytest
+from backend.catalog import CatalogSnapshot
+from backend.pagination import NEXT_CURSOR_HEADER
+
+@pytest.mark.parametrize("path", ["/quizzes", "/questions", "/quiz-attempts"])
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": -1}, {"limit": 100000}, {"skip": -1}])
+def test_out_of_range_page_parameters_are_rejected(client, make_user, path, params):
+    response = client.get(path, params=params, headers=make_user())
+    assert response.status_code == 422
+
+@pytest.mark.parametrize("path", ["/external-learning-sources", "/search?q=kubernetes&types=learning_sources"])
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": 100000}, {"skip": -1}])
+def test_out_of_range_learning_source_pages_are_rejected(client, make_user, path, params):
+    response = client.get(path, params=params, headers=make_user())
+    assert response.status_code == 422
+
+@pytest.mark.parametrize("limit", [0, -1, 100000])
+def test_out_of_range_due_review_limit_is_rejected(client, make_user, limit):
+    response = client.get("/reviews/due", params={"limit": limit}, headers=make_user())
+    assert response.status_code == 422
+
+def test_learning_source_pages_do_not_overlap(client):
+    first = client.get("/external-learning-sources", params={"limit": 2}).json()
+    second = client.get("/external-learning-sources", params={"skip": 2, "limit": 2}).json()
+    assert first and second
+    assert first != second
+
+def test_cursor_pages_cover_every_quiz_once(client, make_user, make_quiz):
+    created = {make_quiz(answers=()) for _ in range(3)}
+    headers = make_user()
+    seen, params = [], {"limit": 1}
+    while True:
+        response = client.get("/quizzes", params=params, headers=headers)
+        assert response.status_code == 200
+        seen.extend(quiz["id"] for quiz in response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+        params = {"limit": 1, "cursor": cursor}
+    assert len(seen) == len(set(seen))
+    assert created <= set(seen)
+
+def test_snapshot_empty_slice_has_no_cursor():
+    snapshot = CatalogSnapshot([(1, b"{}", None), (2, b"{}", None), (3, b"{}", None)])
+    assert snapshot.page(1, 0) == (b"[]", None)
+    assert snapshot.page(5, 2) == (b"[]", None)
+    assert snapshot.page(0, 2) == (b"[{},{}]", 2)
+    assert snapshot.page_after(2, 5) == (b"[{}]", None)
@@ -0,0 +1,37 @@
+from backend.analytics import QUIZ_STATS_KEY
+from backend.database import redis_client
+from backend.leaderboards import GLOBAL_BOARD_KEY, quiz_board_key, unpack_points
+
+def submit(client, headers, quiz_id, answer):
+    question_ids = [question["id"] for question in client.get(f"/quizzes/{quiz_id}", headers=headers).json()["questions"]]
+    response = client.post(
+        "/quiz-attempts", json={"quiz_id": quiz_id, "answers": {str(qid): answer for qid in question_ids}}, headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()
+
+def test_rescore_rebuilds_only_the_quiz_and_its_users(client, run, sql, make_user, make_quiz):
+    admin = make_user(admin=True)
+    user = make_user()
+    fixed = make_quiz(answers=("a", "a"), admin=admin)
+    other = make_quiz(answers=("b",), admin=admin)
+    submit(client, user, fixed, "b")
+    submit(client, user, other, "b")
+    user_id = client.get("/progress", headers=user).json()[0]["user_id"]
+    
+    # Entries a full rebuild would overwrite: they must survive a one-quiz rescore
+    run(redis_client.zadd, quiz_board_key(other), {"999999": 1})
+    run(redis_client.hset, QUIZ_STATS_KEY.format(quiz_id=other), "count", 42)
+    
+    sql("UPDATE questions SET correct_answer = 'b' WHERE quiz_id = ?", fixed)
+    response = client.post(f"/admin/quizzes/{fixed}/rescore", headers=admin)
+    assert response.status_code == 202
+    job = client.get(f"/admin/rescore-jobs/{response.json()['job_id']}", headers=admin).json()
+    assert job["status"] == "finished"
+    
+    assert unpack_points(run(redis_client.zscore, quiz_board_key(fixed), user_id)) == 100.0
+    assert unpack_points(run(redis_client.zscore, GLOBAL_BOARD_KEY, user_id)) == 200.0
+    assert run(redis_client.zscore, quiz_board_key(other), "999999") == 1
+    assert run(redis_client.hget, QUIZ_STATS_KEY.format(quiz_id=other), "count") == "42"
+    stats = client.get(f"/analytics/quizzes/{fixed}", headers=admin).json()
+    assert stats["attempts"] == 1 and stats["average_score"] == 100.0
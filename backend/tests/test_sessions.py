@@ -0,0 +1,36 @@
+def start(client, headers, quiz_id):
+    response = client.post("/quiz-sessions", json={"quiz_id": quiz_id, "size": 2}, headers=headers)
+    assert response.status_code == 201
+    return response.json()
+
+def delete_question(sql, question_id):
+    sql("UPDATE quizzes SET updated_at = CURRENT_TIMESTAMP WHERE id = (SELECT quiz_id FROM questions WHERE id = ?)", question_id)
+    sql("DELETE FROM questions WHERE id = ?", question_id)
+
+def test_deleted_question_is_skipped(client, sql, make_user, make_quiz):
+    headers = make_user()
+    quiz_id = make_quiz(answers=("a", "a"))
+    session = start(client, headers, quiz_id)
+    delete_question(sql, session["question"]["id"])
+    
+    response = client.get(f"/quiz-sessions/{session['session_id']}", headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["position"] == 1
+    assert body["question"]["id"] != session["question"]["id"]
+    
+    response = client.post(f"/quiz-sessions/{session['session_id']}/answer", json={"answer": "a"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["result"]["correct"] == 1
+
+def test_session_whose_questions_were_all_deleted_finishes(client, sql, make_user, make_quiz):
+    headers = make_user()
+    quiz_id = make_quiz(answers=("a", "a"))
+    session = start(client, headers, quiz_id)
+    for (question_id,) in sql("SELECT id FROM questions WHERE quiz_id = ?", quiz_id):
+        delete_question(sql, question_id)
+    
+    response = client.get(f"/quiz-sessions/{session['session_id']}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["question"] is None
+    assert response.json()["result"]["correct"] == 0
@@ -0,0 +1,64 @@
+from bisect import bisect_left
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+import math
+import re
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased alphanumeric tokens of a text"""
+    return TOKEN_RE.findall(text.lower())
+
+class InvertedIndex:
+    """In-process inverted index with TF-IDF ranking and prefix matching
+
+    Documents are added as (text, weight) fields; call freeze() once all
+    documents are in. Queries AND their tokens together, and each token
+    may match any indexed term it is a prefix of.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[Hashable, float]] = {}
+        self.terms: List[str] = []
+        self.doc_count = 0
+
+    def add(self, doc_id: Hashable, fields: Iterable[Tuple[str, float]]) -> None:
+        """Index a document's weighted text fields"""
+        self.doc_count += 1
+        for text, weight in fields:
+            for token in tokenize(text or ""):
+                postings = self.postings.setdefault(token, {})
+                postings[doc_id] = postings.get(doc_id, 0.0) + weight
+
+    def freeze(self) -> None:
+        """Sort the vocabulary so prefix lookups can bisect it"""
+        self.terms = sorted(self.postings)
+
+    def _matching_terms(self, token: str, prefix: bool) -> List[str]:
+        if not prefix:
+            return [token] if token in self.postings else []
+        matches = []
+        for position in range(bisect_left(self.terms, token), len(self.terms)):
+            term = self.terms[position]
+            if not term.startswith(token):
+                break
+            matches.append(term)
+        return matches
+
+    def search(self, query: str, prefix: bool = True) -> List[Tuple[Hashable, float]]:
+        """Documents matching every query token, best first"""
+        scores: Dict[Hashable, float] = {}
+        matched: Set[Hashable] = set()
+        for position, token in enumerate(dict.fromkeys(tokenize(query))):
+            token_scores: Dict[Hashable, float] = {}
+            for term in self._matching_terms(token, prefix):
+                postings = self.postings[term]
+                idf = math.log(1 + self.doc_count / len(postings))
+                for doc_id, weight in postings.items():
+                    token_scores[doc_id] = token_scores.get(doc_id, 0.0) + weight * idf
+            matched = set(token_scores) if position == 0 else matched & token_scores.keys()
+            if not matched:
+                return []
+            for doc_id in matched:
+                scores[doc_id] = scores.get(doc_id, 0.0) + token_scores[doc_id]
+        return sorted(((doc_id, scores[doc_id]) for doc_id in matched), key=lambda item: (-item[1], item[0]))
@@ -0,0 +1,136 @@
+"""Consumer of the write-behind attempt stream
+
+Reads stream:attempts in the attempt-workers consumer group, applies each
+batch in one transaction and acknowledges it afterwards. Entries left
+pending by a crashed consumer are reclaimed with XAUTOCLAIM once idle for
+WRITE_BEHIND_CLAIM_IDLE_MS. Any number of workers can run side by side;
+lag and backlog gauges are served on WORKER_METRICS_PORT.
+
+Run next to the API with:
+    python -m backend.worker
+
+Recompute every progress row from quiz_attempts after the stream was lost
+(e.g. a Redis flush; leaderboards and analytics have their own rebuilds) with:
+    python -m backend.worker reconcile
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import socket
+import redis.asyncio as redis
+from prometheus_client import start_http_server
+from sqlalchemy import select
+from .config import settings
+from .database import SessionLocal, close_connections, redis_client
+from .metrics import WRITE_BEHIND_BACKLOG, WRITE_BEHIND_EVENTS, WRITE_BEHIND_LAG
+from .models import QuizAttempt
+from .submissions import refresh_progress
+from .write_behind import ATTEMPT_GROUP, ATTEMPT_STREAM_KEY, AttemptEvent, apply_events
+
+logger = logging.getLogger("backend.worker")
+
+Entry = Tuple[str, Dict[str, str]]
+
+async def ensure_group() -> None:
+    """Create the consumer group (and stream) unless it exists"""
+    try:
+        await redis_client.xgroup_create(ATTEMPT_STREAM_KEY, ATTEMPT_GROUP, id="0", mkstream=True)
+    except redis.ResponseError as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+
+async def read_batch(consumer: str) -> List[Entry]:
+    """Reclaim stale pending entries first, then read new ones"""
+    _, claimed, *_ = await redis_client.xautoclaim(
+        ATTEMPT_STREAM_KEY, ATTEMPT_GROUP, consumer,
+        min_idle_time=settings.WRITE_BEHIND_CLAIM_IDLE_MS,
+        count=settings.WRITE_BEHIND_BATCH_SIZE
+    )
+    # Entries trimmed from the stream while pending come back without fields
+    claimed = [(entry_id, fields) for entry_id, fields in claimed if fields]
+    if claimed:
+        return claimed
+    response = await redis_client.xreadgroup(
+        ATTEMPT_GROUP, consumer, {ATTEMPT_STREAM_KEY: ">"},
+        count=settings.WRITE_BEHIND_BATCH_SIZE,
+        block=settings.WRITE_BEHIND_BLOCK_MS
+    )
+    return [entry for _, entries in response for entry in entries]
+
+async def process_batch(entries: List[Entry]) -> None:
+    """Apply a batch of entries and acknowledge them"""
+    events = []
+    for entry_id, fields in entries:
+        try:
+            events.append(AttemptEvent.from_fields(fields))
+        except (KeyError, ValueError):
+            # Retrying cannot fix a malformed entry
+            logger.error("Dropping malformed attempt event %s: %r", entry_id, fields)
+
+    async with SessionLocal() as db:
+        await apply_events(db, events)
+    await redis_client.xack(ATTEMPT_STREAM_KEY, ATTEMPT_GROUP, *[entry_id for entry_id, _ in entries])
+
+    WRITE_BEHIND_EVENTS.inc(len(events))
+    if events:
+        newest = max(event.completed_at for event in events)
+        if newest.tzinfo is None:
+            newest = newest.replace(tzinfo=timezone.utc)
+        WRITE_BEHIND_LAG.set((datetime.now(timezone.utc) - newest).total_seconds())
+
+async def update_backlog() -> None:
+    """Export the group's pending and unread entry counts"""
+    groups: List[Dict[str, Any]] = await redis_client.xinfo_groups(ATTEMPT_STREAM_KEY)
+    for group in groups:
+        if group["name"] == ATTEMPT_GROUP:
+            WRITE_BEHIND_BACKLOG.labels(state="pending").set(group["pending"])
+            # lag is unknown (None) after the stream was trimmed past the group
+            if group.get("lag") is not None:
+                WRITE_BEHIND_BACKLOG.labels(state="unread").set(group["lag"])
+
+async def run(consumer: Optional[str] = None) -> None:
+    """Consume the attempt stream until cancelled"""
+    consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+    await ensure_group()
+    while True:
+        try:
+            entries = await read_batch(consumer)
+            if entries:
+                await process_batch(entries)
+            await update_backlog()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Unacknowledged entries are retried through XAUTOCLAIM
+            logger.exception("Applying attempt events failed")
+            await asyncio.sleep(1)
+
+async def reconcile() -> Dict[str, int]:
+    """Recompute the progress of every (user, quiz) pair that has attempts"""
+    async with SessionLocal() as db:
+        result = await db.execute(select(QuizAttempt.user_id, QuizAttempt.quiz_id).distinct())
+        pairs = [tuple(row) for row in result]
+        size = settings.WRITE_BEHIND_BATCH_SIZE
+        for start in range(0, len(pairs), size):
+            await refresh_progress(db, pairs[start:start + size])
+            await db.commit()
+    return {"pairs": len(pairs)}
+
+async def _main(command: Optional[str]) -> None:
+    try:
+        if command == "reconcile":
+            print(await reconcile())
+        elif command is None:
+            start_http_server(settings.WORKER_METRICS_PORT)
+            await run()
+        else:
+            raise SystemExit("usage: python -m backend.worker [reconcile]")
+    finally:
+        await close_connections()
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -0,0 +1,121 @@
+"""Write-behind queue for the side effects of quiz attempts
+
+With WRITE_BEHIND enabled a submission only inserts its attempts; progress,
+review card, leaderboard and analytics updates are published to the
+stream:attempts Redis Stream and applied in batches by backend.worker. Every step is
+idempotent, so an event delivered twice (a worker crashing before XACK)
+changes nothing:
+
+- progress is recomputed from the attempts themselves (refresh_progress)
+- review cards ignore answers older than their last review
+- leaderboard entries only move up, to the attempt's own score and time
+- analytics counters skip attempt ids their quiz has already counted
+
+If the stream cannot be written the events are applied inline instead.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+import json
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio import AsyncSession
+from .analytics import record_attempt_stats_once
+from .cache import invalidate_user
+from .config import settings
+from .database import redis_client
+from .leaderboards import record_score
+from .models import QuizAttempt
+from .reviews import GradedAnswers, record_reviews
+from .scoring import AnswerKey, get_answer_key
+from .submissions import refresh_progress
+
+ATTEMPT_STREAM_KEY = "stream:attempts"
+ATTEMPT_GROUP = "attempt-workers"
+
+class AttemptEvent(NamedTuple):
+    """A committed attempt whose side effects are still to be applied"""
+    attempt_id: int
+    user_id: int
+    quiz_id: int
+    score: float
+    completed_at: datetime
+    answers: Dict[int, str]
+
+    @classmethod
+    def from_attempt(cls, attempt: QuizAttempt) -> "AttemptEvent":
+        return cls(
+            attempt.id, attempt.user_id, attempt.quiz_id, attempt.score,
+            attempt.completed_at, {int(key): value for key, value in attempt.answers.items()}
+        )
+
+    def to_fields(self) -> Dict[str, str]:
+        """Encode the event as stream entry fields"""
+        return {
+            "attempt_id": str(self.attempt_id),
+            "user_id": str(self.user_id),
+            "quiz_id": str(self.quiz_id),
+            "score": repr(self.score),
+            "completed_at": self.completed_at.isoformat(),
+            "answers": json.dumps(self.answers),
+        }
+
+    @classmethod
+    def from_fields(cls, fields: Dict[str, str]) -> "AttemptEvent":
+        """Decode an entry written by to_fields"""
+        return cls(
+            int(fields["attempt_id"]),
+            int(fields["user_id"]),
+            int(fields["quiz_id"]),
+            float(fields["score"]),
+            datetime.fromisoformat(fields["completed_at"]),
+            {int(key): value for key, value in json.loads(fields["answers"]).items()}
+        )
+
+async def publish_attempts(events: List[AttemptEvent]) -> bool:
+    """Append events to the attempt stream; False if Redis is unavailable"""
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for event in events:
+                pipe.xadd(
+                    ATTEMPT_STREAM_KEY, event.to_fields(),
+                    maxlen=settings.WRITE_BEHIND_STREAM_MAXLEN, approximate=True
+                )
+            await pipe.execute()
+    except redis.RedisError:
+        return False
+    return True
+
+async def apply_events(db: AsyncSession, events: Iterable[AttemptEvent]) -> None:
+    """Apply the side effects of a batch of attempt events"""
+    events = list(events)
+    if not events:
+        return
+    answer_keys = {}
+    for quiz_id in {event.quiz_id for event in events}:
+        answer_keys[quiz_id] = await get_answer_key(db, quiz_id)
+    
+    await refresh_progress(db, ((event.user_id, event.quiz_id) for event in events))
+    await record_reviews(db, [
+        GradedAnswers(event.user_id, answer_keys[event.quiz_id], event.answers, event.completed_at)
+        for event in events if answer_keys[event.quiz_id] is not None
+    ])
+    await db.commit()
+    for user_id in {event.user_id for event in events}:
+        await invalidate_user(user_id)
+
+    graded: List[Tuple[int, AnswerKey, Dict[int, str], float]] = []
+    for event in events:
+        await record_score(event.user_id, event.quiz_id, event.score, event.completed_at)
+        answer_key = answer_keys[event.quiz_id]
+        if answer_key is not None:
+            graded.append((event.attempt_id, answer_key, event.answers, event.score))
+    try:
+        await record_attempt_stats_once(graded)
+    except redis.RedisError:
+        # Derived data; a backfill restores missed updates
+        pass
+
+async def enqueue_attempts(db: AsyncSession, attempts: List[QuizAttempt]) -> None:
+    """Hand committed attempts to the worker, applying them inline if Redis is down"""
+    events = [AttemptEvent.from_attempt(attempt) for attempt in attempts]
+    if not await publish_attempts(events):
+        await apply_events(db, events)
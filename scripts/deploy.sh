@@ -66,6 +66,7 @@ kubectl wait --for=condition=ready pod -l app=redis -n $NAMESPACE --timeout=300s
 
 # Apply backend
 kubectl apply -f k8s/backend-deployment.yaml
+kubectl apply -f k8s/worker-deployment.yaml
 
 # Apply frontend
 kubectl apply -f k8s/frontend-deployment.yaml